@@ -1,46 +1,89 @@
+import os
+import re
 import uuid
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union, AsyncIterator
 from datetime import datetime
 
-from app.services.claude_service import ClaudeService
+from app.services.claude_service import ClaudeService, LLMUnavailableError, get_claude_service
 from app.agents.sales_agent import SalesAgent
 from app.agents.verification_agent import VerificationAgent
 from app.agents.underwriting_agent import UnderwritingAgent
 from app.agents.sanction_agent import SanctionAgent
+from app.services.loan_extractor import LoanInfoExtractor
+from app.services.slot_filling import SlotFiller
+from app.services.blob_store import BlobStore, get_blob_store
+from app.services.conversation_store import ConversationStore, get_conversation_store
+from app.services.offer_optimiser import describe_offer
 from app.models import ConversationState, Message, LoanApplication
 
 logger = logging.getLogger(__name__)
 
+# Sent instead of a model reply when Claude cannot be reached; the stage is left unchanged
+UNAVAILABLE_RESPONSE = (
+    "Our assistant is temporarily unavailable. Your details so far are saved - "
+    "please send your message again in a minute."
+)
+
+# Replies to a counter-offer
+ACCEPT_PATTERN = re.compile(r"\b(yes|yeah|yep|sure|ok|okay|accept|agreed?|proceed|go ahead)\b", re.IGNORECASE)
+DECLINE_PATTERN = re.compile(r"\b(no|nope|nah|decline|reject|cancel|not interested)\b", re.IGNORECASE)
+
+
+def _offer_reply(message: str) -> Optional[bool]:
+    """True to accept, False to decline, None if the reply is unclear"""
+    accepted = bool(ACCEPT_PATTERN.search(message))
+    declined = bool(DECLINE_PATTERN.search(message))
+    return accepted if accepted != declined else None
+
+
 class MasterAgent:
     """Intelligent orchestrator that manages conversation flow and delegates to worker agents"""
     
-    def __init__(self):
-        self.claude_service = ClaudeService()
-        self.sales_agent = SalesAgent()
-        self.verification_agent = VerificationAgent()
-        self.underwriting_agent = UnderwritingAgent()
-        self.sanction_agent = SanctionAgent()
+    def __init__(
+        self,
+        claude_service: Optional[ClaudeService] = None,
+        blob_store: Optional[BlobStore] = None,
+        conversation_store: Optional[ConversationStore] = None
+    ):
+        # One shared Claude client (and connection pool) for all worker agents
+        self.claude_service = claude_service or get_claude_service()
+        self.blob_store = blob_store or get_blob_store()
+        self.sales_agent = SalesAgent(self.claude_service)
+        self.verification_agent = VerificationAgent(self.claude_service)
+        self.underwriting_agent = UnderwritingAgent(self.claude_service)
+        self.sanction_agent = SanctionAgent(self.claude_service)
+        self.extractor = LoanInfoExtractor()
+        self.slot_filler = SlotFiller(self.claude_service, self.extractor)
         
-        # In-memory conversation storage (replace with Redis/DB in production)
-        self.conversations: Dict[str, ConversationState] = {}
+        # Conversation state for in-memory mode (bounded, evicting; see conversation_store)
+        self.conversations = conversation_store or get_conversation_store()
     
-    def create_conversation(self) -> str:
+    async def create_conversation(self) -> str:
         """Create a new conversation and return its ID"""
         conversation_id = str(uuid.uuid4())
-        self.conversations[conversation_id] = ConversationState(
+        await self.conversations.save(ConversationState(
             conversation_id=conversation_id,
             stage="GREETING",
             messages=[],
             loan_application=LoanApplication(),
             documents={},
             decision=None
-        )
+        ))
         return conversation_id
     
-    def get_conversation_state(self, conversation_id: str) -> Optional[ConversationState]:
+    async def get_conversation_state(self, conversation_id: str) -> Optional[ConversationState]:
         """Get conversation state"""
-        return self.conversations.get(conversation_id)
+        return await self.conversations.get(conversation_id)
+    
+    async def save_conversation_state(self, state: ConversationState):
+        """Write back a conversation changed in place (in-memory mode)"""
+        await self.conversations.save(state)
+    
+    def get_llm_stats(self) -> Dict[str, Any]:
+        """Retry and circuit breaker stats of the shared Claude client"""
+        return self.claude_service.get_stats()
     
     async def process_message(
         self, 
@@ -54,7 +97,8 @@ class MasterAgent:
             {
                 "response": str,
                 "next_stage": str,
-                "conversation_state": ConversationState
+                "conversation_state": ConversationState,
+                "unavailable": bool  # True if Claude could not be reached and nothing was done
             }
         """
         # Add user message to history
@@ -62,124 +106,285 @@ class MasterAgent:
             Message(role="user", content=user_message, timestamp=datetime.now())
         )
         
+        current_stage = conversation_state.stage
+        unavailable = False
+        
+        try:
+            response, next_stage, sanction_letter_path = await self._run_stage(
+                conversation_state, user_message
+            )
+        except LLMUnavailableError as e:
+            logger.warning(f"MasterAgent.process_message: {e}")
+            response, next_stage, sanction_letter_path = UNAVAILABLE_RESPONSE, current_stage, None
+            unavailable = True
+        except Exception as e:
+            logger.error(f"Error in MasterAgent.process_message: {str(e)}", exc_info=True)
+            response = "I apologize, but I encountered an error processing your request. Please try again."
+            next_stage = current_stage
+            sanction_letter_path = None
+        
+        return self._finish_turn(conversation_state, response, next_stage, sanction_letter_path, unavailable)
+    
+    async def process_message_stream(
+        self,
+        conversation_state: ConversationState,
+        user_message: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_message
+        
+        Yields:
+            {"type": "token", "text": str} for each chunk of the response as it
+            is generated, then one {"type": "done", **result} where result has
+            the same shape as process_message's return value.
+        """
+        conversation_state.messages.append(
+            Message(role="user", content=user_message, timestamp=datetime.now())
+        )
+        
+        current_stage = conversation_state.stage
+        chunks: List[str] = []
+        unavailable = False
+        
+        try:
+            response, next_stage, sanction_letter_path = await self._run_stage(
+                conversation_state, user_message, stream=True
+            )
+            if isinstance(response, str):
+                # Stages without an LLM reply arrive as a single chunk
+                chunks.append(response)
+                yield {"type": "token", "text": response}
+            else:
+                async for chunk in response:
+                    chunks.append(chunk)
+                    yield {"type": "token", "text": chunk}
+        except LLMUnavailableError as e:
+            # Raised before the first chunk, so nothing half-written has reached the client
+            logger.warning(f"MasterAgent.process_message_stream: {e}")
+            chunks.append(UNAVAILABLE_RESPONSE)
+            yield {"type": "token", "text": UNAVAILABLE_RESPONSE}
+            next_stage = current_stage
+            sanction_letter_path = None
+            unavailable = True
+        except Exception as e:
+            logger.error(f"Error in MasterAgent.process_message_stream: {str(e)}", exc_info=True)
+            error_text = "I apologize, but I encountered an error processing your request. Please try again."
+            if chunks:
+                error_text = "\n\n" + error_text
+            chunks.append(error_text)
+            yield {"type": "token", "text": error_text}
+            next_stage = current_stage
+            sanction_letter_path = None
+        
+        result = self._finish_turn(conversation_state, "".join(chunks), next_stage, sanction_letter_path, unavailable)
+        yield {"type": "done", **result}
+    
+    async def _run_stage(
+        self,
+        conversation_state: ConversationState,
+        user_message: str,
+        stream: bool = False
+    ) -> Tuple[Union[str, AsyncIterator[str]], str, Optional[str]]:
+        """
+        Route the turn to the worker agent for the current stage
+        
+        Returns (response, next_stage, sanction_letter_path). With stream=True,
+        LLM-generated responses are returned as an async iterator of text chunks
+        instead of a string.
+        """
         current_stage = conversation_state.stage
         response = ""
         next_stage = current_stage
         sanction_letter_path = None
         
-        try:
-            if current_stage == "GREETING":
+        if current_stage == "GREETING":
+            # Opening messages often already carry details ("I need 5 lakh for...")
+            await self.slot_filler.fill(
+                conversation_state,
+                user_message,
+                expected_slot=None,
+                use_llm=False
+            )
+            if stream:
+                response = self.sales_agent.greet_and_initiate_stream(
+                    user_message,
+                    conversation_state.messages
+                )
+            else:
                 response = await self.sales_agent.greet_and_initiate(
-                    user_message, 
+                    user_message,
                     conversation_state.messages
                 )
-                next_stage = "INFO_GATHERING"
+            next_stage = "INFO_GATHERING"
+        
+        elif current_stage == "INFO_GATHERING":
+            # Fill slots from the newest message into the existing application
+            await self.slot_filler.fill(
+                conversation_state,
+                user_message,
+                expected_slot=self.sales_agent.next_missing_field(
+                    conversation_state.loan_application.dict()
+                )
+            )
             
-            elif current_stage == "INFO_GATHERING":
-                # Extract loan information from conversation
-                loan_data = await self._extract_loan_info(conversation_state.messages)
-                
-                # Update loan_application with extracted information
-                if loan_data:
-                    conversation_state.loan_application = loan_data
-                
-                # Check if we have all required information
-                if self._is_info_complete(conversation_state.loan_application):
+            # Check if we have all required information
+            if self._is_info_complete(conversation_state.loan_application):
+                if stream:
+                    response = self.sales_agent.confirm_details_stream(
+                        conversation_state.loan_application.dict(),
+                        conversation_state.messages
+                    )
+                else:
                     response = await self.sales_agent.confirm_details(
                         conversation_state.loan_application.dict(),
                         conversation_state.messages
                     )
-                    next_stage = "VERIFICATION"
+                next_stage = "VERIFICATION"
+            else:
+                if stream:
+                    response = self.sales_agent.ask_missing_info_stream(
+                        conversation_state.loan_application.dict(),
+                        conversation_state.messages
+                    )
                 else:
                     response = await self.sales_agent.ask_missing_info(
                         conversation_state.loan_application.dict(),
                         conversation_state.messages
                     )
-                    next_stage = "INFO_GATHERING"
+                next_stage = "INFO_GATHERING"
+        
+        elif current_stage == "VERIFICATION":
+            # Check documents and KYC
+            verification_result = await self.verification_agent.verify_documents(
+                conversation_state.documents,
+                conversation_state.loan_application.dict()
+            )
             
-            elif current_stage == "VERIFICATION":
-                # Check documents and KYC
-                verification_result = await self.verification_agent.verify_documents(
-                    conversation_state.documents,
-                    conversation_state.loan_application.dict()
-                )
+            if verification_result["passed"]:
+                response = "Great! Your documents are verified. Now analyzing your eligibility..."
+                next_stage = "UNDERWRITING"
+            else:
+                missing_docs = verification_result.get("missing_docs", [])
                 
-                if verification_result["passed"]:
-                    response = "Great! Your documents are verified. Now analyzing your eligibility..."
-                    next_stage = "UNDERWRITING"
+                if "video_kyc_selfie" in missing_docs:
+                    response = "We need to verify your identity. Please complete the Video KYC process by taking a selfie."
+                    next_stage = "VIDEO_KYC"
                 else:
-                    missing_docs = verification_result.get("missing_docs", [])
-                    
-                    if "video_kyc_selfie" in missing_docs:
-                        response = "We need to verify your identity. Please complete the Video KYC process by taking a selfie."
-                        next_stage = "VIDEO_KYC"
-                    else:
-                        response = f"We need the following documents: {', '.join(missing_docs)}. Please upload them to proceed."
-                        next_stage = "VERIFICATION"
+                    response = f"We need the following documents: {', '.join(missing_docs)}. Please upload them to proceed."
+                    next_stage = "VERIFICATION"
 
-            elif current_stage == "VIDEO_KYC":
-                 # Check if video kyc is now present
-                if "video_kyc_selfie" in conversation_state.documents:
-                     response = "✅ Video KYC received and verified! Proceeding with final checks."
-                     # Re-run verification to ensure everything else is also there
-                     verification_result = await self.verification_agent.verify_documents(
-                        conversation_state.documents,
-                        conversation_state.loan_application.dict()
-                    )
-                     if verification_result["passed"]:
-                        next_stage = "UNDERWRITING"
-                     else:
-                        missing_docs = verification_result.get("missing_docs", [])
-                        response += f"\n\nWe still need: {', '.join(missing_docs)}."
-                        next_stage = "VERIFICATION"
-                else:
-                     response = "Please complete the Video KYC to proceed."
-                     next_stage = "VIDEO_KYC"
-            
-            elif current_stage == "UNDERWRITING":
-                # Risk assessment
-                decision = await self.underwriting_agent.assess_risk(
-                    conversation_state.loan_application.dict()
-                )
-                
-                conversation_state.decision = decision["status"]
-                
-                if decision["status"] == "APPROVED":
-                    loan_amount = conversation_state.loan_application.loan_amount or 0
-                    response = f"🎉 Congratulations! Your loan of ₹{loan_amount:,.0f} is APPROVED!"
-                    response += f"\n\nApproved Amount: ₹{decision.get('approved_amount', loan_amount):,.0f}"
-                    response += f"\nInterest Rate: {decision.get('interest_rate', 12.5)}% per annum"
-                    response += f"\nTenure: {decision.get('tenure', 36)} months"
-                    response += f"\nMonthly EMI: ₹{decision.get('monthly_emi', 0):,.0f}"
-                    next_stage = "SANCTION"
-                else:
-                    reason = decision.get("reason", "Eligibility criteria not met")
-                    response = f"Sorry, we cannot approve your loan at this time.\n\nReason: {reason}"
-                    if decision.get("suggestions"):
-                        response += f"\n\nSuggestions: {decision.get('suggestions')}"
-                    next_stage = "COMPLETED"
-            
-            elif current_stage == "SANCTION":
-                # Generate PDF sanction letter
-                pdf_path = await self.sanction_agent.generate_letter(
+        elif current_stage == "VIDEO_KYC":
+             # Check if video kyc is now present
+            if "video_kyc_selfie" in conversation_state.documents:
+                 response = "✅ Video KYC received and verified! Proceeding with final checks."
+                 # Re-run verification to ensure everything else is also there
+                 verification_result = await self.verification_agent.verify_documents(
+                    conversation_state.documents,
                     conversation_state.loan_application.dict()
                 )
-                sanction_letter_path = pdf_path
-                response = "Your sanction letter has been generated successfully!\n\n"
-                response += f"You can download it from: {pdf_path}\n\n"
-                response += "Please review the terms and conditions. Our team will contact you shortly to proceed with disbursement."
-                next_stage = "COMPLETED"
-            
+                 if verification_result["passed"]:
+                    next_stage = "UNDERWRITING"
+                 else:
+                    missing_docs = verification_result.get("missing_docs", [])
+                    response += f"\n\nWe still need: {', '.join(missing_docs)}."
+                    next_stage = "VERIFICATION"
             else:
-                # Default fallback
-                response = "Thank you for your interest. How can I assist you today?"
-                next_stage = "GREETING"
+                 response = "Please complete the Video KYC to proceed."
+                 next_stage = "VIDEO_KYC"
         
-        except Exception as e:
-            logger.error(f"Error in MasterAgent.process_message: {str(e)}", exc_info=True)
-            response = "I apologize, but I encountered an error processing your request. Please try again."
-            next_stage = current_stage
+        elif current_stage == "UNDERWRITING":
+            response, next_stage = await self._underwrite(conversation_state)
+        
+        elif current_stage == "COUNTER_OFFER":
+            offer = conversation_state.user_data.get("counter_offer")
+            reply = _offer_reply(user_message) if offer else False
+            if reply is None:
+                response = f"Would you like to go ahead with {describe_offer(offer)}? Please reply yes or no."
+                next_stage = "COUNTER_OFFER"
+            elif reply:
+                # Re-apply on the offered terms; underwriting prices at the accepted rate and tenure
+                application = conversation_state.loan_application
+                application.loan_amount = offer["amount"]
+                application.accepted_interest_rate = offer["interest_rate"]
+                application.accepted_tenure_months = offer["tenure_months"]
+                conversation_state.user_data.pop("counter_offer")
+                response, next_stage = await self._underwrite(conversation_state)
+            else:
+                conversation_state.user_data.pop("counter_offer", None)
+                response = "No problem. Your application is closed - you're welcome to apply again any time."
+                next_stage = "COMPLETED"
+        
+        elif current_stage == "SANCTION":
+            # Generate PDF sanction letter on the approved terms
+            pdf_path = await self.sanction_agent.generate_letter({
+                **conversation_state.loan_application.dict(),
+                **conversation_state.user_data.get("approved_terms", {})
+            })
+            sanction_letter_path = pdf_path
+            response = "Your sanction letter has been generated successfully!\n\n"
+            response += f"You can download it from: {pdf_path}\n\n"
+            response += "Please review the terms and conditions. Our team will contact you shortly to proceed with disbursement."
+            next_stage = "COMPLETED"
+        
+        else:
+            # Default fallback
+            response = "Thank you for your interest. How can I assist you today?"
+            next_stage = "GREETING"
+    
+        return response, next_stage, sanction_letter_path
+    
+    async def _underwrite(self, conversation_state: ConversationState) -> Tuple[str, str]:
+        """Assess the application and record the decision; returns (response, next_stage)"""
+        application = conversation_state.loan_application.dict()
+        decision = await self.underwriting_agent.assess_risk(application)
+        # Keep the bureau and CRM results with the application, so batch re-scoring sees the same inputs
+        conversation_state.loan_application.credit_score = application.get("credit_score")
+        conversation_state.loan_application.existing_loans = application.get("existing_loans")
+        
+        conversation_state.decision = decision["status"]
         
+        if decision["status"] == "APPROVED":
+            loan_amount = conversation_state.loan_application.loan_amount or 0
+            # The sanction letter states these terms
+            conversation_state.user_data["approved_terms"] = {
+                "interest_rate": decision["interest_rate"],
+                "tenure": decision["tenure"],
+                "monthly_emi": decision["monthly_emi"]
+            }
+            response = f"🎉 Congratulations! Your loan of ₹{loan_amount:,.0f} is APPROVED!"
+            response += f"\n\nApproved Amount: ₹{decision.get('approved_amount', loan_amount):,.0f}"
+            response += f"\nInterest Rate: {decision.get('interest_rate', 12.5)}% per annum"
+            response += f"\nTenure: {decision.get('tenure', 36)} months"
+            response += f"\nMonthly EMI: ₹{decision.get('monthly_emi', 0):,.0f}"
+            return response, "SANCTION"
+        
+        if decision["status"] == "MANUAL_REVIEW":
+            response = "Thank you! We couldn't complete all automated checks right now, so your application "
+            response += "has been sent for manual review. Our team will get back to you shortly."
+            return response, "COMPLETED"
+        
+        reason = decision.get("reason", "Eligibility criteria not met")
+        response = f"Sorry, we cannot approve your loan at this time.\n\nReason: {reason}"
+        offer = decision.get("counter_offer")
+        if offer:
+            # Keep the conversation open so the customer can take the offer
+            conversation_state.user_data["counter_offer"] = offer
+            response += f"\n\nGood news: you are eligible for {describe_offer(offer)}."
+            response += " Reply yes to accept this offer, or no to decline."
+            return response, "COUNTER_OFFER"
+        if decision.get("suggestions"):
+            response += f"\n\nSuggestions: {decision.get('suggestions')}"
+        return response, "COMPLETED"
+    
+    def _finish_turn(
+        self,
+        conversation_state: ConversationState,
+        response: str,
+        next_stage: str,
+        sanction_letter_path: Optional[str],
+        unavailable: bool = False
+    ) -> Dict[str, Any]:
+        """Record the assistant response and the next stage on the conversation"""
         # Update conversation state
         conversation_state.stage = next_stage
         
@@ -192,51 +397,10 @@ class MasterAgent:
             "response": response,
             "next_stage": next_stage,
             "conversation_state": conversation_state,
-            "sanction_letter_path": sanction_letter_path
+            "sanction_letter_path": sanction_letter_path,
+            "unavailable": unavailable
         }
     
-    async def _extract_loan_info(self, messages: List[Message]) -> Optional[LoanApplication]:
-        """Extract structured loan information from conversation history"""
-        # Build conversation context
-        conversation_text = "\n".join([
-            f"{msg.role}: {msg.content}" for msg in messages[-10:]  # Last 10 messages
-        ])
-        
-        schema = {
-            "name": "Full name of the applicant",
-            "loan_amount": "Loan amount requested (number only)",
-            "loan_purpose": "Purpose of the loan",
-            "monthly_salary": "Monthly salary/income (number only)",
-            "employment_type": "Type of employment (salaried, self-employed, etc.)",
-            "pan_number": "PAN card number if mentioned"
-        }
-        
-        try:
-            extracted = await self.claude_service.extract_structured_data(
-                conversation_text,
-                schema
-            )
-            
-            # Convert string numbers to floats
-            if "loan_amount" in extracted and extracted["loan_amount"]:
-                try:
-                    val = str(extracted["loan_amount"]).replace(',', '').replace('_', '').strip()
-                    extracted["loan_amount"] = float(val)
-                except (ValueError, TypeError):
-                    extracted["loan_amount"] = 0
-            
-            if "monthly_salary" in extracted and extracted["monthly_salary"]:
-                try:
-                    val = str(extracted["monthly_salary"]).replace(',', '').replace('_', '').strip()
-                    extracted["monthly_salary"] = float(val)
-                except (ValueError, TypeError):
-                    extracted["monthly_salary"] = 0
-            
-            return LoanApplication(**extracted)
-        except ValueError as e:
-            logger.error(f"Could not extract loan info from conversation: {e}")
-            return None
-    
     def _is_info_complete(self, loan_application: LoanApplication) -> bool:
         """Check if all required information is collected"""
         if not loan_application:
@@ -256,45 +420,62 @@ class MasterAgent:
         
         return True
     
-    async def process_file(
-        self, 
-        conversation_state: ConversationState,
-        file_info: Dict[str, Any], 
-        file_content: bytes, 
-        doc_type: str = "salary_slip"
-    ) -> Dict[str, Any]:
-        """Process an uploaded file"""
-        # Store document (in production, save to S3 or file system)
-        # For now, just mark as uploaded
-        conversation_state.documents[doc_type] = file_info.get("filename", "uploaded_file")
-        
-        # Process through verification agent
-        try:
-            result = await self.verification_agent.process_document(
-                file_info, 
-                file_content, 
-                conversation_state.conversation_id
-            )
-            return {
-                "message": result.get("message", "File processed successfully"),
-                "conversation_id": conversation_state.conversation_id,
-                "file_info": file_info,
-                "doc_type": doc_type
-            }
-        except Exception as e:
-            logger.error(f"Error processing file: {str(e)}")
-            return {
-                "message": f"Error processing file: {str(e)}",
-                "conversation_id": conversation_state.conversation_id,
-                "file_info": file_info
-            }
+    async def cached_document_result(
+        self,
+        sha256: Optional[str],
+        doc_type: str,
+        filename: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Processing result of an earlier upload with the same content and document type"""
+        if not sha256:
+            return None
+        cached = await self.blob_store.cached_result(sha256, doc_type)
+        if cached is None:
+            return None
+        return {**cached, "filename": filename, "cached": True}
+
+    async def process_document_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Document job handler: run the stored upload through verification"""
+        # An identical upload may have been processed while this job waited in the queue
+        cached = await self.cached_document_result(job.get("sha256"), job["doc_type"], job["filename"])
+        if cached is not None:
+            return cached
+
+        if not await asyncio.to_thread(os.path.isfile, job["file_path"]):
+            raise FileNotFoundError(f"Uploaded file is missing: {job['file_path']}")
+        file_info = {
+            "filename": job["filename"],
+            "content_type": job["content_type"],
+            "size": job["size"],
+            "doc_type": job["doc_type"]
+        }
+        result = await self.verification_agent.process_document(
+            file_info,
+            job["file_path"],
+            job["conversation_id"]
+        )
+        result = {**result, "doc_type": job["doc_type"]}
+        if job.get("sha256"):
+            await self.blob_store.store_result(job["sha256"], job["doc_type"], result)
+        return result
+
+    async def record_document_result(self, conversation_id: str, result: Dict[str, Any]):
+        """Keep a processed upload's parsed fields with the conversation, by filename as /api/ocr does (in-memory mode)"""
+        state = await self.conversations.get(conversation_id)
+        if state is None:
+            return
+        state.documents[result.get("filename") or "uploaded_file"] = {
+            "parsed": result.get("fields", {}),
+            "text_length": result.get("text_length", 0)
+        }
+        await self.conversations.save(state)
     
-    def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
+    async def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
         """Get conversation history as list of dicts"""
-        if conversation_id not in self.conversations:
+        state = await self.conversations.get(conversation_id)
+        if state is None:
             return []
         
-        state = self.conversations[conversation_id]
         return [
             {
                 "role": msg.role,
@@ -1,21 +1,47 @@
 import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 from app.models import Message
-from app.services.claude_service import ClaudeService
+from app.services.claude_service import ClaudeService, get_claude_service
 from app.services.mock_data import get_loan_products
 
 logger = logging.getLogger(__name__)
 
+MISSING_INFO_SYSTEM_PROMPT = """You are a friendly loan sales executive. The customer is applying for a loan.
+
+You will be told what information has been collected so far and which detail you need to ask for next.
+
+Ask for this information in a natural, conversational way. Explain WHY you need this info (e.g., "to determine your eligibility").
+Be friendly and make it feel like a conversation, not an interrogation."""
+
+LEGACY_SYSTEM_PROMPT = """You are a professional loan sales agent. Your role is to:
+1. Provide information about loan products
+2. Answer questions about interest rates, terms, and eligibility
+3. Guide customers through the initial loan inquiry process
+4. Collect basic information needed to proceed
+
+Be friendly, professional, and helpful. Always provide accurate information."""
+
 class SalesAgent:
     """Handles persuasive, human-like sales conversation"""
     
-    def __init__(self):
-        self.claude_service = ClaudeService()
+    def __init__(self, claude_service: Optional[ClaudeService] = None):
+        self.claude_service = claude_service or get_claude_service()
         self.loan_products = get_loan_products()
+        # The catalogue is constant, so it belongs in the cached system prefix
+        products_info = "\n".join([
+            f"- {product['name']}: {product['description']} (Rate: {product['rate']}%, Max Amount: ₹{product['max_amount']:,})"
+            for product in self.loan_products
+        ])
+        self.products_system_prompt = f"""{LEGACY_SYSTEM_PROMPT}
+
+Available Loan Products:
+{products_info}
+
+Provide a helpful response to the user's inquiry."""
     
-    async def greet_and_initiate(self, user_message: str, messages: List[Message]) -> str:
-        """Warm, persuasive greeting"""
+    def _greeting_request(self, user_message: str, messages: List[Message]) -> Dict[str, Any]:
+        """Build the Claude request for the warm, persuasive greeting"""
         system_prompt = """You are a friendly, persuasive loan sales executive for an NBFC (similar to Tata Capital style).
 
 Your goal:
@@ -37,30 +63,23 @@ Start with a warm greeting and ask how you can help them today. Be natural and e
         if not conversation_messages:
             conversation_messages = [{"role": "user", "content": user_message}]
         
-        response = await self.claude_service.chat(
-            system_prompt=system_prompt,
-            messages=conversation_messages,
-            max_tokens=200
-        )
-        
-        return response
+        return {
+            "system_prompt": system_prompt,
+            "messages": conversation_messages,
+            "max_tokens": 200
+        }
     
-    async def ask_missing_info(self, current_data: Dict[str, Any], messages: List[Message]) -> str:
-        """Intelligently ask for missing information"""
-        # Determine what's missing
-        missing_fields = []
+    def next_missing_field(self, current_data: Dict[str, Any]) -> Optional[str]:
+        """Return the next field to ask for, one at a time"""
         field_priority = ["loan_amount", "loan_purpose", "monthly_salary", "employment_type", "name"]
         
         for field in field_priority:
             if not current_data.get(field):
-                missing_fields.append(field)
-                break  # Ask for one at a time
-        
-        if not missing_fields:
-            # All info collected, but double-check
-            return await self.confirm_details(current_data, messages)
-        
-        field_name = missing_fields[0]
+                return field
+        return None
+    
+    def _missing_info_request(self, field_name: str, current_data: Dict[str, Any], messages: List[Message]) -> Dict[str, Any]:
+        """Build the Claude request asking for one missing field"""
         field_descriptions = {
             "loan_amount": "the loan amount you need",
             "loan_purpose": "the purpose of the loan (e.g., home renovation, medical expenses, education)",
@@ -69,31 +88,27 @@ Start with a warm greeting and ask how you can help them today. Be natural and e
             "name": "your full name"
         }
         
-        system_prompt = f"""You are a friendly loan sales executive. The customer is applying for a loan.
-
-Current information collected:
+        context = f"""Current information collected:
 {json.dumps(current_data, indent=2)}
 
-You need to ask for: {field_descriptions.get(field_name, field_name)}
-
-Ask for this information in a natural, conversational way. Explain WHY you need this info (e.g., "to determine your eligibility").
-Be friendly and make it feel like a conversation, not an interrogation."""
+You need to ask for: {field_descriptions.get(field_name, field_name)}"""
         
         conversation_messages = [
             {"role": msg.role, "content": msg.content}
             for msg in messages[-5:]
         ]
         
-        response = await self.claude_service.chat(
-            system_prompt=system_prompt,
-            messages=conversation_messages,
-            max_tokens=150
-        )
-        
-        return response
+        # Persuasive follow-ups should not repeat word for word
+        return {
+            "system_prompt": MISSING_INFO_SYSTEM_PROMPT,
+            "context": context,
+            "messages": conversation_messages,
+            "max_tokens": 150,
+            "cache": False
+        }
     
-    async def confirm_details(self, loan_data: Dict[str, Any], messages: List[Message]) -> str:
-        """Confirm all details before proceeding"""
+    def _confirm_request(self, loan_data: Dict[str, Any], messages: List[Message]) -> Dict[str, Any]:
+        """Build the Claude request confirming all details before proceeding"""
         system_prompt = """You are a loan sales executive confirming loan application details.
 
 Summarize all the collected information clearly and ask the customer to confirm if everything is correct.
@@ -117,38 +132,52 @@ Loan Application Summary:
             "content": f"Please confirm these details: {summary}"
         })
         
-        response = await self.claude_service.chat(
-            system_prompt=system_prompt,
-            messages=conversation_messages,
-            max_tokens=200
-        )
+        return {
+            "system_prompt": system_prompt,
+            "messages": conversation_messages,
+            "max_tokens": 200,
+            "cache": False
+        }
+    
+    async def greet_and_initiate(self, user_message: str, messages: List[Message]) -> str:
+        """Warm, persuasive greeting"""
+        return await self.claude_service.chat(**self._greeting_request(user_message, messages))
+    
+    async def greet_and_initiate_stream(self, user_message: str, messages: List[Message]) -> AsyncIterator[str]:
+        """Streaming variant of greet_and_initiate"""
+        async for chunk in self.claude_service.stream_chat(**self._greeting_request(user_message, messages)):
+            yield chunk
+    
+    async def ask_missing_info(self, current_data: Dict[str, Any], messages: List[Message]) -> str:
+        """Intelligently ask for missing information"""
+        field_name = self.next_missing_field(current_data)
+        if not field_name:
+            # All info collected, but double-check
+            return await self.confirm_details(current_data, messages)
         
-        return response
+        return await self.claude_service.chat(**self._missing_info_request(field_name, current_data, messages))
+    
+    async def ask_missing_info_stream(self, current_data: Dict[str, Any], messages: List[Message]) -> AsyncIterator[str]:
+        """Streaming variant of ask_missing_info"""
+        field_name = self.next_missing_field(current_data)
+        if not field_name:
+            request = self._confirm_request(current_data, messages)
+        else:
+            request = self._missing_info_request(field_name, current_data, messages)
+        
+        async for chunk in self.claude_service.stream_chat(**request):
+            yield chunk
+    
+    async def confirm_details(self, loan_data: Dict[str, Any], messages: List[Message]) -> str:
+        """Confirm all details before proceeding"""
+        return await self.claude_service.chat(**self._confirm_request(loan_data, messages))
+    
+    async def confirm_details_stream(self, loan_data: Dict[str, Any], messages: List[Message]) -> AsyncIterator[str]:
+        """Streaming variant of confirm_details"""
+        async for chunk in self.claude_service.stream_chat(**self._confirm_request(loan_data, messages)):
+            yield chunk
     
     async def handle_message(self, message: str, conversation_id: str) -> str:
         """Legacy method for backward compatibility"""
-        system_prompt = """You are a professional loan sales agent. Your role is to:
-        1. Provide information about loan products
-        2. Answer questions about interest rates, terms, and eligibility
-        3. Guide customers through the initial loan inquiry process
-        4. Collect basic information needed to proceed
-        
-        Be friendly, professional, and helpful. Always provide accurate information."""
-        
-        products_info = "\n".join([
-            f"- {product['name']}: {product['description']} (Rate: {product['rate']}%, Max Amount: ₹{product['max_amount']:,})"
-            for product in self.loan_products
-        ])
-        
-        enhanced_prompt = f"""{system_prompt}
-
-        Available Loan Products:
-        {products_info}
-
-        User Message: {message}
-        
-        Provide a helpful response to the user's inquiry.
-        """
-        
-        response = await self.claude_service.get_completion(enhanced_prompt)
+        response = await self.claude_service.get_completion(message, system_prompt=self.products_system_prompt)
         return response
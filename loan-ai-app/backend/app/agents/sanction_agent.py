@@ -1,17 +1,22 @@
 import os
 import logging
 from datetime import datetime
-from typing import Dict, Any
-from app.services.claude_service import ClaudeService
-from app.utils.helpers import generate_sanction_letter
+from typing import Dict, Any, Optional
+from app.services.claude_service import ClaudeService, get_claude_service
+from app.services.pdf_renderer import SanctionLetterRenderer, get_pdf_renderer
 
 logger = logging.getLogger(__name__)
 
 class SanctionAgent:
     """Handles final loan sanction and document generation"""
     
-    def __init__(self):
-        self.claude_service = ClaudeService()
+    def __init__(
+        self,
+        claude_service: Optional[ClaudeService] = None,
+        pdf_renderer: Optional[SanctionLetterRenderer] = None
+    ):
+        self.claude_service = claude_service or get_claude_service()
+        self.pdf_renderer = pdf_renderer or get_pdf_renderer()
         # Create directory for generated documents
         self.doc_dir = "./generated_docs"
         os.makedirs(self.doc_dir, exist_ok=True)
@@ -27,18 +32,14 @@ class SanctionAgent:
             File path to generated PDF
         """
         try:
-            # Generate PDF using helper function
-            pdf_bytes = generate_sanction_letter(user_data)
-            
-            # Save to file
             name = user_data.get("name", "Customer").replace(" ", "_")
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"sanction_letter_{name}_{timestamp}.pdf"
             filepath = os.path.join(self.doc_dir, filename)
-            
-            with open(filepath, "wb") as f:
-                f.write(pdf_bytes)
-            
+
+            # Rendered and written by the PDF worker pool, off the event loop
+            await self.pdf_renderer.render(user_data, filepath)
+
             logger.info(f"Generated sanction letter: {filepath}")
             
             # Return relative path (in production, return S3 URL or signed URL)
@@ -56,14 +57,9 @@ class SanctionAgent:
         3. Guide customers on next steps after approval
         4. Assist with sanction letter generation
         
-        Be clear and celebratory (when appropriate) while maintaining professionalism."""
-        
-        prompt = f"""{system_prompt}
-
-        User Message: {message}
+        Be clear and celebratory (when appropriate) while maintaining professionalism.
         
-        Provide a helpful response about the loan sanction process.
-        """
+        Provide a helpful response about the loan sanction process."""
         
-        response = await self.claude_service.get_completion(prompt)
+        response = await self.claude_service.get_completion(message, system_prompt=system_prompt)
         return response
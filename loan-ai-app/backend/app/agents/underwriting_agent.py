@@ -1,27 +1,52 @@
+import asyncio
 import logging
-from typing import Dict, Any
-from app.services.claude_service import ClaudeService
-from app.services.mock_data import MockDataService
+from typing import Dict, Any, Optional, List, Tuple
+from app.config import settings
+from app.services.claude_service import ClaudeService, get_claude_service
+from app.services.bureau_cache import CachedBureauService, get_bureau_service
+from app.services.policy_engine import get_policy
+from app.services.offer_optimiser import optimise_offer, describe_offer
 
 logger = logging.getLogger(__name__)
 
+# External lookups; each has a `underwriting_<source>_timeout` setting
+LOOKUP_SOURCES = ("bureau", "crm", "offer")
+
+# Sources without which an application cannot be approved automatically
+REQUIRED_SOURCES = ("bureau", "crm")
+
+
 class UnderwritingAgent:
     """Handles credit assessment and underwriting decisions"""
     
-    def __init__(self):
-        self.claude_service = ClaudeService()
-        self.mock_service = MockDataService()
+    def __init__(
+        self,
+        claude_service: Optional[ClaudeService] = None,
+        bureau_service: Optional[CachedBureauService] = None
+    ):
+        self.claude_service = claude_service or get_claude_service()
+        self.bureau_service = bureau_service or get_bureau_service()
     
     async def assess_risk(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Loan approval logic with eligibility rules
         
-        Rules:
+        Rules come from the underwriting policy (policies/underwriting.json);
+        the default policy checks:
         1. Salary >= 3x monthly EMI
         2. Loan amount <= 10x monthly salary
         3. No existing loan > 50% of salary
         4. Credit score > 650 (if available)
         
+        Bureau, CRM and Offer Mart lookups run concurrently. If the bureau or
+        CRM cannot be reached in time the result is MANUAL_REVIEW unless a rule
+        that does not need them already rejects. The credit score and existing
+        loans that were looked up are written into `user_data`, so the caller
+        can store them with the application (batch re-scoring reads them).
+        
+        Pricing always comes from the policy's terms for the loan purpose, as in
+        batch re-scoring; the Offer Mart answer is only reported (`offer_mart`).
+        
         Returns:
             {
                 "status": "APPROVED" | "REJECTED" | "MANUAL_REVIEW",
@@ -30,93 +55,126 @@ class UnderwritingAgent:
                 "interest_rate": float,
                 "tenure": int,
                 "monthly_emi": float,
-                "suggestions": List[str]
+                "suggestions": List[str],
+                "rules_fired": List[str] - id of the rule that rejected, if any,
+                "counter_offer": Dict - best approvable amount/tenure, when rejected on affordability,
+                "offer_mart": Dict - Offer Mart eligibility answer, if it replied,
+                "timeline": List[Dict] - status and timing of each lookup
             }
         """
-        loan_amount = user_data.get("loan_amount", 0)
-        monthly_salary = user_data.get("monthly_salary", 0)
-        pan_number = user_data.get("pan_number")
+        lookups, timeline = await self._run_lookups(user_data)
         
-        # Get credit score (mock for now)
         credit_score = user_data.get("credit_score")
-        if not credit_score and pan_number:
-            credit_score = await self.mock_service.get_credit_score(pan_number)
+        if not credit_score and lookups.get("bureau") is not None:
+            credit_score = lookups["bureau"]
             user_data["credit_score"] = credit_score
         
-        # Get existing loans
-        existing_loans_info = {}
-        if pan_number:
-            existing_loans_info = await self.mock_service.check_existing_loans(pan_number)
+        existing_loans_info = lookups.get("crm")
+        if existing_loans_info is not None:
             user_data["existing_loans"] = existing_loans_info.get("existing_loans", 0)
             user_data["outstanding_emi"] = existing_loans_info.get("outstanding_emi", 0)
         
-        existing_loans = user_data.get("existing_loans", 0)
+        # Sources we needed but could not reach
+        unavailable = [
+            entry["source"] for entry in timeline
+            if entry["source"] in REQUIRED_SOURCES and entry["status"] not in ("ok", "skipped")
+        ]
         
-        # Calculate EMI (assuming 12.5% interest, 36 months tenure)
-        interest_rate = 12.5
-        tenure_months = 36
-        monthly_interest = interest_rate / 12 / 100
-        monthly_emi = (loan_amount * monthly_interest * (1 + monthly_interest) ** tenure_months) / \
-                      ((1 + monthly_interest) ** tenure_months - 1)
+        decision = self._decide(user_data, unavailable)
+        decision["offer_mart"] = lookups.get("offer")
+        decision["timeline"] = timeline
+        return decision
+    
+    async def _run_lookups(self, user_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Query the credit bureau, CRM and Offer Mart concurrently
         
-        # Rule 1: Salary >= 3x monthly EMI
-        if monthly_salary < monthly_emi * 3:
-            return {
-                "status": "REJECTED",
-                "reason": f"Monthly salary (₹{monthly_salary:,.0f}) is insufficient for EMI repayment (₹{monthly_emi:,.0f}). Required: ₹{monthly_emi * 3:,.0f}",
-                "suggestions": [
-                    "Consider reducing the loan amount",
-                    "Increase the loan tenure",
-                    "Wait until your salary increases"
-                ]
-            }
+        Each lookup has its own timeout; a slow or failing source yields None
+        instead of holding up the others.
         
-        # Rule 2: Loan amount <= 10x monthly salary
-        max_eligible = monthly_salary * 10
-        if loan_amount > max_eligible:
-            return {
-                "status": "REJECTED",
-                "reason": f"Loan amount (₹{loan_amount:,.0f}) exceeds eligibility limit (₹{max_eligible:,.0f}). Maximum eligible: 10x monthly salary",
-                "suggestions": [
-                    f"Reduce loan amount to ₹{max_eligible:,.0f} or less",
-                    "Consider applying after salary increase"
-                ]
-            }
+        Returns:
+            ({source: result or None}, timeline entries with status and timings)
+        """
+        pan_number = user_data.get("pan_number")
+        calls = {}
+        if pan_number and not user_data.get("credit_score"):
+            calls["bureau"] = lambda: self.bureau_service.get_credit_score(pan_number)
+        if pan_number:
+            calls["crm"] = lambda: self.bureau_service.check_existing_loans(pan_number)
+        calls["offer"] = lambda: self.bureau_service.get_offer_eligibility(
+            user_data.get("loan_amount", 0), user_data.get("monthly_salary", 0)
+        )
         
-        # Rule 3: Existing loans <= 50% of salary
-        if existing_loans > monthly_salary * 0.5:
-            return {
-                "status": "REJECTED",
-                "reason": f"Existing loans (₹{existing_loans:,.0f}) exceed 50% of monthly salary. This indicates high debt burden.",
-                "suggestions": [
-                    "Pay off existing loans first",
-                    "Reduce the new loan amount"
-                ]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        
+        async def timed(source: str):
+            timeout = getattr(settings, f"underwriting_{source}_timeout")
+            begin = loop.time()
+            try:
+                result = await asyncio.wait_for(calls[source](), timeout=timeout)
+                status = "ok"
+            except asyncio.TimeoutError:
+                logger.warning(f"Underwriting lookup '{source}' timed out after {timeout}s")
+                result, status = None, "timeout"
+            except Exception as e:
+                logger.error(f"Underwriting lookup '{source}' failed: {e}")
+                result, status = None, "error"
+            return source, result, {
+                "source": source,
+                "status": status,
+                "started_ms": round((begin - started) * 1000, 1),
+                "duration_ms": round((loop.time() - begin) * 1000, 1),
+                "timeout_s": timeout
             }
         
-        # Rule 4: Credit score check
-        if credit_score and credit_score < 650:
+        completed = await asyncio.gather(*(timed(source) for source in calls))
+        
+        results = {source: result for source, result, _ in completed}
+        timeline = [entry for _, _, entry in completed]
+        timeline += [
+            {"source": source, "status": "skipped"}
+            for source in LOOKUP_SOURCES if source not in calls
+        ]
+        logger.info(f"Underwriting lookups finished in {(loop.time() - started) * 1000:.0f}ms: "
+                    f"{ {entry['source']: entry['status'] for entry in timeline} }")
+        return results, timeline
+    
+    def _decide(
+        self,
+        application: Dict[str, Any],
+        unavailable: List[str]
+    ) -> Dict[str, Any]:
+        """Apply the underwriting policy to the application and lookup results"""
+        policy = get_policy()
+        loan_purpose = application.get("loan_purpose")
+        values, terms = policy.values_for(application)
+        credit_score = values["credit_score"]
+        decision = policy.evaluate(values)
+        
+        # Bureau/CRM-dependent rules could not be checked - don't approve blind
+        if decision["status"] == "APPROVED" and unavailable:
             return {
-                "status": "REJECTED",
-                "reason": f"Credit score ({credit_score}) is below minimum requirement (650)",
-                "suggestions": [
-                    "Improve your credit score by paying bills on time",
-                    "Reduce existing debt",
-                    "Wait 3-6 months and reapply"
-                ]
+                "status": "MANUAL_REVIEW",
+                "reason": f"Could not complete checks with: {', '.join(unavailable)}. Your application will be reviewed by our team.",
+                "credit_score": credit_score,
+                "unavailable_sources": unavailable,
+                "suggestions": [],
+                "rules_fired": [],
+                "policy_version": decision["policy_version"]
             }
         
-        # All rules passed - APPROVED
-        return {
-            "status": "APPROVED",
-            "reason": "All eligibility criteria met",
-            "approved_amount": loan_amount,
-            "interest_rate": interest_rate,
-            "tenure": tenure_months,
-            "monthly_emi": monthly_emi,
-            "credit_score": credit_score,
-            "suggestions": []
-        }
+        if terms["product"]:
+            decision["product"] = terms["product"]
+        
+        # Rejected on affordability - work out what we *can* offer
+        if decision["status"] == "REJECTED" and policy.optimiser \
+                and set(decision["rules_fired"]) & policy.optimiser["rules"]:
+            counter_offer = optimise_offer(policy, values, loan_purpose)
+            if counter_offer:
+                decision["counter_offer"] = counter_offer
+                decision["suggestions"].insert(0, f"You are eligible for {describe_offer(counter_offer)}")
+        return decision
     
     async def handle_message(self, message: str, conversation_id: str) -> str:
         """Legacy method for backward compatibility"""
@@ -126,14 +184,9 @@ class UnderwritingAgent:
         3. Provide risk assessments
         4. Guide customers on improving their loan eligibility
         
-        Be professional and transparent about the assessment process. Explain decisions clearly."""
+        Be professional and transparent about the assessment process. Explain decisions clearly.
         
-        prompt = f"""{system_prompt}
-
-        User Message: {message}
-        
-        Provide a helpful response about the underwriting process.
-        """
+        Provide a helpful response about the underwriting process."""
         
-        response = await self.claude_service.get_completion(prompt)
+        response = await self.claude_service.get_completion(message, system_prompt=system_prompt)
         return response
@@ -1,7 +1,9 @@
 import asyncio
 import logging
-from typing import Dict, Any
-from app.services.claude_service import ClaudeService
+from typing import Dict, Any, Optional
+from app.services.claude_service import ClaudeService, get_claude_service
+from app.services.ocr_service import parse_key_fields
+from app.services.ocr_executor import OCRExecutor, get_ocr_executor
 
 logger = logging.getLogger(__name__)
 
@@ -10,8 +12,13 @@ import re
 class VerificationAgent:
     """Handles KYC and document verification"""
     
-    def __init__(self):
-        self.claude_service = ClaudeService()
+    def __init__(
+        self,
+        claude_service: Optional[ClaudeService] = None,
+        ocr_executor: Optional[OCRExecutor] = None
+    ):
+        self.claude_service = claude_service or get_claude_service()
+        self.ocr_executor = ocr_executor or get_ocr_executor()
         self.pan_regex = re.compile(r"^[A-Z]{5}[0-9]{4}[A-Z]$")
 
     async def verify_documents(
@@ -79,26 +86,32 @@ class VerificationAgent:
     async def process_document(
         self, 
         file_info: dict, 
-        file_content: bytes, 
+        file_path: str,
         conversation_id: str
     ) -> dict:
-        """Process an uploaded document"""
-        # In a real implementation, this would:
-        # 1. Save file to storage (S3, local filesystem)
-        # 2. Extract text from PDF/images using OCR (Tesseract, AWS Textract)
-        # 3. Validate document format
-        # 4. Extract relevant information (salary, PAN number, etc.)
-        # 5. Store document securely
-        
-        # For MVP, just acknowledge receipt
-        await asyncio.sleep(0.5)  # Simulate processing
-        
+        """
+        Process an uploaded document: OCR (images only) and key-field parsing
+
+        Runs in the document job workers, not in the upload request.
+        """
+        # Still to do in production:
+        # 1. Validate document format
+        # 2. Cross-check the parsed fields with the application
+        # 3. Use Claude Vision API to verify document authenticity
+        text = ""
+        if (file_info.get("content_type") or "").startswith("image/"):
+            # Tesseract runs in the OCR process pool; a full queue raises PoolBusyError and the job is retried
+            text = await self.ocr_executor.extract_text(file_path, doc_type=file_info.get("doc_type"))
+        fields = parse_key_fields(text)
+
         return {
-            "status": "received",
+            "status": "processed",
             "filename": file_info.get("filename"),
-            "message": "Document received and is being processed. We'll verify the information shortly."
+            "fields": fields,
+            "text_length": len(text),
+            "message": "Document processed. We'll verify the information shortly."
         }
-    
+
     async def handle_message(self, message: str, conversation_id: str) -> str:
         """Legacy method for backward compatibility"""
         system_prompt = """You are a KYC (Know Your Customer) verification agent. Your role is to:
@@ -107,14 +120,9 @@ class VerificationAgent:
         3. Explain verification requirements
         4. Confirm when documents are received and being processed
         
-        Be clear about what documents are needed and why. Maintain a professional, reassuring tone."""
+        Be clear about what documents are needed and why. Maintain a professional, reassuring tone.
         
-        prompt = f"""{system_prompt}
-
-        User Message: {message}
-        
-        Provide a helpful response about the verification process.
-        """
+        Provide a helpful response about the verification process."""
         
-        response = await self.claude_service.get_completion(prompt)
+        response = await self.claude_service.get_completion(message, system_prompt=system_prompt)
         return response
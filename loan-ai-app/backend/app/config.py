@@ -27,6 +27,35 @@ class Settings(BaseSettings):
 
     # Claude
     anthropic_api_key: str = os.getenv("ANTHROPIC_API_KEY", "")
+    llm_max_attempts: int = 3
+    llm_backoff_base_delay: float = 0.5  # seconds, doubled per retry (with full jitter)
+    llm_backoff_max_delay: float = 8.0
+    llm_request_deadline: float = 30.0  # total seconds budget per request, retries included
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_recovery_timeout: float = 30.0
+    llm_max_connections: int = 20  # shared pool across all agents
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 30.0
+    llm_http2: bool = True  # needs the 'h2' package, else HTTP/1.1
+    llm_max_in_flight: int = 8  # concurrent Claude calls across all requests
+    llm_tokens_per_minute: int = 40000  # estimated input+output tokens
+    llm_prompt_caching: bool = True  # mark static system prompts with cache_control
+    llm_prompt_cache_min_tokens: int = 1024  # API minimum cacheable prefix (1024 Sonnet/Opus, 2048 Haiku); shorter prompts are not marked
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 3600
+    llm_cache_max_entries: int = 1000
+    llm_cache_sqlite_path: str = ""  # e.g. ./cache/llm_cache.sqlite3 to share across restarts; empty = memory only
+
+    # Underwriting lookups (seconds)
+    underwriting_bureau_timeout: float = 2.0
+    underwriting_crm_timeout: float = 2.0
+    underwriting_offer_timeout: float = 2.0
+    underwriting_policy_path: str = str(BASE_DIR / "policies" / "underwriting.json")  # JSON or YAML
+    underwriting_policy_reload_interval: float = 5.0  # seconds between checks for policy file changes
+    bureau_cache_ttl_seconds: int = 86400  # a bureau pull is reused for a day
+    bureau_cache_max_entries: int = 10000
+    bureau_cache_sqlite_path: str = ""  # shared across workers on one host; empty = memory only
+    bureau_cache_key_secret: str = ""  # HMAC key for PANs in cache keys; empty = secret_key
 
     # CORS
     allowed_origins: List[str] = ["http://localhost:5173", "http://localhost:3000", "http://localhost:3002", "http://localhost:3003"]
@@ -35,13 +64,51 @@ class Settings(BaseSettings):
     upload_dir: Path = BASE_DIR / "uploads"
     generated_docs_dir: Path = BASE_DIR / "generated_docs"
     max_file_size: int = 5242880  # 5MB
+    document_jobs_path: str = str(BASE_DIR / "data" / "document_jobs.sqlite3")  # durable upload processing queue
+    document_job_workers: int = 2
+    document_job_max_attempts: int = 3  # then the job is dead-lettered
+    document_job_retry_delay: float = 2.0  # seconds, doubled per retry (with full jitter)
+    document_job_lease_seconds: float = 60.0  # a running job not heartbeated for this long is re-queued
+    blob_index_path: str = str(BASE_DIR / "data" / "blobs.sqlite3")  # upload reference counts and cached results
+    blob_gc_interval: float = 3600.0  # seconds between collections of unreferenced uploads; 0 disables
+    blob_gc_grace_seconds: float = 86400.0  # unreferenced uploads are kept this long (queued jobs may still read them)
+
+    # Sanction letters
+    pdf_render_workers: int = 2  # worker processes; 0 renders in a thread instead
+    pdf_render_max_queue: int = 32  # letters waiting for a worker before new ones are refused
+    pdf_render_timeout: float = 30.0  # seconds
+
+    # OCR
+    ocr_workers: int = 2  # Tesseract worker processes; 0 runs OCR in a thread instead
+    ocr_max_queue: int = 16  # images waiting for a worker before /api/ocr answers 429
+    ocr_timeout: float = 30.0  # seconds per image; tesseract is killed when it runs over
+    ocr_preprocess: bool = True  # EXIF fix, downscale, binarise and deskew before OCR
+    ocr_target_dpi: int = 300
+    ocr_roi_crop: bool = False  # crop PAN cards to the text region; only for tightly cropped card scans
 
     # Server
     port: int = 8000
     host: str = "0.0.0.0"
 
+    # Chat
+    chat_history_window: int = 10  # most recent messages loaded per turn
+
+    # In-memory conversations (USE_DATABASE=false)
+    conversation_store_max_sessions: int = 10000
+    conversation_store_idle_ttl: float = 21600.0  # seconds without activity before a session is evicted
+    conversation_store_memory_budget_mb: int = 256  # serialised size of the sessions kept in memory
+    conversation_spill_sqlite_path: str = ""  # evicted sessions are kept here; empty = they are dropped
+    conversation_spill_ttl_seconds: float = 2592000.0  # spilled sessions are deleted after 30 days
+    conversation_store_url: str = ""  # redis://host:6379/0 shares conversations between workers; empty = per-process store
+    conversation_store_ttl_seconds: float = 86400.0  # shared conversations expire this long after their last turn
+    conversation_store_codec: str = "json"  # or "msgpack" (needs the msgpack package)
+
+    # Dashboard stats
+    stats_counters: bool = True  # keep decision counts in memory instead of counting on every poll
+    stats_resync_interval: float = 60.0  # seconds; picks up decisions written by other workers
+
     # Rate Limiting
-    rate_limit_per_minute: int = 60
+    rate_limit_per_minute: int = 60  # Claude requests per minute (see ClaudeService admission control)
 
     # Monitoring (optional)
     sentry_dsn: str = ""
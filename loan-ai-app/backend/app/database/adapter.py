@@ -1,22 +1,36 @@
 """
 Database adapter to convert between database models and application models
 """
-from app.database.models import Conversation as DBConversation, LoanApplication as DBLoanApplication, Message
+from datetime import datetime
+from typing import List, Optional
+from app.database.models import Conversation as DBConversation, LoanApplication as DBLoanApplication, Message as DBMessage
 from app.models import ConversationState, Message
 
-def db_conversation_to_state(db_conv: DBConversation) -> "ConversationState":
-    """Convert database Conversation to ConversationState"""
+def db_conversation_to_state(
+    db_conv: DBConversation,
+    db_messages: Optional[List[DBMessage]] = None,
+    message_offset: int = 0
+) -> "ConversationState":
+    """Convert database Conversation to ConversationState
+
+    If `db_messages` is given (a window of the most recent messages, oldest first)
+    it is used instead of the full `db_conv.messages` relationship, and
+    `message_offset` records how many older messages were left out.
+    """
     from app.models import LoanApplication
+    if db_messages is None:
+        db_messages = db_conv.messages
     messages = [
         Message(
             role=msg.role,
             content=msg.content,
             timestamp=msg.timestamp
         )
-        for msg in sorted(db_conv.messages, key=lambda x: x.timestamp)
+        for msg in db_messages
     ]
 
-    loan_application = None
+    # Same default as MasterAgent.create_conversation - agents always call .dict() on it
+    loan_application = LoanApplication()
     if db_conv.loan_application:
         loan_application = LoanApplication(
             name=db_conv.loan_application.name,
@@ -26,6 +40,9 @@ def db_conversation_to_state(db_conv: DBConversation) -> "ConversationState":
             employment_type=db_conv.loan_application.employment_type,
             credit_score=db_conv.loan_application.credit_score,
             existing_loans=db_conv.loan_application.existing_loans,
+            pan_number=db_conv.loan_application.pan_number,
+            accepted_interest_rate=db_conv.loan_application.accepted_interest_rate,
+            accepted_tenure_months=db_conv.loan_application.accepted_tenure_months,
         )
 
     return ConversationState(
@@ -34,7 +51,10 @@ def db_conversation_to_state(db_conv: DBConversation) -> "ConversationState":
         messages=messages,
         loan_application=loan_application,
         documents={doc.doc_type: doc.filename for doc in db_conv.documents},
-        decision=db_conv.decision
+        decision=db_conv.decision,
+        user_data=db_conv.user_data or {},
+        message_offset=message_offset,
+        created_at=db_conv.created_at or datetime.utcnow()
     )
 
 def state_to_db_conversation(state: "ConversationState", db_conv: DBConversation = None) -> DBConversation:
@@ -59,6 +79,9 @@ def state_to_db_conversation(state: "ConversationState", db_conv: DBConversation
         db_conv.loan_application.employment_type = state.loan_application.employment_type
         db_conv.loan_application.credit_score = state.loan_application.credit_score
         db_conv.loan_application.existing_loans = state.loan_application.existing_loans
+        db_conv.loan_application.pan_number = state.loan_application.pan_number
+        db_conv.loan_application.accepted_interest_rate = state.loan_application.accepted_interest_rate
+        db_conv.loan_application.accepted_tenure_months = state.loan_application.accepted_tenure_months
 
     return db_conv
 
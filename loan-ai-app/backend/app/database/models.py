@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Text, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Text, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -22,6 +22,14 @@ class Conversation(Base):
     loan_application = relationship("LoanApplication", back_populates="conversation", uselist=False, cascade="all, delete-orphan")
     documents = relationship("Document", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination of the admin application list, newest first, optionally filtered by status or stage.
+        # The decision index also serves the GROUP BY decision behind /api/stats.
+        Index("ix_conversations_created_at_id", "created_at", "id"),
+        Index("ix_conversations_decision_created_at_id", "decision", "created_at", "id"),
+        Index("ix_conversations_stage_created_at_id", "stage", "created_at", "id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     
@@ -34,6 +42,11 @@ class Message(Base):
     
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # Serves "last N messages of a conversation" without scanning its history
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp"),
+    )
+
 class LoanApplication(Base):
     __tablename__ = "loan_applications"
     
@@ -44,6 +57,7 @@ class LoanApplication(Base):
     name = Column(String, nullable=True)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
+    pan_number = Column(String, nullable=True)
     
     # Loan details
     loan_amount = Column(Float, nullable=True)
@@ -58,6 +72,9 @@ class LoanApplication(Base):
     interest_rate = Column(Float, nullable=True)
     tenure_months = Column(Integer, nullable=True)
     monthly_emi = Column(Float, nullable=True)
+    # Counter-offer terms the customer accepted; underwriting prices at these instead of the policy's
+    accepted_interest_rate = Column(Float, nullable=True)
+    accepted_tenure_months = Column(Integer, nullable=True)
     
     # Status
     status = Column(String, default="PENDING")  # PENDING, APPROVED, REJECTED
@@ -68,6 +85,11 @@ class LoanApplication(Base):
     
     conversation = relationship("Conversation", back_populates="loan_application")
 
+    __table_args__ = (
+        # Admin application list sorted by amount (keyset on amount, conversation)
+        Index("ix_loan_applications_amount_conversation", "loan_amount", "conversation_id"),
+    )
+
 class Document(Base):
     __tablename__ = "documents"
     
@@ -79,6 +101,8 @@ class Document(Base):
     file_path = Column(String, nullable=True)  # Path to stored file
     file_size = Column(Integer, nullable=True)
     mime_type = Column(String, nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)  # content hash; file_path is its blob
+    parsed_fields = Column(JSON, nullable=True)  # OCR fields (PAN, name, ...) once the document job has run
     
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     
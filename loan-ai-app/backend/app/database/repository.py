@@ -0,0 +1,305 @@
+"""
+Conversation repository - single place where conversations are loaded and written back
+"""
+import json
+import base64
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+
+from sqlalchemy import select, update, func, literal, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.database.models import (
+    Conversation as DBConversation,
+    Message as DBMessage,
+    Document as DBDocument,
+    LoanApplication as DBLoanApplication,
+)
+from app.database.adapter import db_conversation_to_state, state_to_db_conversation
+from app.models import ConversationState
+
+# Orderings for the admin application list; each is a unique, indexed key
+APPLICATION_SORTS = ("created_at", "amount")
+
+# Dashboard status for conversations without a decision yet
+IN_PROGRESS = "IN_PROGRESS"
+
+
+def encode_cursor(sort: str, key: Tuple[Any, ...]) -> str:
+    """Opaque page cursor: the sort key of the last row served"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    payload = json.dumps({"sort": sort, "key": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    """Sort key from `encode_cursor`: (created_at or loan_amount, conversation id)
+
+    Raises:
+        ValueError: malformed cursor, or one issued for a different sort
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = payload["key"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if payload.get("sort") != sort or not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Cursor does not match this sort order")
+    try:
+        first = float(values[0]) if sort == "amount" else datetime.fromisoformat(values[0])
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return first, str(values[1])
+
+
+class ConversationRepository:
+    """Loads a conversation with all its relationships in a fixed number of queries.
+
+    Relationships are eager-loaded up front (messages/documents via selectinload,
+    loan_application via joinedload) so the adapter never triggers a lazy load,
+    which asyncpg sessions do not allow anyway. Per-turn paths use `load_state`,
+    which only reads a window of the most recent messages.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        # Conversations created through this repository, for callers keeping counts after commit
+        self.created: List[str] = []
+
+    @staticmethod
+    def _full_load_options():
+        return (
+            selectinload(DBConversation.messages),
+            selectinload(DBConversation.documents),
+            joinedload(DBConversation.loan_application),
+        )
+
+    async def get(self, conversation_id: str) -> Optional[DBConversation]:
+        """Fetch a conversation with messages, documents and loan application"""
+        result = await self.db.execute(
+            select(DBConversation)
+            .where(DBConversation.id == conversation_id)
+            .options(*self._full_load_options())
+        )
+        return result.unique().scalar_one_or_none()
+
+    async def get_windowed(self, conversation_id: str) -> Optional[DBConversation]:
+        """Fetch a conversation with documents and loan application but not its messages"""
+        result = await self.db.execute(
+            select(DBConversation)
+            .where(DBConversation.id == conversation_id)
+            .options(
+                raiseload(DBConversation.messages),
+                selectinload(DBConversation.documents),
+                joinedload(DBConversation.loan_application),
+            )
+        )
+        return result.unique().scalar_one_or_none()
+
+    async def get_recent_messages(self, conversation_id: str, window: int) -> Tuple[List[DBMessage], int]:
+        """Fetch the last `window` messages (oldest first) and the total message count"""
+        if window <= 0:
+            return [], 0
+
+        total = func.count().over().label("total")
+        result = await self.db.execute(
+            select(DBMessage, total)
+            .where(DBMessage.conversation_id == conversation_id)
+            .order_by(DBMessage.timestamp.desc())
+            .limit(window)
+        )
+        rows = result.all()
+        if not rows:
+            return [], 0
+        return [row[0] for row in reversed(rows)], rows[0][1]
+
+    async def load_state(
+        self,
+        conversation_id: str,
+        message_window: int,
+        create: bool = False
+    ) -> Tuple[Optional[DBConversation], Optional[ConversationState]]:
+        """Load a conversation as ConversationState holding only its last `message_window` messages
+
+        A long-running conversation costs the same per turn as a fresh one. Use
+        `get` when the full transcript is needed.
+        """
+        db_conv = await self.get_windowed(conversation_id)
+        if db_conv is None:
+            if not create:
+                return None, None
+            db_conv = await self.create(conversation_id)
+            return db_conv, db_conversation_to_state(db_conv)
+
+        db_messages, total = await self.get_recent_messages(conversation_id, message_window)
+        state = db_conversation_to_state(
+            db_conv,
+            db_messages=db_messages,
+            message_offset=total - len(db_messages)
+        )
+        return db_conv, state
+
+    async def create(self, conversation_id: str, stage: str = "GREETING") -> DBConversation:
+        """Create a new conversation with empty, already-loaded relationships"""
+        db_conv = DBConversation(
+            id=conversation_id,
+            stage=stage,
+            messages=[],
+            documents=[],
+            loan_application=None,
+        )
+        self.db.add(db_conv)
+        await self.db.flush()
+        self.created.append(conversation_id)
+        return db_conv
+
+    async def list_applications(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        stage: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        sort: str = "created_at",
+        descending: bool = True,
+    ) -> Tuple[List[Row], Optional[str]]:
+        """One page of the admin application list and the cursor for the next page (None on the last)
+
+        Only the dashboard's columns are selected, and pages are found by seeking
+        past the previous page's last key rather than OFFSET. A page then costs
+        the same however deep it is. `sort` is "created_at" (key: created_at, id)
+        or "amount" (key: loan_amount, conversation_id; conversations without an
+        amount are left out).
+
+        Raises:
+            ValueError: malformed cursor, or one issued for a different sort
+        """
+        columns = (
+            DBConversation.id,
+            DBConversation.decision,
+            DBConversation.stage,
+            DBConversation.created_at,
+            DBLoanApplication.id.label("loan_id"),
+            DBLoanApplication.name,
+            DBLoanApplication.loan_amount,
+            DBLoanApplication.loan_purpose,
+        )
+        join_on = DBLoanApplication.conversation_id == DBConversation.id
+        if sort == "amount":
+            key = (DBLoanApplication.loan_amount, DBLoanApplication.conversation_id)
+            query = select(*columns).join(DBLoanApplication, join_on).where(DBLoanApplication.loan_amount.isnot(None))
+        else:
+            key = (DBConversation.created_at, DBConversation.id)
+            query = select(*columns).outerjoin(DBLoanApplication, join_on)
+
+        if status == IN_PROGRESS:
+            query = query.where(DBConversation.decision.is_(None))
+        elif status:
+            query = query.where(DBConversation.decision == status)
+        if stage:
+            query = query.where(DBConversation.stage == stage)
+        if min_amount is not None:
+            query = query.where(DBLoanApplication.loan_amount >= min_amount)
+        if max_amount is not None:
+            query = query.where(DBLoanApplication.loan_amount <= max_amount)
+
+        if cursor:
+            values = decode_cursor(cursor, sort)
+            after = tuple_(*(literal(value, column.type) for column, value in zip(key, values)))
+            query = query.where(tuple_(*key) < after if descending else tuple_(*key) > after)
+
+        order = [column.desc() if descending else column.asc() for column in key]
+        rows = (await self.db.execute(query.order_by(*order).limit(limit + 1))).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, (last.loan_amount, last.id) if sort == "amount" else (last.created_at, last.id))
+        return rows, next_cursor
+
+    async def count_by_decision(self) -> Dict[Optional[str], int]:
+        """Number of conversations per decision (None = not decided yet), in one grouped query"""
+        result = await self.db.execute(
+            select(DBConversation.decision, func.count()).group_by(DBConversation.decision)
+        )
+        return dict(result.all())
+
+    async def save_turn(
+        self,
+        db_conv: DBConversation,
+        state: ConversationState,
+        user_message: str,
+        assistant_message: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> DBConversation:
+        """Write a processed turn back onto the already-loaded conversation"""
+        state_to_db_conversation(state, db_conv)
+        db_conv.user_data = state.user_data
+        # Nested values (e.g. slot provenance) are mutated in place - force the UPDATE
+        flag_modified(db_conv, "user_data")
+
+        # Messages are ordered by timestamp, so the reply must sort after the question even on a coarse clock
+        asked_at = datetime.utcnow()
+        self.db.add(DBMessage(
+            conversation_id=db_conv.id,
+            role="user",
+            content=user_message,
+            timestamp=asked_at,
+        ))
+        self.db.add(DBMessage(
+            conversation_id=db_conv.id,
+            role="assistant",
+            content=assistant_message,
+            message_metadata=metadata or {},
+            timestamp=asked_at + timedelta(microseconds=1),
+        ))
+        return db_conv
+
+    def set_document(
+        self,
+        db_conv: DBConversation,
+        doc_type: str,
+        filename: str,
+        file_path: str,
+        file_size: int,
+        mime_type: Optional[str],
+        sha256: Optional[str] = None,
+        parsed_fields: Optional[Dict[str, Any]] = None,
+    ) -> DBDocument:
+        """Attach an uploaded document to a conversation, replacing an earlier upload of the same type"""
+        db_doc = next((doc for doc in db_conv.documents if doc.doc_type == doc_type), None)
+        if db_doc is None:
+            db_doc = DBDocument(conversation_id=db_conv.id, doc_type=doc_type)
+            db_conv.documents.append(db_doc)
+        db_doc.filename = filename
+        db_doc.file_path = file_path
+        db_doc.file_size = file_size
+        db_doc.mime_type = mime_type
+        db_doc.sha256 = sha256
+        db_doc.parsed_fields = parsed_fields
+        db_doc.uploaded_at = datetime.utcnow()
+        return db_doc
+
+    async def set_document_fields(
+        self,
+        conversation_id: str,
+        doc_type: str,
+        sha256: Optional[str],
+        parsed_fields: Dict[str, Any]
+    ) -> bool:
+        """Record a document job's parsed fields, unless the document was replaced by a different upload meanwhile"""
+        result = await self.db.execute(
+            update(DBDocument)
+            .where(
+                DBDocument.conversation_id == conversation_id,
+                DBDocument.doc_type == doc_type,
+                DBDocument.sha256 == sha256
+            )
+            .values(parsed_fields=parsed_fields)
+        )
+        return result.rowcount > 0
@@ -1,12 +1,17 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 import os
+import json
 import uuid
+import heapq
+import asyncio
+from collections import Counter
 from typing import Optional
 from datetime import datetime
+from pathlib import Path
 
 from app.config import settings
 from app.utils.logger import logger
@@ -17,12 +22,24 @@ from app.models import (
     FileUploadResponse
 )
 from app.agents.master_agent import MasterAgent
-from app.database.connection import get_db
-from app.database.models import Conversation as DBConversation, Message as DBMessage, Document as DBDocument
+from app.database.connection import get_db, AsyncSessionLocal
+from app.database.models import Conversation as DBConversation
 from app.database.adapter import db_conversation_to_state
+from app.database.repository import ConversationRepository, IN_PROGRESS, decode_cursor, encode_cursor
 from app.routers.auth import router as auth_router
-from app.services.ocr_service import extract_text_from_bytes, parse_key_fields
+from app.services.ocr_service import OCRTimeoutError, parse_key_fields
+from app.services.ocr_executor import get_ocr_executor
+from app.services.process_pool import PoolBusyError
+from app.services.upload_storage import UploadTooLargeError, check_declared_size, save_upload
 from app.services.auth_service import get_current_active_user, get_optional_user
+from app.services.llm_client import close_anthropic_client
+from app.services.batch_underwriting import rescore_applications, DEFAULT_CHUNK_SIZE
+from app.services.policy_engine import get_policy_store
+from app.services.pdf_renderer import get_pdf_renderer
+from app.services.document_jobs import DocumentJobQueue, JobStore
+from app.services.blob_store import get_blob_store
+from app.services.decision_stats import get_decision_counters, summarise
+from app.services.conversation_store import ConversationConflictError
 from app.database.models import User
 
 # Initialize FastAPI app
@@ -39,6 +56,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -47,6 +65,69 @@ app.include_router(auth_router)
 # Initialize master agent (still used for processing, but data stored in DB)
 master_agent = MasterAgent()
 
+# Seconds clients are told to wait when OCR is saturated
+OCR_RETRY_AFTER_SECONDS = 5
+
+def _conflict(e: ConversationConflictError) -> HTTPException:
+    """409 for a turn that lost a race with another request on the same conversation (shared store)"""
+    return HTTPException(
+        status_code=409,
+        detail={"success": False, "message": "This conversation was updated by another request, please retry", "error": str(e)},
+        headers={"Retry-After": "1"}
+    )
+
+async def process_document_job(job: dict) -> dict:
+    """Document job handler: verify the upload, then record its parsed fields on the document"""
+    result = await master_agent.process_document_job(job)
+    if USE_DATABASE and AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            await ConversationRepository(db).set_document_fields(
+                job["conversation_id"], job["doc_type"], job.get("sha256"), result.get("fields", {})
+            )
+            await db.commit()
+    else:
+        await master_agent.record_document_result(job["conversation_id"], result)
+    return result
+
+# Uploaded documents are processed in the background (OCR, parsing, verification)
+document_jobs = DocumentJobQueue(
+    JobStore(settings.document_jobs_path),
+    handler=process_document_job,
+    workers=settings.document_job_workers,
+    max_attempts=settings.document_job_max_attempts,
+    retry_base_delay=settings.document_job_retry_delay,
+    lease_seconds=settings.document_job_lease_seconds
+)
+
+@app.on_event("startup")
+async def start_workers():
+    """Start the OCR and sanction-letter processes, then the document job workers
+    (which resume jobs from a previous run)"""
+    await asyncio.gather(get_ocr_executor().start(), get_pdf_renderer().start())
+    await document_jobs.start()
+    get_blob_store().start(settings.blob_gc_interval, settings.blob_gc_grace_seconds)
+
+@app.on_event("shutdown")
+async def stop_document_jobs():
+    await document_jobs.stop()
+    await get_blob_store().stop()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Close the shared Anthropic connection pool"""
+    await close_anthropic_client()
+
+@app.on_event("shutdown")
+async def close_worker_pools():
+    """Stop the sanction-letter render and OCR workers"""
+    get_pdf_renderer().close()
+    get_ocr_executor().close()
+
+@app.on_event("shutdown")
+async def close_conversation_store():
+    """Close the shared conversation store's connections, if one is configured"""
+    await master_agent.conversations.close()
+
 # Use database flag (can be toggled via environment)
 USE_DATABASE = os.getenv("USE_DATABASE", "true").lower() == "true"
 REQUIRE_AUTH = os.getenv("REQUIRE_AUTH", "false").lower() == "true"
@@ -73,7 +154,7 @@ async def health_check(db: AsyncSession = Depends(get_db)):
             result = await db.execute(select(func.count(DBConversation.id)))
             total_conversations = result.scalar() or 0
         else:
-            total_conversations = len(master_agent.conversations)
+            total_conversations = await master_agent.conversations.count()
         
         return {
             "status": "healthy",
@@ -81,7 +162,17 @@ async def health_check(db: AsyncSession = Depends(get_db)):
             "version": "3.0.0",
             "timestamp": datetime.now().isoformat(),
             "database_enabled": USE_DATABASE,
-            "active_conversations": total_conversations
+            "active_conversations": total_conversations,
+            "llm": master_agent.get_llm_stats(),
+            "extraction": master_agent.extractor.get_stats(),
+            "bureau_cache": master_agent.underwriting_agent.bureau_service.get_stats(),
+            "underwriting_policy": get_policy_store().snapshot(),
+            "pdf_renderer": get_pdf_renderer().snapshot(),
+            "ocr": get_ocr_executor().snapshot(),
+            "stats_counters": get_decision_counters().snapshot(),
+            "conversation_store": None if USE_DATABASE else await master_agent.conversations.snapshot(),
+            "document_jobs": await document_jobs.snapshot(),
+            "uploads": await get_blob_store().snapshot()
         }
     except Exception as e:
         logger.error(f"Health check error: {e}")
@@ -96,93 +187,221 @@ async def get_stats(db: AsyncSession = Depends(get_db)):
     """Get platform statistics"""
     try:
         if USE_DATABASE:
-            # Get stats from database
-            total_result = await db.execute(select(func.count(DBConversation.id)))
-            total_conversations = total_result.scalar() or 0
-            
-            approved_result = await db.execute(
-                select(func.count(DBConversation.id)).where(DBConversation.decision == "APPROVED")
-            )
-            approved_loans = approved_result.scalar() or 0
-            
-            rejected_result = await db.execute(
-                select(func.count(DBConversation.id)).where(DBConversation.decision == "REJECTED")
-            )
-            rejected_loans = rejected_result.scalar() or 0
-            
-            pending_result = await db.execute(
-                select(func.count(DBConversation.id)).where(DBConversation.decision.is_(None))
-            )
-            pending = pending_result.scalar() or 0
+            # In-memory counters, reloaded with one GROUP BY decision query when due
+            stats = await get_decision_counters().get(ConversationRepository(db).count_by_decision)
         else:
-            # Fallback to in-memory
-            conversations = master_agent.conversations
-            total_conversations = len(conversations)
-            approved_loans = sum(1 for c in conversations.values() if c.decision == "APPROVED")
-            rejected_loans = sum(1 for c in conversations.values() if c.decision == "REJECTED")
-            pending = sum(1 for c in conversations.values() if c.decision is None)
+            # Fallback to in-memory: one pass over the conversations
+            stats = summarise(Counter([c.decision async for c in master_agent.conversations.scan()]))
         
         return {
-            "total_conversations": total_conversations,
-            "approved_loans": approved_loans,
-            "rejected_loans": rejected_loans,
-            "pending": pending,
+            **stats,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _application_item(conversation_id: str, decision: Optional[str], stage: str, date: Optional[str], app_data: dict) -> dict:
+    """Dashboard row; `app_data` holds the loan fields, empty when there is no application yet"""
+    return {
+        "id": conversation_id,
+        "name": app_data.get("name", "N/A"),
+        "amount": app_data.get("loan_amount"),
+        "status": decision or IN_PROGRESS,
+        "stage": stage,
+        "date": date,
+        "score": 750, # Mock credit score
+        "type": app_data.get("loan_purpose", "Personal")
+    }
+
+async def _in_memory_applications(
+    limit: int,
+    cursor: Optional[str],
+    status: Optional[str],
+    stage: Optional[str],
+    min_amount: Optional[float],
+    max_amount: Optional[float],
+    sort: str,
+    descending: bool
+):
+    """Same filters, ordering and cursors as the database query, in one pass over the conversation store"""
+    after = decode_cursor(cursor, sort) if cursor else None
+    candidates = []
+    async for conv in master_agent.conversations.scan():
+        amount = conv.loan_application.loan_amount if conv.loan_application else None
+        if status and conv.decision != (None if status == IN_PROGRESS else status):
+            continue
+        if stage and conv.stage != stage:
+            continue
+        if amount is None and (sort == "amount" or min_amount is not None or max_amount is not None):
+            continue
+        if (min_amount is not None and amount < min_amount) or (max_amount is not None and amount > max_amount):
+            continue
+        key = (amount if sort == "amount" else conv.created_at, conv.conversation_id)
+        if after is not None and (key >= after if descending else key <= after):
+            continue
+        candidates.append((key, conv))
+
+    pick = heapq.nlargest if descending else heapq.nsmallest
+    page = pick(limit + 1, candidates, key=lambda candidate: candidate[0])
+    next_cursor = encode_cursor(sort, page[limit - 1][0]) if len(page) > limit else None
+    return [conv for _, conv in page[:limit]], next_cursor
+
 @app.get("/api/admin/applications")
 async def get_applications(
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    limit: int = 50,
-    skip: int = 0
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    status: Optional[str] = Query(None, description="APPROVED, REJECTED, MANUAL_REVIEW or IN_PROGRESS"),
+    stage: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    sort: str = Query("created_at", pattern="^(created_at|amount)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$")
 ):
-    """Get list of loan applications for dashboard"""
+    """
+    Get list of loan applications for dashboard
+
+    Pages are cursor-based: when there are more rows, the response carries an
+    X-Next-Cursor header to pass as `cursor` (with the same filters and sort).
+    """
+    filters = dict(status=status, stage=stage, min_amount=min_amount, max_amount=max_amount)
     try:
         if USE_DATABASE:
-            # Fetch detailed applications from DB
-            query = select(DBConversation).order_by(DBConversation.created_at.desc()).offset(skip).limit(limit)
-            result = await db.execute(query)
-            conversations = result.scalars().all()
-            
-            apps = []
-            for conv in conversations:
-                state = db_conversation_to_state(conv)
-                app_data = state.loan_application.dict() if state.loan_application else {}
-                apps.append({
-                    "id": conv.id,
-                    "name": app_data.get("name", "N/A"),
-                    "amount": app_data.get("loan_amount"),
-                    "status": conv.decision or "IN_PROGRESS",
-                    "stage": conv.stage,
-                    "date": conv.created_at.isoformat() if conv.created_at else None,
-                    "score": 750, # Mock credit score
-                    "type": app_data.get("loan_purpose", "Personal")
-                })
-            return apps
+            # Only the dashboard's columns, one page past the cursor
+            rows, next_cursor = await ConversationRepository(db).list_applications(
+                limit=limit, cursor=cursor, sort=sort, descending=order == "desc", **filters
+            )
+            apps = [
+                _application_item(
+                    row.id,
+                    row.decision,
+                    row.stage,
+                    row.created_at.isoformat() if row.created_at else None,
+                    {
+                        "name": row.name,
+                        "loan_amount": row.loan_amount,
+                        "loan_purpose": row.loan_purpose,
+                    } if row.loan_id is not None else {}
+                )
+                for row in rows
+            ]
         else:
             # In-memory
-            apps = []
-            for conv in list(master_agent.conversations.values())[skip:skip+limit]:
-                app_data = conv.loan_application.dict() if conv.loan_application else {}
-                apps.append({
-                    "id": conv.conversation_id,
-                    "name": app_data.get("name", "N/A"),
-                    "amount": app_data.get("loan_amount"),
-                    "status": conv.decision or "IN_PROGRESS",
-                    "stage": conv.stage,
-                    "date": datetime.now().isoformat(), # Mock date for in-memory
-                    "score": 750,
-                    "type": app_data.get("loan_purpose", "Personal")
-                })
-            return apps
+            conversations, next_cursor = await _in_memory_applications(
+                limit, cursor, sort=sort, descending=order == "desc", **filters
+            )
+            apps = [
+                _application_item(
+                    conv.conversation_id,
+                    conv.decision,
+                    conv.stage,
+                    conv.created_at.isoformat(),
+                    conv.loan_application.dict() if conv.loan_application else {}
+                )
+                for conv in conversations
+            ]
+
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return apps
             
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Admin apps error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/admin/underwriting/rescore")
+async def rescore_all_applications(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    dry_run: bool = False
+):
+    """Re-run eligibility rules over all decided applications (after a policy change)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if not USE_DATABASE:
+        raise HTTPException(status_code=400, detail="Batch underwriting requires the database")
+    
+    try:
+        return await rescore_applications(db, chunk_size=chunk_size, dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Batch underwriting error: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Decisions changed in bulk (chunks commit as they go) - recount on the next /api/stats
+        if not dry_run:
+            get_decision_counters().invalidate()
+
+async def _load_chat_state(request: MessageRequest, repo: ConversationRepository):
+    """Get or create the conversation a chat message belongs to.
+
+    Returns (conversation_id, db_conv, conversation_state); db_conv is None in
+    in-memory mode.
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    conversation_state = None
+    db_conv = None
+    
+    if USE_DATABASE:
+        # Get or create conversation with only the recent message window
+        db_conv, conversation_state = await repo.load_state(
+            conversation_id,
+            message_window=settings.chat_history_window,
+            create=True
+        )
+    else:
+        # Fallback to in-memory
+        if request.conversation_id:
+            conversation_state = await master_agent.get_conversation_state(request.conversation_id)
+        if not conversation_state:
+            conversation_id = await master_agent.create_conversation()
+            conversation_state = await master_agent.get_conversation_state(conversation_id)
+    
+    return conversation_id, db_conv, conversation_state
+
+async def _save_chat_turn(repo: ConversationRepository, db_conv, conversation_state, user_message: str, result: dict):
+    """Persist a processed turn, reusing the conversation loaded for it"""
+    if USE_DATABASE:
+        previous_decision = db_conv.decision
+        await repo.save_turn(
+            db_conv,
+            conversation_state,
+            user_message=user_message,
+            assistant_message=result["response"],
+            metadata={"stage": result["next_stage"], "decision": conversation_state.decision}
+        )
+        await repo.db.commit()
+        counters = get_decision_counters()
+        counters.created(len(repo.created))
+        counters.changed(previous_decision, conversation_state.decision)
+    else:
+        await master_agent.save_conversation_state(conversation_state)
+
+def _chat_metadata(conversation_state, result: dict) -> dict:
+    """Response metadata shared by the blocking and streaming chat endpoints"""
+    # Determine if this is a decision message
+    is_decision = conversation_state.decision in ["APPROVED", "REJECTED"]
+    
+    # Construct sanction letter URL if generated
+    sanction_letter_url = None
+    if result.get("sanction_letter_path"):
+        sanction_letter_url = f"/api/download/{os.path.basename(result['sanction_letter_path'])}"
+    
+    return {
+        "stage": result["next_stage"],
+        "decision": conversation_state.decision,
+        "is_decision": is_decision,
+        "message_count": conversation_state.message_offset + len(conversation_state.messages),
+        "sanction_letter_url": sanction_letter_url,
+        # The response is a "try again" notice, not an answer: Claude could not be reached
+        "assistant_unavailable": result.get("unavailable", False)
+    }
+
 @app.post("/api/chat", response_model=MessageResponse)
 async def chat(
     request: MessageRequest,
@@ -197,90 +416,26 @@ async def chat(
         conversation_id: Optional conversation ID (creates new if not provided)
     """
     try:
-        conversation_id = request.conversation_id or str(uuid.uuid4())
-        conversation_state = None
-        
-        if USE_DATABASE:
-            # Get or create conversation from database
-            result = await db.execute(
-                select(DBConversation).where(DBConversation.id == conversation_id)
-            )
-            db_conv = result.scalar_one_or_none()
-            
-            if db_conv:
-                conversation_state = db_conversation_to_state(db_conv)
-            else:
-                # Create new conversation
-                db_conv = DBConversation(
-                    id=conversation_id,
-                    stage="GREETING"
-                )
-                db.add(db_conv)
-                await db.flush()
-                conversation_state = db_conversation_to_state(db_conv)
-        else:
-            # Fallback to in-memory
-            if request.conversation_id:
-                conversation_state = master_agent.get_conversation_state(request.conversation_id)
-            if not conversation_state:
-                conversation_id = master_agent.create_conversation()
-                conversation_state = master_agent.get_conversation_state(conversation_id)
+        repo = ConversationRepository(db)
+        conversation_id, db_conv, conversation_state = await _load_chat_state(request, repo)
         
         # Process message through Master Agent
         result = await master_agent.process_message(conversation_state, request.message)
         
-        # Save to database
-        if USE_DATABASE:
-            # Update conversation
-            result_db = await db.execute(
-                select(DBConversation).where(DBConversation.id == conversation_id)
-            )
-            db_conv = result_db.scalar_one()
-            db_conv.stage = result["next_stage"]
-            db_conv.decision = conversation_state.decision
-            db_conv.user_data = conversation_state.user_data
-            
-            # Save user message
-            user_msg = DBMessage(
-                conversation_id=conversation_id,
-                role="user",
-                content=request.message
-            )
-            db.add(user_msg)
-            
-            # Save bot response
-            bot_msg = DBMessage(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=result["response"],
-                metadata={"stage": result["next_stage"], "decision": conversation_state.decision}
-            )
-            db.add(bot_msg)
-            
-            await db.commit()
-        
-        # Determine if this is a decision message
-        is_decision = conversation_state.decision in ["APPROVED", "REJECTED"]
-        
-        # Construct sanction letter URL if generated
-        sanction_letter_url = None
-        if result.get("sanction_letter_path"):
-            sanction_letter_url = f"/api/download/{os.path.basename(result['sanction_letter_path'])}"
+        # Save to database, reusing the conversation loaded above
+        await _save_chat_turn(repo, db_conv, conversation_state, request.message, result)
         
         return MessageResponse(
             message=result["response"],
             conversation_id=conversation_id,
-            metadata={
-                "stage": result["next_stage"],
-                "decision": conversation_state.decision,
-                "is_decision": is_decision,
-                "message_count": len(conversation_state.messages),
-                "sanction_letter_url": sanction_letter_url
-            },
+            metadata=_chat_metadata(conversation_state, result),
             timestamp=datetime.now().isoformat(),
             stage=result["next_stage"]
         )
     
+    except ConversationConflictError as e:
+        logger.warning(f"Chat turn conflict: {e}")
+        raise _conflict(e)
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         if USE_DATABASE:
@@ -294,10 +449,86 @@ async def chat(
             }
         )
 
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: MessageRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_or_none)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    
+    Emits `token` events ({"text": ...}) as the response is generated, then a
+    single `done` event carrying the same fields as /api/chat's MessageResponse
+    once the turn has been persisted. Errors after streaming started are sent
+    as an `error` event.
+    """
+    try:
+        repo = ConversationRepository(db)
+        conversation_id, db_conv, conversation_state = await _load_chat_state(request, repo)
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {str(e)}", exc_info=True)
+        if USE_DATABASE:
+            await db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "success": False,
+                "message": "An error occurred processing your message",
+                "error": str(e)
+            }
+        )
+    
+    async def event_stream():
+        try:
+            async for event in master_agent.process_message_stream(conversation_state, request.message):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"text": event["text"]})
+                    continue
+                
+                # Final message is complete - persist it before telling the client
+                await _save_chat_turn(repo, db_conv, conversation_state, request.message, event)
+                response = MessageResponse(
+                    message=event["response"],
+                    conversation_id=conversation_id,
+                    metadata=_chat_metadata(conversation_state, event),
+                    timestamp=datetime.now().isoformat(),
+                    stage=event["next_stage"]
+                )
+                yield _sse_event("done", response.dict())
+        except ConversationConflictError as e:
+            logger.warning(f"Chat stream turn conflict: {e}")
+            yield _sse_event("error", {
+                "success": False,
+                "message": "This conversation was updated by another request, please retry",
+                "error": str(e),
+                "status": 409
+            })
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
+            if USE_DATABASE:
+                await db.rollback()
+            yield _sse_event("error", {
+                "success": False,
+                "message": "An error occurred processing your message",
+                "error": str(e)
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/chat/message", response_model=MessageResponse)
 async def send_message(request: MessageRequest, db: AsyncSession = Depends(get_db)):
     """Legacy endpoint for backward compatibility"""
-    return await chat(request, db)
+    # Called directly, so dependency defaults must be passed explicitly
+    return await chat(request, db, current_user=None)
 
 @app.post("/api/upload", response_model=FileUploadResponse)
 async def upload_document(
@@ -309,75 +540,92 @@ async def upload_document(
 ):
     """Upload a document for verification"""
     try:
+        check_declared_size(file, settings.max_file_size)
         conversation_state = None
+        repo = ConversationRepository(db)
         
         if USE_DATABASE:
             # Get or create conversation from DB
-            if conversation_id:
-                result = await db.execute(select(DBConversation).where(DBConversation.id == conversation_id))
-                db_conv = result.scalar_one_or_none()
-            else:
-                db_conv = None
-                
-            if not db_conv:
-                conversation_id = conversation_id or str(uuid.uuid4())
-                db_conv = DBConversation(id=conversation_id, stage="GREETING")
-                db.add(db_conv)
-                await db.flush()
-            
-            conversation_state = db_conversation_to_state(db_conv)
+            conversation_id = conversation_id or str(uuid.uuid4())
+            # Uploads never read the transcript, so skip loading messages
+            db_conv, conversation_state = await repo.load_state(
+                conversation_id,
+                message_window=0,
+                create=True
+            )
+            if current_user and conversation_id in repo.created:
+                db_conv.user_id = current_user.id
         else:
             # In-memory fallback
             if not conversation_id:
-                conversation_id = master_agent.create_conversation()
+                conversation_id = await master_agent.create_conversation()
             
-            conversation_state = master_agent.get_conversation_state(conversation_id)
+            conversation_state = await master_agent.get_conversation_state(conversation_id)
             if not conversation_state:
                 # Handle case where ID provided but not found in memory
-                conversation_id = master_agent.create_conversation()
-                conversation_state = master_agent.get_conversation_state(conversation_id)
+                conversation_id = await master_agent.create_conversation()
+                conversation_state = await master_agent.get_conversation_state(conversation_id)
         
-        # Read file content
-        contents = await file.read()
+        # Stream the file to disk (in production, use cloud storage); identical content is stored once
+        blob = await get_blob_store().put(file, f"{conversation_id}:{doc_type}", settings.max_file_size)
         file_info = {
             "filename": file.filename,
             "content_type": file.content_type,
-            "size": len(contents)
+            "size": blob.size,
+            "sha256": blob.sha256
         }
+        conversation_state.documents[doc_type] = file.filename or "uploaded_file"
         
-        # Save file (in production, use cloud storage)
-        settings.upload_dir.mkdir(parents=True, exist_ok=True)
-        file_path = settings.upload_dir / f"{conversation_id}_{doc_type}_{file.filename}"
-        file_path.write_bytes(contents)
-        
-        # Process file through master agent
-        response = await master_agent.process_file(
-            conversation_state=conversation_state,
-            file_info=file_info,
-            file_content=contents,
-            doc_type=doc_type
-        )
+        # OCR and verification run in the document job workers, unless this content was processed before
+        cached = None
+        if blob.duplicate:
+            cached = await master_agent.cached_document_result(blob.sha256, doc_type, file.filename)
         
         # Save document to database
         if USE_DATABASE:
-            db_doc = DBDocument(
-                conversation_id=conversation_id,
+            repo.set_document(
+                db_conv,
                 doc_type=doc_type,
                 filename=file.filename,
-                file_path=str(file_path),
-                file_size=len(contents),
-                mime_type=file.content_type
+                file_path=str(blob.path),
+                file_size=blob.size,
+                mime_type=file.content_type,
+                sha256=blob.sha256,
+                parsed_fields=cached.get("fields", {}) if cached is not None else None
             )
-            db.add(db_doc)
             await db.commit()
+            get_decision_counters().created(len(repo.created))
+        else:
+            await master_agent.save_conversation_state(conversation_state)
+            if cached is not None:
+                await master_agent.record_document_result(conversation_id, cached)
+        
+        job = await document_jobs.enqueue(
+            conversation_id=conversation_id,
+            doc_type=doc_type,
+            filename=file.filename,
+            file_path=str(blob.path),
+            content_type=file.content_type,
+            size=blob.size,
+            sha256=blob.sha256,
+            result=cached
+        )
         
         return FileUploadResponse(
-            message=response.get("message", "File uploaded successfully"),
+            message="Document received and queued for processing." if cached is None else "Document received.",
             conversation_id=conversation_id,
             file_info=file_info,
-            doc_type=doc_type
+            doc_type=doc_type,
+            job_id=job["id"],
+            job_status=job["status"]
         )
     
+    except UploadTooLargeError as e:
+        if USE_DATABASE:
+            await db.rollback()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ConversationConflictError as e:
+        raise _conflict(e)
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}", exc_info=True)
         if USE_DATABASE:
@@ -385,33 +633,139 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _job_response(job: dict) -> dict:
+    """Job fields safe to show clients (no server file paths)"""
+    return {
+        "job_id": job["id"],
+        "conversation_id": job["conversation_id"],
+        "doc_type": job["doc_type"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat()
+    }
+
+async def _may_read_conversation(db: AsyncSession, conversation_id: str, user: Optional[User]) -> bool:
+    """Whether `user` may see a conversation's documents: its owner or an admin, or anyone if nobody owns it"""
+    if not USE_DATABASE:
+        return True
+    owner = await db.scalar(select(DBConversation.user_id).where(DBConversation.id == conversation_id))
+    return owner is None or (user is not None and (user.id == owner or user.is_admin))
+
+@app.get("/api/upload/jobs/{job_id}")
+async def get_upload_job(
+    job_id: str,
+    conversation_id: str = Query(..., description="Conversation the document was uploaded to"),
+    wait: float = Query(0, ge=0, le=30, description="Long-poll up to this many seconds for the job to finish"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_or_none)
+):
+    """Processing status of a document uploaded to `conversation_id`
+    
+    The result carries the parsed fields (PAN, name, ...), so a job is only
+    shown for its own conversation, and to that conversation's owner.
+    """
+    job = await document_jobs.get(job_id)
+    if (
+        job is None
+        or job["conversation_id"] != conversation_id
+        or not await _may_read_conversation(db, conversation_id, current_user)
+    ):
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait > 0:
+        job = await document_jobs.get(job_id, wait=wait)
+    return _job_response(job)
+
+@app.get("/api/admin/upload/jobs/dead")
+async def list_dead_upload_jobs(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Document jobs that exhausted their retries"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return [_job_response(job) for job in await document_jobs.dead_letters(limit)]
+
+@app.post("/api/admin/upload/jobs/{job_id}/retry")
+async def retry_dead_upload_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Put a dead-lettered document job back in the queue"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if not await document_jobs.requeue(job_id):
+        raise HTTPException(status_code=404, detail="No dead-lettered job with this id")
+    return _job_response(await document_jobs.get(job_id))
+
+@app.post("/api/admin/blobs/gc")
+async def collect_upload_garbage(
+    dry_run: bool = Query(False, description="Only report what would be deleted"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Delete stored uploads no document has referenced for the grace period"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return await get_blob_store().collect_garbage(settings.blob_gc_grace_seconds, dry_run=dry_run)
+
+
 @app.post('/api/ocr')
 async def ocr_extract(
     file: UploadFile = File(...),
     conversation_id: Optional[str] = Query(None),
+    doc_type: Optional[str] = Query(None, description="e.g. pan_card, salary_slip - tunes image preprocessing"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_or_none)
 ):
     """Extract text from uploaded image and return parsed fields."""
+    ocr = get_ocr_executor()
+    image_path = None
     try:
-        contents = await file.read()
-        text = extract_text_from_bytes(contents)
+        check_declared_size(file, settings.max_file_size)
+        if ocr.saturated:
+            # Shed load before spending any work on the upload
+            raise PoolBusyError("OCR queue is full")
+
+        # OCR workers read the image from disk - no bytes copy crosses the process boundary
+        image_path = settings.upload_dir / "ocr" / f"{uuid.uuid4()}{Path(file.filename or '').suffix}"
+        await save_upload(file, image_path, settings.max_file_size)
+        text = await ocr.extract_text(image_path, doc_type=doc_type)
         parsed = parse_key_fields(text)
 
         # Optionally attach to conversation state (in-memory)
         if not USE_DATABASE and conversation_id:
-            conv = master_agent.get_conversation_state(conversation_id)
+            conv = await master_agent.get_conversation_state(conversation_id)
             if conv:
-                conv.documents[file.filename] = {"ocr_text": text, "parsed": parsed}
+                # Parsed fields only - the raw text would sit in memory for the whole session
+                conv.documents[file.filename] = {"parsed": parsed, "text_length": len(text)}
+                await master_agent.save_conversation_state(conv)
 
         return {
             "filename": file.filename,
             "text": text,
             "fields": parsed
         }
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PoolBusyError:
+        raise HTTPException(
+            status_code=429,
+            detail="OCR is busy, please retry shortly",
+            headers={"Retry-After": str(OCR_RETRY_AFTER_SECONDS)}
+        )
+    except OCRTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ConversationConflictError as e:
+        raise _conflict(e)
     except Exception as e:
         logger.error(f"OCR endpoint error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if image_path is not None:
+            await asyncio.to_thread(image_path.unlink, missing_ok=True)
 
 @app.post("/chat/upload")
 async def upload_file_legacy(
@@ -420,7 +774,7 @@ async def upload_file_legacy(
     db: AsyncSession = Depends(get_db)
 ):
     """Legacy upload endpoint"""
-    return await upload_document(file, conversation_id, "salary_slip", db)
+    return await upload_document(file, conversation_id, "salary_slip", db, current_user=None)
 
 @app.post("/api/conversation", response_model=ConversationResponse)
 async def create_conversation(
@@ -432,11 +786,12 @@ async def create_conversation(
         conversation_id = str(uuid.uuid4())
         
         if USE_DATABASE:
-            db_conv = DBConversation(id=conversation_id)
+            db_conv = DBConversation(id=conversation_id, user_id=current_user.id if current_user else None)
             db.add(db_conv)
             await db.commit()
+            get_decision_counters().created()
         else:
-            conversation_id = master_agent.create_conversation()
+            conversation_id = await master_agent.create_conversation()
         
         return ConversationResponse(conversation_id=conversation_id)
     except Exception as e:
@@ -447,7 +802,7 @@ async def create_conversation(
 @app.post("/chat/conversation", response_model=ConversationResponse)
 async def create_conversation_legacy(db: AsyncSession = Depends(get_db)):
     """Legacy endpoint for creating conversation"""
-    return await create_conversation(db)
+    return await create_conversation(db, current_user=None)
 
 @app.get("/api/conversation/{conversation_id}")
 async def get_conversation(
@@ -458,17 +813,14 @@ async def get_conversation(
     """Retrieve full conversation history and state"""
     try:
         if USE_DATABASE:
-            result = await db.execute(
-                select(DBConversation).where(DBConversation.id == conversation_id)
-            )
-            db_conv = result.scalar_one_or_none()
+            db_conv = await ConversationRepository(db).get(conversation_id)
             
             if not db_conv:
                 raise HTTPException(status_code=404, detail="Conversation not found")
             
             conversation_state = db_conversation_to_state(db_conv)
         else:
-            conversation_state = master_agent.get_conversation_state(conversation_id)
+            conversation_state = await master_agent.get_conversation_state(conversation_id)
             if not conversation_state:
                 raise HTTPException(status_code=404, detail="Conversation not found")
         
@@ -496,7 +848,7 @@ async def get_conversation(
 @app.get("/chat/conversation/{conversation_id}")
 async def get_conversation_legacy(conversation_id: str, db: AsyncSession = Depends(get_db)):
     """Legacy endpoint for getting conversation"""
-    return await get_conversation(conversation_id, db)
+    return await get_conversation(conversation_id, db, current_user=None)
 
 @app.get("/api/download/{filename:path}")
 async def download_sanction_letter(
@@ -534,7 +886,8 @@ async def http_exception_handler(request, exc):
             "success": False,
             "message": exc.detail if isinstance(exc.detail, str) else exc.detail.get("message", "An error occurred"),
             "error": str(exc.detail) if isinstance(exc.detail, str) else exc.detail.get("error", "")
-        }
+        },
+        headers=getattr(exc, "headers", None)  # e.g. Retry-After on 429
     )
 
 @app.exception_handler(Exception)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
@@ -9,11 +9,15 @@ class Message(BaseModel):
 
 class ConversationState(BaseModel):
     conversation_id: str
-    stage: str  # GREETING, INFO_GATHERING, VERIFICATION, UNDERWRITING, DECISION, SANCTION, COMPLETED
+    stage: str  # GREETING, INFO_GATHERING, VERIFICATION, UNDERWRITING, COUNTER_OFFER, DECISION, SANCTION, COMPLETED
     messages: List[Message] = []
     loan_application: "LoanApplication" = None # collected info (name, loan_amount, salary, etc.)
-    documents: Dict[str, str] = {}  # uploaded files (doc_type: file_path or base64)
+    documents: Dict[str, Any] = {}  # uploaded files (doc_type: filename; /api/ocr adds parsed fields by filename)
     decision: Optional[str] = None  # APPROVED, REJECTED, PENDING
+    user_data: Dict[str, Any] = {}  # free-form data persisted alongside the conversation
+    message_offset: int = 0  # older messages not loaded into `messages` (windowed history)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    _store_version: Optional[int] = PrivateAttr(default=None)  # version read from a shared store (optimistic locking)
 
 class LoanApplication(BaseModel):
     name: Optional[str] = None
@@ -24,6 +28,9 @@ class LoanApplication(BaseModel):
     credit_score: Optional[int] = None
     existing_loans: Optional[float] = None
     pan_number: Optional[str] = None
+    # Terms of a counter-offer the customer accepted; None = the policy's terms for the loan purpose
+    accepted_interest_rate: Optional[float] = None
+    accepted_tenure_months: Optional[int] = None
 
 class APIResponse(BaseModel):
     success: bool
@@ -51,4 +58,6 @@ class FileUploadResponse(BaseModel):
     conversation_id: Optional[str] = None
     file_info: Optional[Dict[str, Any]] = None
     doc_type: Optional[str] = None
+    job_id: Optional[str] = None  # poll /api/upload/jobs/{job_id}?conversation_id=... for processing status
+    job_status: Optional[str] = None
 
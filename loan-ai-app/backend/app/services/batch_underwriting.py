@@ -0,0 +1,181 @@
+"""Batch re-scoring of stored loan applications.
+
+Used after a policy change to re-run eligibility over every application that
+already has an automated decision (APPROVED or REJECTED). Conversations still
+in progress, before KYC, and those waiting on manual review are left alone.
+Applications are read in keyset-paginated chunks, the active underwriting
+policy is evaluated on NumPy arrays, and the decisions are written back with
+one bulk UPDATE per chunk.
+
+Decisions come from the same compiled policy (its vector form), inputs
+(`Policy.values_for`) and payloads as `UnderwritingAgent.assess_risk`, using
+the credit score and existing loans the live assessment stored instead of
+fresh bureau/CRM lookups.
+
+Run from the backend directory:
+    python -m app.services.batch_underwriting [--chunk-size N] [--dry-run]
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, Any, List, Optional, Mapping
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Conversation, LoanApplication
+from app.services.policy_engine import Policy, get_policy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Conversation decisions that batch re-scoring may revise
+RESCORED_DECISIONS = ("APPROVED", "REJECTED")
+
+
+def score_rows(rows: List[Mapping[str, Any]], policy: Optional[Policy] = None) -> List[Dict[str, Any]]:
+    """Decisions for application mappings with the fields `Policy.values_for` reads"""
+    if not rows:
+        return []
+    policy = policy or get_policy()
+    count = len(rows)
+    values, terms = zip(*(policy.values_for(row) for row in rows))
+    columns = {
+        field: np.fromiter((value[field] or 0 for value in values), dtype=np.float64, count=count)
+        for field in values[0]
+    }
+
+    fired, derived = policy.evaluate_vectorised(columns)
+
+    # Payload text is built per row from plain Python numbers so it matches the scalar path exactly
+    decisions = []
+    for i, value in enumerate(values):
+        namespace = {**policy.parameters, **policy.inputs(value)}
+        namespace.update({name: float(column[i]) for name, column in derived.items()})
+        decision = policy.decision_for(int(fired[i]), value, namespace)
+        if terms[i]["product"]:
+            decision["product"] = terms[i]["product"]
+        decisions.append(decision)
+    return decisions
+
+
+async def rescore_applications(
+    db: AsyncSession,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Re-run eligibility over every decided application with an amount and salary
+
+    Args:
+        db: Async session; committed once per chunk unless dry_run
+        chunk_size: Applications loaded and updated per round trip
+        dry_run: Score and count, but write nothing
+
+    Returns:
+        Counts of processed applications, of new decisions by status, and of
+        applications whose conversation decision changed
+    """
+    started = time.perf_counter()
+    # One policy version for the whole run, even if the file is reloaded meanwhile
+    policy = get_policy()
+    summary = {
+        "policy_version": policy.version,
+        "processed": 0, "decisions": {}, "changed": 0, "chunks": 0,
+        "dry_run": dry_run
+    }
+    last_id: Optional[str] = None
+
+    while True:
+        query = (
+            select(
+                LoanApplication.id,
+                LoanApplication.conversation_id,
+                LoanApplication.loan_amount,
+                LoanApplication.monthly_salary,
+                LoanApplication.existing_loans,
+                LoanApplication.credit_score,
+                LoanApplication.loan_purpose,
+                LoanApplication.accepted_interest_rate,
+                LoanApplication.accepted_tenure_months,
+                Conversation.decision,
+            )
+            .join(Conversation, Conversation.id == LoanApplication.conversation_id)
+            .where(
+                LoanApplication.loan_amount.isnot(None),
+                LoanApplication.monthly_salary.isnot(None),
+                Conversation.decision.in_(RESCORED_DECISIONS)
+            )
+            .order_by(LoanApplication.id)
+            .limit(chunk_size)
+        )
+        if last_id is not None:
+            query = query.where(LoanApplication.id > last_id)
+        rows = (await db.execute(query)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        decisions = score_rows([row._mapping for row in rows], policy)
+        application_updates = []
+        conversation_updates = []
+        for row, decision in zip(rows, decisions):
+            status = decision["status"]
+            approved = status == "APPROVED"
+            summary["decisions"][status] = summary["decisions"].get(status, 0) + 1
+            application_updates.append({
+                "id": row.id,
+                "status": decision["status"],
+                "rejection_reason": None if approved else decision["reason"],
+                "approved_amount": decision.get("approved_amount"),
+                "interest_rate": decision.get("interest_rate"),
+                "tenure_months": decision.get("tenure"),
+                "monthly_emi": decision.get("monthly_emi"),
+            })
+            # The conversation's decision is what the live path stores
+            if row.decision != status:
+                summary["changed"] += 1
+                conversation_updates.append({"id": row.conversation_id, "decision": status})
+
+        if not dry_run:
+            # ORM bulk UPDATE by primary key: one executemany per table
+            await db.execute(update(LoanApplication), application_updates)
+            if conversation_updates:
+                await db.execute(update(Conversation), conversation_updates)
+            await db.commit()
+
+        summary["processed"] += len(rows)
+        summary["chunks"] += 1
+        logger.info(f"Batch underwriting: scored {summary['processed']} applications")
+
+    summary["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return summary
+
+
+async def _main(chunk_size: int, dry_run: bool) -> Dict[str, Any]:
+    from app.database.connection import AsyncSessionLocal
+
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Database is not configured (USE_DATABASE/DATABASE_URL)")
+    async with AsyncSessionLocal() as db:
+        return await rescore_applications(db, chunk_size=chunk_size, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score all stored loan applications")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="score without writing decisions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        result = asyncio.run(_main(args.chunk_size, args.dry_run))
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,256 @@
+"""Content-addressed storage for uploaded documents.
+
+Each distinct upload is stored once, named by its SHA-256:
+`uploads/blobs/ab/abcdef...`. Every document slot of a conversation
+(`{conversation_id}:{doc_type}`) references one blob, and the blob index keeps
+a reference count per blob. When a user uploads to the same slot again, the
+reference moves to the new blob. Processing results (parsed fields, OCR text
+length) are cached per blob and document type, so a duplicate of an
+already-processed upload is answered without OCR.
+
+`collect_garbage` removes blobs that nobody has referenced for a grace period.
+The grace period matters because a queued job may still read a blob after its
+slot was re-uploaded. The app collects periodically; admins can also trigger
+`POST /api/admin/blobs/gc`, or run:
+    python -m app.services.blob_store [--grace SECONDS] [--dry-run]
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+from fastapi import UploadFile
+
+from app.config import settings
+from app.services.upload_storage import save_upload
+
+logger = logging.getLogger(__name__)
+
+# Uploads are streamed here first, then renamed into place once their hash is known
+INCOMING_DIR = "incoming"
+
+
+class Blob:
+    """A stored upload: its content hash, where it lives and whether it was already stored"""
+
+    def __init__(self, sha256: str, path: Path, size: int, duplicate: bool):
+        self.sha256 = sha256
+        self.path = path
+        self.size = size
+        self.duplicate = duplicate
+
+
+class BlobStore:
+    """SHA-256 keyed file store with reference counts and a per-blob result cache
+
+    File and SQLite work is blocking and runs in a worker thread.
+    """
+
+    def __init__(self, directory: Path, index_path: str, clock: Callable[[], float] = time.time):
+        self.directory = Path(directory)
+        self.index_path = index_path
+        self.clock = clock
+        self._gc_task: Optional[asyncio.Task] = None
+        self.stats = {"stored": 0, "deduplicated": 0, "cache_hits": 0, "blobs_collected": 0, "bytes_collected": 0}
+
+        Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, refcount INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_blobs_refcount_updated ON blobs (refcount, updated_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS blob_refs (owner TEXT PRIMARY KEY, sha256 TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_results ("
+                "sha256 TEXT NOT NULL, kind TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (sha256, kind))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=5)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.directory / sha256[:2] / sha256
+
+    async def put(self, file: UploadFile, owner: str, max_size: int) -> Blob:
+        """
+        Store an upload and point `owner` (e.g. "{conversation_id}:{doc_type}") at it
+
+        Raises:
+            UploadTooLargeError: more than `max_size` bytes were sent
+        """
+        staged = await save_upload(file, self.directory / INCOMING_DIR / uuid.uuid4().hex, max_size)
+        blob = await asyncio.to_thread(self._adopt, staged.path, staged.sha256, staged.size, owner)
+        self.stats["deduplicated" if blob.duplicate else "stored"] += 1
+        return blob
+
+    def _adopt(self, staged: Path, sha256: str, size: int, owner: str) -> Blob:
+        """Move a staged upload into place (or drop it if the content is already stored) and take a reference"""
+        now = self.clock()
+        path = self.path_for(sha256)
+        conn = self._connect()
+        try:
+            # File moves happen under the write lock, so garbage collection never deletes a blob being re-used
+            conn.execute("BEGIN IMMEDIATE")
+            known = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone() is not None
+            duplicate = known and path.is_file()
+            if duplicate:
+                staged.unlink()
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staged, path)
+                conn.execute(
+                    "INSERT OR IGNORE INTO blobs (sha256, size, refcount, created_at, updated_at) VALUES (?, ?, 0, ?, ?)",
+                    (sha256, size, now, now)
+                )
+
+            row = conn.execute("SELECT sha256 FROM blob_refs WHERE owner = ?", (owner,)).fetchone()
+            previous = row[0] if row else None
+            if previous != sha256:
+                conn.execute("INSERT OR REPLACE INTO blob_refs (owner, sha256) VALUES (?, ?)", (owner, sha256))
+                conn.execute(
+                    "UPDATE blobs SET refcount = refcount + 1, updated_at = ? WHERE sha256 = ?", (now, sha256)
+                )
+                if previous is not None:
+                    conn.execute(
+                        "UPDATE blobs SET refcount = refcount - 1, updated_at = ? WHERE sha256 = ?", (now, previous)
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return Blob(sha256, path, size, duplicate)
+
+    async def cached_result(self, sha256: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Result stored by `store_result` for this content, if any"""
+        result = await asyncio.to_thread(self._cached_result, sha256, kind)
+        if result is not None:
+            self.stats["cache_hits"] += 1
+        return result
+
+    def _cached_result(self, sha256: str, kind: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM blob_results WHERE sha256 = ? AND kind = ?", (sha256, kind)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def store_result(self, sha256: str, kind: str, result: Dict[str, Any]):
+        await asyncio.to_thread(self._store_result, sha256, kind, result)
+
+    def _store_result(self, sha256: str, kind: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            # Only cache for blobs still in the index, so results never outlive their blob
+            conn.execute(
+                "INSERT OR REPLACE INTO blob_results (sha256, kind, result, created_at) "
+                "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM blobs WHERE sha256 = ?)",
+                (sha256, kind, json.dumps(result, default=str), self.clock(), sha256)
+            )
+
+    async def collect_garbage(self, grace: float, dry_run: bool = False) -> Dict[str, Any]:
+        """Delete blobs unreferenced for longer than `grace` seconds, and stray files that old"""
+        report = await asyncio.to_thread(self._collect_garbage, grace, dry_run)
+        if not dry_run:
+            self.stats["blobs_collected"] += report["blobs"]
+            self.stats["bytes_collected"] += report["bytes"]
+        if report["blobs"] or report["stray_files"]:
+            logger.info(
+                f"Blob GC{' (dry run)' if dry_run else ''}: {report['blobs']} blobs "
+                f"({report['bytes']:,} bytes), {report['stray_files']} stray files"
+            )
+        return report
+
+    def _collect_garbage(self, grace: float, dry_run: bool) -> Dict[str, Any]:
+        cutoff = self.clock() - grace
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT sha256, size FROM blobs WHERE refcount <= 0 AND updated_at < ?", (cutoff,)
+            ).fetchall()
+            if not dry_run:
+                for sha256, _ in rows:
+                    self.path_for(sha256).unlink(missing_ok=True)
+                    conn.execute("DELETE FROM blob_results WHERE sha256 = ?", (sha256,))
+                    conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            conn.execute("COMMIT")
+            known = {row[0] for row in conn.execute("SELECT sha256 FROM blobs")}
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        # Files with no index row: staging left by a crashed upload, or a blob whose row was lost.
+        # Uploads in progress are younger than the grace period, so they are never touched.
+        stray = 0
+        shards = [path for path in self.directory.iterdir() if path.is_dir()] if self.directory.is_dir() else []
+        for shard in shards:
+            for path in shard.iterdir():
+                if path.name in known or not path.is_file() or path.stat().st_mtime >= cutoff:
+                    continue
+                stray += 1
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+
+        return {"blobs": len(rows), "bytes": sum(size for _, size in rows), "stray_files": stray, "dry_run": dry_run}
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            blobs, total_bytes, unreferenced = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount <= 0), 0) FROM blobs"
+            ).fetchone()
+            references = conn.execute("SELECT COUNT(*) FROM blob_refs").fetchone()[0]
+        return {"blobs": blobs, "bytes": total_bytes, "unreferenced": unreferenced, "references": references}
+
+    def start(self, interval: float, grace: float):
+        """Collect garbage every `interval` seconds in the background"""
+        if interval > 0 and self._gc_task is None:
+            self._gc_task = asyncio.create_task(self._collect_periodically(interval, grace))
+
+    async def stop(self):
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+
+    async def _collect_periodically(self, interval: float, grace: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.collect_garbage(grace)
+            except Exception as e:
+                logger.error(f"Blob garbage collection failed: {e}")
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Stored blobs and bytes, dedup and cache counters"""
+        return {**await asyncio.to_thread(self.counts), **self.stats}
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    """Process-wide blob store for uploads"""
+    return BlobStore(settings.upload_dir / "blobs", settings.blob_index_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Delete unreferenced upload blobs")
+    parser.add_argument("--grace", type=float, default=settings.blob_gc_grace_seconds,
+                        help="seconds a blob must have been unreferenced")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(get_blob_store().collect_garbage(args.grace, args.dry_run)), indent=2))
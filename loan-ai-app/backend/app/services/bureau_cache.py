@@ -0,0 +1,147 @@
+"""Cache in front of the credit bureau and CRM lookups, keyed by PAN.
+
+The same PAN is often assessed several times in one session (VIDEO_KYC ->
+VERIFICATION loops, retries, re-applying for a smaller amount), and a real
+bureau charges per pull. Results are kept in an in-process LRU and, optionally,
+a shared SQLite tier; concurrent lookups for the same PAN share one upstream
+call. Time comes from an injectable clock so TTL behaviour is deterministic in
+tests.
+
+PANs are a small, structured keyspace, so a plain hash of one is easily
+reversed; cache keys use an HMAC under `bureau_cache_key_secret` instead.
+"""
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from app.config import settings
+from app.services.mock_data import MockDataService
+from app.services.response_cache import MemoryTier, SQLiteTier
+
+logger = logging.getLogger(__name__)
+
+
+def _pan_key(kind: str, pan_number: str, secret: bytes) -> str:
+    """Cache key for a lookup; the PAN is keyed-hashed so it never sits in the cache in clear"""
+    digest = hmac.new(secret, pan_number.strip().upper().encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{kind}:{digest}"
+
+
+class CachedBureauService:
+    """Drop-in for MockDataService with TTL caching of PAN-keyed lookups.
+
+    `source` is anything with MockDataService's async methods, so a real
+    bureau/CRM client can be swapped in without touching the cache.
+    """
+
+    def __init__(
+        self,
+        source=None,
+        ttl_seconds: float = None,
+        max_entries: int = None,
+        shared_path: str = None,
+        clock: Callable[[], float] = time.time,
+        key_secret: str = None
+    ):
+        self.source = source or MockDataService()
+        # Workers sharing the SQLite tier must use the same secret
+        self._key_secret = (key_secret or settings.bureau_cache_key_secret or settings.secret_key).encode("utf-8")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.bureau_cache_ttl_seconds
+        self.clock = clock
+        self.memory = MemoryTier(max_entries or settings.bureau_cache_max_entries, clock=clock)
+        self.shared: Optional[SQLiteTier] = None
+        shared_path = shared_path if shared_path is not None else settings.bureau_cache_sqlite_path
+        if shared_path:
+            try:
+                self.shared = SQLiteTier(shared_path, table="bureau_cache", clock=clock)
+            except Exception as e:
+                logger.error(f"Could not open bureau cache at {shared_path}, using memory only: {e}")
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    async def get_credit_score(self, pan_number: str) -> int:
+        """Credit bureau score for a PAN"""
+        return await self._cached("credit_score", pan_number, lambda: self.source.get_credit_score(pan_number))
+
+    async def check_existing_loans(self, pan_number: str) -> Dict[str, Any]:
+        """CRM existing-loan summary for a PAN"""
+        return await self._cached("existing_loans", pan_number, lambda: self.source.check_existing_loans(pan_number))
+
+    async def get_offer_eligibility(self, loan_amount: float, monthly_salary: float) -> Dict[str, Any]:
+        """Offer Mart check; depends on the requested amount, so not cached"""
+        return await self.source.get_offer_eligibility(loan_amount, monthly_salary)
+
+    async def _cached(self, kind: str, pan_number: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        key = _pan_key(kind, pan_number, self._key_secret)
+
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            # Someone is already fetching this PAN - wait for their result
+            self.stats["coalesced"] += 1
+        else:
+            # The fetch runs as its own task, so a caller that gives up (e.g. a lookup
+            # timeout) only stops its own wait, never the result the others share
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here too, so a failure nobody is still waiting for isn't logged as never retrieved
+            self.stats["errors"] += 1
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Shared tier, then the upstream source; fills both tiers"""
+        if self.shared is not None:
+            try:
+                row = await asyncio.to_thread(self.shared.get, key)
+            except Exception as e:
+                logger.warning(f"Bureau cache read failed: {e}")
+                row = None
+            if row is not None:
+                expires_at, raw = row
+                value = json.loads(raw)
+                self.memory.set(key, value, expires_at)
+                self.stats["shared_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        value = await fetch()
+        expires_at = self.clock() + self.ttl_seconds
+        self.memory.set(key, value, expires_at)
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(self.shared.set, key, json.dumps(value), expires_at)
+            except Exception as e:
+                logger.warning(f"Bureau cache write failed: {e}")
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        hits = self.stats["memory_hits"] + self.stats["shared_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.memory),
+            "shared_enabled": self.shared is not None,
+            "hit_rate": round(hits / lookups, 3) if lookups else None
+        }
+
+
+@lru_cache()
+def get_bureau_service() -> CachedBureauService:
+    """Process-wide bureau cache shared by every UnderwritingAgent"""
+    return CachedBureauService()
@@ -1,101 +1,403 @@
 import os
+import re
 import json
+import asyncio
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Optional, Union
 
-try:
-    from anthropic import AsyncAnthropic
-except Exception:
-    AsyncAnthropic = None
-
-from httpx import HTTPStatusError
+from app.config import settings
+from app.services.llm_client import get_anthropic_client
+from app.services.resilience import CircuitBreaker, backoff_delay
+from app.services.rate_limiter import AdmissionController, AdmissionTimeoutError, PRIORITY_CHAT, PRIORITY_EXTRACTION
+from app.services.response_cache import ResponseCache, cache_key
 
 logger = logging.getLogger(__name__)
 
+EXTRACTION_SYSTEM_PROMPT = """You are a data extraction assistant. Extract structured information from user messages.
+Return ONLY valid JSON, no additional text or explanation.
+
+Each request gives a schema (field name -> description) and a user message. Extract the
+fields in the schema from the message and return a JSON object with exactly those keys.
+Use null for missing values.
+Example: {"name": "John Doe", "loan_amount": 500000, "monthly_salary": 50000}"""
+
+# Characters per token for rough size estimates (rate limiting, prompt cache eligibility)
+CHARS_PER_TOKEN = 4
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class LLMUnavailableError(Exception):
+    """Claude could not be reached: circuit open, retries or request deadline exhausted"""
+
+
+class LLMRequestError(LLMUnavailableError):
+    """Claude rejected the request itself (a non-retryable 4xx); the upstream is healthy"""
+
+
+def _status_code(exc: Exception):
+    """HTTP status code carried by an Anthropic/httpx error, if any"""
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None and getattr(exc, "response", None) is not None:
+        status_code = getattr(exc.response, "status_code", None)
+    return status_code
+
+
+def _is_client_error(status_code) -> bool:
+    """Our request is at fault; retrying or tripping the breaker won't help"""
+    return status_code is not None and status_code < 500 and status_code not in RETRYABLE_STATUS_CODES
 
-import time
 
 class ClaudeService:
     """Service for interacting with Claude API.
 
     If `ANTHROPIC_API_KEY` is missing or invalid, the service falls back to a
     lightweight mock responder so the app remains usable during local development.
+
+    Transient upstream failures are retried with async exponential backoff and
+    jitter inside a per-request deadline. Repeated failures open a circuit
+    breaker, which probes the API again after `llm_breaker_recovery_timeout`
+    seconds. When no answer can be had (breaker open, retries or deadline
+    spent, empty reply) `chat` raises `LLMUnavailableError` rather than passing
+    off a canned reply as the model's; callers decide what to tell the customer.
+    A request the API rejects (non-retryable 4xx) raises its subclass
+    `LLMRequestError` and counts as a healthy upstream for the breaker.
+
+    Agents share one instance (see `get_claude_service`), and with it one
+    Anthropic client, connection pool, breaker and mock flag.
+
+    Successful API responses are cached by request content (see
+    `response_cache`). Call sites whose replies should vary pass `cache=False`.
+
+    `system_prompt` should be the constant part of an agent's instructions and
+    per-conversation state goes in `context`, after it. The prompt is marked
+    for Anthropic prompt caching only once it reaches
+    `llm_prompt_cache_min_tokens`: the API ignores `cache_control` on shorter
+    prefixes (1024 tokens for Sonnet/Opus, 2048 for Haiku), and today's agent
+    prompts are 70-200 tokens, so they are sent as plain strings.
     """
 
-    def __init__(self, retries: int = 2, delay: int = 5):
-        api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    def __init__(
+        self,
+        client=None,
+        max_attempts: int = None,
+        base_delay: float = None,
+        max_delay: float = None,
+        deadline: float = None
+    ):
         self.model = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
         self.use_mock = False
-        self.retries = retries
-        self.delay = delay
+        self.max_attempts = max_attempts or settings.llm_max_attempts
+        self.base_delay = base_delay if base_delay is not None else settings.llm_backoff_base_delay
+        self.max_delay = max_delay if max_delay is not None else settings.llm_backoff_max_delay
+        self.deadline = deadline or settings.llm_request_deadline
+        self.breaker = CircuitBreaker(
+            "anthropic",
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            recovery_timeout=settings.llm_breaker_recovery_timeout
+        )
+        self.admission = AdmissionController(
+            max_in_flight=settings.llm_max_in_flight,
+            requests_per_minute=settings.rate_limit_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute
+        )
+        self.cache = ResponseCache(
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+            max_entries=settings.llm_cache_max_entries,
+            sqlite_path=settings.llm_cache_sqlite_path
+        ) if settings.llm_cache_enabled else None
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "unavailable": 0,
+            "client_errors": 0,
+            "deadline_exceeded": 0
+        }
+        self.usage = {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0
+        }
 
-        if not api_key or AsyncAnthropic is None:
-            logger.warning("Anthropic client unavailable or ANTHROPIC_API_KEY not set — using mock LLM.")
-            self.client = None
+        self.client = client or get_anthropic_client()
+        if self.client is None:
             self.use_mock = True
-        else:
-            try:
-                self.client = AsyncAnthropic(api_key=api_key)
-            except Exception as e:
-                logger.error(f"Failed to initialize Anthropic client: {e}")
-                self.client = None
-                self.use_mock = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retry counters, circuit breaker state and admission queue for monitoring"""
+        return {
+            **self.stats,
+            "mock": self.use_mock,
+            "circuit_breaker": self.breaker.snapshot(),
+            "admission": self.admission.snapshot(),
+            "cache": self.cache.snapshot() if self.cache else None,
+            "usage": dict(self.usage)
+        }
+
+    @staticmethod
+    def _system_blocks(system_prompt: str, context: Optional[str] = None) -> Union[str, List[Dict[str, Any]]]:
+        """System parameter with `context` after the static prompt, which is marked cacheable if long enough"""
+        cacheable = len(system_prompt or "") // CHARS_PER_TOKEN >= settings.llm_prompt_cache_min_tokens
+        if not settings.llm_prompt_caching or not cacheable:
+            return "\n\n".join(part for part in (system_prompt, context) if part)
+        blocks = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        if context:
+            blocks.append({"type": "text", "text": context})
+        return blocks
+
+    def _record_usage(self, usage):
+        """Accumulate token usage, including prompt cache reads/writes, from one response"""
+        if usage is None:
+            return
+        call = {key: getattr(usage, key, None) or 0 for key in self.usage}
+        for key, value in call.items():
+            self.usage[key] += value
+        logger.debug(
+            f"Claude usage: in={call['input_tokens']} out={call['output_tokens']} "
+            f"cache_write={call['cache_creation_input_tokens']} cache_read={call['cache_read_input_tokens']}"
+        )
+
+    @staticmethod
+    def _estimate_tokens(system_prompt: str, messages: List[Dict[str, str]], max_tokens: int, context: str = None) -> int:
+        """Rough token budget of a request (~4 characters per token) for rate limiting"""
+        chars = len(system_prompt or "") + len(context or "") + sum(len(m.get("content", "")) for m in messages)
+        return chars // CHARS_PER_TOKEN + max_tokens
 
     async def chat(
         self,
         system_prompt: str,
         messages: List[Dict[str, str]],
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_CHAT,
+        cache: bool = True,
+        context: Optional[str] = None
     ) -> str:
         """
         Send request to Claude API with conversation history
         
         Args:
-            system_prompt: System prompt defining agent behavior
+            system_prompt: Static system prompt defining agent behavior (prompt-cached if long enough)
             messages: List of message dicts with 'role' and 'content' keys
             max_tokens: Maximum tokens in response
+            priority: Admission priority (PRIORITY_CHAT or PRIORITY_EXTRACTION)
+            cache: Whether an identical earlier response may be reused
+            context: Per-call system text sent after the static prompt
         
         Returns:
             Response text from Claude
+        
+        Raises:
+            LLMRequestError: Claude rejected the request (non-retryable 4xx)
+            LLMUnavailableError: The breaker is open, retries or the deadline ran out, or the reply was empty
         """
         if self.use_mock:
             return self._mock_response(messages)
 
-        for attempt in range(self.retries):
+        system = self._system_blocks(system_prompt, context)
+        key = None
+        if cache and self.cache is not None:
+            key = cache_key(self.model, system, messages, max_tokens)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        estimated_tokens = self._estimate_tokens(system_prompt, messages, max_tokens, context)
+
+        reason = "retries exhausted"
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow_request():
+                logger.warning("Claude circuit breaker open, not sending request")
+                reason = "circuit breaker open"
+                break
+
+            # Every call the breaker let through is settled, or a half-open probe slot leaks
+            settled = False
             try:
-                response = await self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    system=system_prompt,
-                    messages=messages
-                )
+                async with self.admission.admit(priority, estimated_tokens, timeout=deadline - loop.time()):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self.stats["deadline_exceeded"] += 1
+                        logger.warning("Claude request deadline spent waiting for admission")
+                        reason = "deadline exceeded"
+                        break
+                    response = await asyncio.wait_for(
+                        self.client.messages.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            system=system,
+                            messages=messages
+                        ),
+                        timeout=remaining
+                    )
+                self.breaker.record_success()
+                settled = True
+                self._record_usage(getattr(response, "usage", None))
 
                 if response.content and len(response.content) > 0:
-                    return response.content[0].text
-                else:
-                    logger.warning("Empty response from Claude API")
-                    return "I apologize, but I couldn't generate a response."
-
-            except HTTPStatusError as he:
-                status_code = he.response.status_code
-                logger.error(f"Claude API HTTP error on attempt {attempt + 1}: {status_code} - {he}")
+                    text = response.content[0].text
+                    if key is not None:
+                        await self.cache.set(key, text)
+                    return text
+                logger.warning("Empty response from Claude API")
+                reason = "empty response"
+                break
+
+            except AdmissionTimeoutError:
+                # Our own in-flight cap or rate budget refused it; the upstream never saw the call
+                self.stats["deadline_exceeded"] += 1
+                logger.warning("Claude request deadline spent waiting for admission")
+                reason = "deadline exceeded"
+                break
+            except Exception as e:
+                status_code = _status_code(e)
+                logger.error(f"Claude API error on attempt {attempt + 1}: {status_code or ''} {str(e) or type(e).__name__}")
+
                 if status_code == 401:
+                    # The upstream answered; it is our key that is bad
+                    self.breaker.record_success()
+                    settled = True
                     logger.error("Anthropic API key appears invalid (401). Switching to mock responder.")
                     self.use_mock = True
                     return self._mock_response(messages)
-                if status_code >= 500 and attempt < self.retries - 1:
-                    time.sleep(self.delay)
-                    continue
-                return "I apologize, but I'm experiencing technical difficulties. Please try again later."
+                if _is_client_error(status_code):
+                    self.breaker.record_success()
+                    settled = True
+                    self.stats["client_errors"] += 1
+                    raise LLMRequestError(f"Claude rejected the request ({status_code})") from e
 
-            except Exception as e:
-                logger.error(f"Claude API error on attempt {attempt + 1}: {str(e)}")
-                if attempt < self.retries - 1:
-                    time.sleep(self.delay)
-                    continue
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+                settled = True
+
+                if attempt == self.max_attempts - 1:
+                    break
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                if loop.time() + delay >= deadline:
+                    self.stats["deadline_exceeded"] += 1
+                    logger.warning("Claude request deadline exhausted, not retrying")
+                    reason = "deadline exceeded"
+                    break
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+            finally:
+                if not settled:
+                    # Cancelled, or the deadline ran out before the request was sent
+                    self.breaker.release()
+
+        self.stats["unavailable"] += 1
+        raise LLMUnavailableError(f"Claude is unavailable ({reason})")
+
+    async def stream_chat(
+        self,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        cache: bool = True,
+        context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a Claude response as text chunks as they are generated
+        
+        Args:
+            system_prompt: Static system prompt defining agent behavior (prompt-cached if long enough)
+            messages: List of message dicts with 'role' and 'content' keys
+            max_tokens: Maximum tokens in response
+            cache: Whether an identical earlier response may be reused
+            context: Per-call system text sent after the static prompt
+        
+        Yields:
+            Text chunks from Claude. If the stream fails before any text was
+            produced, the full response from `chat` is yielded as one chunk;
+            failures after that are raised to the caller.
+        
+        Raises:
+            LLMUnavailableError: As for `chat`, before any text was yielded
+            LLMRequestError: Claude rejected the request (non-retryable 4xx)
+        """
+        if self.use_mock:
+            async for chunk in self._mock_stream(messages):
+                yield chunk
+            return
+
+        # A cache hit never reaches the upstream, so it must not take a breaker probe
+        system = self._system_blocks(system_prompt, context)
+        key = None
+        if cache and self.cache is not None:
+            key = cache_key(self.model, system, messages, max_tokens)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        if not self.breaker.allow_request():
+            self.stats["unavailable"] += 1
+            raise LLMUnavailableError("Claude is unavailable (circuit breaker open)")
+
+        emitted = False
+        settled = False
+        chunks = []
+        try:
+            estimated_tokens = self._estimate_tokens(system_prompt, messages, max_tokens, context)
+            async with self.admission.admit(PRIORITY_CHAT, estimated_tokens, timeout=self.deadline):
+                async with self.client.messages.stream(
+                    model=self.model,
+                    max_tokens=max_tokens,
+                    system=system,
+                    messages=messages
+                ) as stream:
+                    async for text in stream.text_stream:
+                        emitted = True
+                        chunks.append(text)
+                        yield text
+                    final_message = await stream.get_final_message()
+            self._record_usage(getattr(final_message, "usage", None))
+            self.breaker.record_success()
+            settled = True
+            if key is not None and chunks:
+                await self.cache.set(key, "".join(chunks))
+        except AdmissionTimeoutError:
+            self.stats["deadline_exceeded"] += 1
+            self.stats["unavailable"] += 1
+            logger.warning("Claude stream deadline spent waiting for admission")
+            raise LLMUnavailableError("Claude is unavailable (deadline exceeded)")
+        except Exception as e:
+            status_code = _status_code(e)
+            if status_code == 401 and not emitted:
+                self.breaker.record_success()
+                settled = True
+                logger.error("Anthropic API key appears invalid (401). Switching to mock responder.")
                 self.use_mock = True
-                return self._mock_response(messages)
-        return "I apologize, but I'm experiencing technical difficulties after multiple retries. Please try again later."
+                yield self._mock_response(messages)
+                return
+            if _is_client_error(status_code):
+                self.breaker.record_success()
+                settled = True
+                self.stats["client_errors"] += 1
+                raise LLMRequestError(f"Claude rejected the request ({status_code})") from e
+            self.breaker.record_failure()
+            settled = True
+            if emitted:
+                logger.error(f"Claude stream interrupted: {str(e)}")
+                raise
+            logger.error(f"Claude stream failed before first token, falling back to chat: {str(e)}")
+            yield await self.chat(system_prompt, messages, max_tokens, cache=cache, context=context)
+        finally:
+            if not settled:
+                # The consumer stopped reading or the task was cancelled mid-stream
+                self.breaker.release()
+
+    async def _mock_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream the mock response word by word so streaming works offline."""
+        for chunk in re.findall(r"\S+\s*", self._mock_response(messages)):
+            await asyncio.sleep(0)
+            yield chunk
 
     def _mock_response(self, messages: List[Dict[str, str]]) -> str:
         """Generate a mock response for local development."""
@@ -132,7 +434,6 @@ class ClaudeService:
             text_lower = text.lower()
             
             # Simple heuristic extraction for mock mode
-            import re
             
             # Extract numbers for amount/salary
             numbers = re.findall(r'[\d,]+', text)
@@ -167,31 +468,23 @@ class ClaudeService:
             
             return mock_data
 
-        system_prompt = """You are a data extraction assistant. Extract structured information from user messages.
-        Return ONLY valid JSON, no additional text or explanation."""
-        
         schema_description = json.dumps(schema, indent=2)
         
-        prompt = f"""Extract the following information from this user message:
-        
-        Schema:
+        prompt = f"""Schema:
         {schema_description}
         
         User message: "{text}"
-        
-        Return a JSON object with the extracted fields. Use null for missing values.
-        Example: {{"name": "John Doe", "loan_amount": 500000, "monthly_salary": 50000}}
         """
         
         try:
             response = await self.chat(
-                system_prompt=system_prompt,
+                system_prompt=EXTRACTION_SYSTEM_PROMPT,
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=500
+                max_tokens=500,
+                priority=PRIORITY_EXTRACTION
             )
             
             # Use regex to find JSON in the response
-            import re
             json_match = re.search(r"\{.*\}", response, re.DOTALL)
             if not json_match:
                 raise ValueError("No JSON object found in Claude's response")
@@ -209,3 +502,9 @@ class ClaudeService:
         """Legacy method for backward compatibility"""
         messages = [{"role": "user", "content": prompt}]
         return await self.chat(system_prompt or "", messages)
+
+
+@lru_cache()
+def get_claude_service() -> ClaudeService:
+    """Process-wide ClaudeService injected into every agent"""
+    return ClaudeService()
@@ -0,0 +1,306 @@
+"""Conversation state storage for in-memory mode (USE_DATABASE=false).
+
+MasterAgent keeps conversations in a `ConversationStore`, so the backend can be
+swapped without touching the agents. The default, `MemoryConversationStore`,
+is bounded in several ways:
+
+- an LRU capped at `max_sessions`;
+- a memory budget, measured as the serialised size of each session and
+  refreshed on every `save`;
+- an idle TTL: sessions untouched for `idle_ttl` seconds are evicted.
+
+Evicted sessions are dropped unless a spill file is configured. With one, they
+are written to SQLite and loaded back on their next access, and spilled
+sessions are deleted after `spill_ttl`. A lightweight deployment can then run
+for weeks without its memory growing with every conversation ever started.
+
+With several workers, set `conversation_store_url` to share conversations via
+a Redis-compatible server instead (see `app.services.session_store`).
+"""
+import time
+import asyncio
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator
+
+from app.config import settings
+from app.models import ConversationState
+
+logger = logging.getLogger(__name__)
+
+# Spilled sessions are read back in pages of this many when scanning
+SCAN_PAGE_SIZE = 500
+
+
+class ConversationConflictError(Exception):
+    """Another request saved the conversation after this one read it"""
+
+    def __init__(self, conversation_id: str):
+        super().__init__(f"Conversation {conversation_id} was updated by another request")
+        self.conversation_id = conversation_id
+
+
+class ConversationStore(ABC):
+    """Interface MasterAgent uses to keep conversation state"""
+
+    @abstractmethod
+    async def get(self, conversation_id: str) -> Optional[ConversationState]:
+        ...
+
+    @abstractmethod
+    async def save(self, state: ConversationState):
+        """Store `state`; call again after changing it so the store sees the change"""
+
+    @abstractmethod
+    async def delete(self, conversation_id: str):
+        ...
+
+    @abstractmethod
+    def scan(self) -> AsyncIterator[ConversationState]:
+        """Every stored conversation, in no particular order"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    async def close(self):
+        """Release connections at shutdown"""
+
+    @abstractmethod
+    async def snapshot(self) -> Dict[str, Any]:
+        """Size and eviction gauges for monitoring"""
+
+
+class SQLiteSpill:
+    """Evicted sessions on disk; calls are blocking and run in a worker thread"""
+
+    def __init__(self, path: str, ttl_seconds: float, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS spilled_conversations ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, spilled_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def write(self, states: List[ConversationState]):
+        now = self.clock()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO spilled_conversations (id, state, spilled_at) VALUES (?, ?, ?)",
+                [(state.conversation_id, state.model_dump_json(), now) for state in states]
+            )
+            # Opportunistic cleanup keeps the file from growing forever
+            conn.execute("DELETE FROM spilled_conversations WHERE spilled_at < ?", (now - self.ttl_seconds,))
+
+    def take(self, conversation_id: str) -> Optional[ConversationState]:
+        """Remove a session from disk and return it"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "DELETE FROM spilled_conversations WHERE id = ? AND spilled_at >= ? RETURNING state",
+                (conversation_id, self.clock() - self.ttl_seconds)
+            ).fetchall()
+        return ConversationState.model_validate_json(rows[0][0]) if rows else None
+
+    def delete(self, conversation_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM spilled_conversations WHERE id = ?", (conversation_id,))
+
+    def page(self, after: str, limit: int) -> List[ConversationState]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT state FROM spilled_conversations WHERE id > ? AND spilled_at >= ? ORDER BY id LIMIT ?",
+                (after, self.clock() - self.ttl_seconds, limit)
+            ).fetchall()
+        return [ConversationState.model_validate_json(row[0]) for row in rows]
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM spilled_conversations WHERE spilled_at >= ?",
+                (self.clock() - self.ttl_seconds,)
+            ).fetchone()[0]
+
+
+class _Entry:
+    __slots__ = ("state", "size", "last_access")
+
+    def __init__(self, state: ConversationState, size: int, last_access: float):
+        self.state = state
+        self.size = size
+        self.last_access = last_access
+
+
+class MemoryConversationStore(ConversationStore):
+    """In-process LRU with an idle TTL, a memory budget and optional spill to disk
+
+    `get` returns the live state object, so in-place changes are visible at
+    once. `save` afterwards re-measures it and marks it recently used.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: float = 21600.0,
+        memory_budget_bytes: int = 256 * 1024 * 1024,
+        spill: Optional[SQLiteSpill] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill = spill
+        self.clock = clock
+        # Least recently used first
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.resident_bytes = 0
+        self.stats = {
+            "hits": 0, "misses": 0, "spill_loads": 0,
+            "evicted_idle": 0, "evicted_lru": 0, "evicted_budget": 0,
+            "spilled": 0, "dropped": 0
+        }
+
+    async def get(self, conversation_id: str) -> Optional[ConversationState]:
+        await self._evict()
+        entry = self._entries.get(conversation_id)
+        if entry is not None:
+            entry.last_access = self.clock()
+            self._entries.move_to_end(conversation_id)
+            self.stats["hits"] += 1
+            return entry.state
+
+        state = None
+        if self.spill is not None:
+            try:
+                state = await asyncio.to_thread(self.spill.take, conversation_id)
+            except Exception as e:
+                logger.error(f"Could not read spilled conversation {conversation_id}: {e}")
+        if state is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["spill_loads"] += 1
+        self._put(state)
+        await self._evict()
+        return state
+
+    async def save(self, state: ConversationState):
+        resident = state.conversation_id in self._entries
+        self._put(state)
+        if not resident and self.spill is not None:
+            # An older copy may have been spilled while this one was in use
+            await asyncio.to_thread(self.spill.delete, state.conversation_id)
+        await self._evict()
+
+    async def delete(self, conversation_id: str):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.resident_bytes -= entry.size
+        if self.spill is not None:
+            await asyncio.to_thread(self.spill.delete, conversation_id)
+
+    def _put(self, state: ConversationState):
+        size = len(state.model_dump_json())
+        entry = self._entries.get(state.conversation_id)
+        if entry is None:
+            self._entries[state.conversation_id] = _Entry(state, size, self.clock())
+        else:
+            self.resident_bytes -= entry.size
+            entry.state, entry.size, entry.last_access = state, size, self.clock()
+            self._entries.move_to_end(state.conversation_id)
+        self.resident_bytes += size
+
+    async def _evict(self):
+        """Evict idle sessions, then least recently used ones while over the count or memory limits"""
+        now = self.clock()
+        evicted = []
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.last_access > self.idle_ttl:
+                reason = "idle"
+            elif len(self._entries) > self.max_sessions:
+                reason = "lru"
+            elif self.resident_bytes > self.memory_budget_bytes and len(self._entries) > 1:
+                # Never evict the session just used, even if it alone is over budget
+                reason = "budget"
+            else:
+                break
+            self._entries.popitem(last=False)
+            self.resident_bytes -= entry.size
+            self.stats[f"evicted_{reason}"] += 1
+            evicted.append(entry.state)
+
+        if not evicted:
+            return
+        if self.spill is not None:
+            try:
+                await asyncio.to_thread(self.spill.write, evicted)
+                self.stats["spilled"] += len(evicted)
+                return
+            except Exception as e:
+                logger.error(f"Could not spill {len(evicted)} conversations, dropping them: {e}")
+        self.stats["dropped"] += len(evicted)
+
+    async def scan(self) -> AsyncIterator[ConversationState]:
+        for entry in list(self._entries.values()):
+            yield entry.state
+        if self.spill is None:
+            return
+        after = ""
+        while True:
+            page = await asyncio.to_thread(self.spill.page, after, SCAN_PAGE_SIZE)
+            for state in page:
+                # A session may have been loaded back into memory since the scan started
+                if state.conversation_id not in self._entries:
+                    yield state
+            if len(page) < SCAN_PAGE_SIZE:
+                return
+            after = page[-1].conversation_id
+
+    async def count(self) -> int:
+        spilled = await asyncio.to_thread(self.spill.count) if self.spill is not None else 0
+        return len(self._entries) + spilled
+
+    async def snapshot(self) -> Dict[str, Any]:
+        return {
+            "resident": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_sessions": self.max_sessions,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "spilled_sessions": await asyncio.to_thread(self.spill.count) if self.spill is not None else None,
+            **self.stats
+        }
+
+
+@lru_cache()
+def get_conversation_store() -> ConversationStore:
+    """Process-wide store for in-memory mode"""
+    if settings.conversation_store_url:
+        from app.services.session_store import RedisSessionBackend, SharedConversationStore
+        return SharedConversationStore(
+            RedisSessionBackend.from_url(settings.conversation_store_url),
+            ttl_seconds=settings.conversation_store_ttl_seconds,
+            codec=settings.conversation_store_codec
+        )
+    spill = None
+    if settings.conversation_spill_sqlite_path:
+        try:
+            spill = SQLiteSpill(settings.conversation_spill_sqlite_path, settings.conversation_spill_ttl_seconds)
+        except Exception as e:
+            logger.error(f"Could not open conversation spill file, evicted sessions will be dropped: {e}")
+    return MemoryConversationStore(
+        max_sessions=settings.conversation_store_max_sessions,
+        idle_ttl=settings.conversation_store_idle_ttl,
+        memory_budget_bytes=settings.conversation_store_memory_budget_mb * 1024 * 1024,
+        spill=spill
+    )
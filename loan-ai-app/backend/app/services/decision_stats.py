@@ -0,0 +1,80 @@
+"""Conversation counts by decision for the dashboard (/api/stats).
+
+Counting takes one `GROUP BY decision` query, which the index on
+`conversations.decision` serves. With counters enabled, that query runs once.
+After that the counts are kept up to date in memory: a new conversation adds
+to pending, and a chat turn that changes the decision moves one conversation
+between buckets. A dashboard poll therefore costs O(1).
+
+Other processes also write decisions (extra uvicorn workers, batch
+rescoring), so the counts are reloaded from the database every
+`resync_interval` seconds and after a rescore.
+"""
+import time
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, Optional, Callable, Awaitable, Mapping
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CountLoader = Callable[[], Awaitable[Mapping[Optional[str], int]]]
+
+
+def summarise(counts: Mapping[Optional[str], int]) -> Dict[str, int]:
+    """/api/stats fields from conversation counts keyed by decision (None = no decision yet)"""
+    return {
+        "total_conversations": sum(counts.values()),
+        "approved_loans": counts.get("APPROVED", 0),
+        "rejected_loans": counts.get("REJECTED", 0),
+        "pending": counts.get(None, 0)
+    }
+
+
+class DecisionCounters:
+    """Conversation counts by decision, loaded once and then maintained from transitions"""
+
+    def __init__(self, enabled: bool = True, resync_interval: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self._counts: Optional[Counter] = None
+        self._loaded_at = 0.0
+        self.stats = {"loads": 0, "reads": 0}
+
+    def created(self, count: int = 1):
+        """New conversations (no decision yet) were committed"""
+        if self._counts is not None:
+            self._counts[None] += count
+
+    def changed(self, previous: Optional[str], current: Optional[str]):
+        """A committed conversation's decision went from `previous` to `current`"""
+        if self._counts is not None and previous != current:
+            self._counts[previous] -= 1
+            self._counts[current] += 1
+
+    def invalidate(self):
+        """Reload on the next read (e.g. after a bulk update of decisions)"""
+        self._counts = None
+
+    async def get(self, load: CountLoader) -> Dict[str, int]:
+        """Current counts summarised for /api/stats; `load` runs the GROUP BY when a reload is due"""
+        self.stats["reads"] += 1
+        if not self.enabled:
+            return summarise(await load())
+        if self._counts is None or self.clock() - self._loaded_at >= self.resync_interval:
+            self._counts = Counter(await load())
+            self._loaded_at = self.clock()
+            self.stats["loads"] += 1
+        return summarise(self._counts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "loaded": self._counts is not None, **self.stats}
+
+
+@lru_cache()
+def get_decision_counters() -> DecisionCounters:
+    """Process-wide counters shared by the chat, upload and stats endpoints"""
+    return DecisionCounters(enabled=settings.stats_counters, resync_interval=settings.stats_resync_interval)
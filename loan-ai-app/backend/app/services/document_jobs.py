@@ -0,0 +1,403 @@
+"""Durable job queue for uploaded documents.
+
+`/api/upload` stores the file, enqueues a job and returns its id at once. A
+small pool of asyncio workers picks jobs up and runs the processing pipeline
+(OCR, field parsing, verification) while the client polls
+`/api/upload/jobs/{job_id}?conversation_id=...`.
+
+Jobs live in a local SQLite file, so queued work survives a restart. Several
+workers or processes can share the file: a claimed job records its owner and
+a heartbeat the owner refreshes while it runs. Only jobs whose heartbeat is
+older than the lease (their owner crashed or was killed) are put back in the
+queue, so a restarting process never takes work a live peer is doing. A
+stopping process hands its running jobs back at once. A failed
+job is retried with exponential backoff up to `max_attempts` times, then moved
+to the dead-letter list (status `dead`) for an admin to inspect or re-queue.
+An upload whose content was processed before is recorded as `done` straight
+away with the cached result (see `blob_store`).
+"""
+import json
+import time
+import os
+import uuid
+import socket
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from app.services.resilience import backoff_delay
+from app.services.process_pool import PoolBusyError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+FINISHED = (DONE, DEAD)
+
+JOB_COLUMNS = (
+    "id", "conversation_id", "doc_type", "filename", "file_path", "content_type", "size", "sha256",
+    "status", "attempts", "max_attempts", "available_at", "result", "error", "created_at", "updated_at",
+    "claimed_by", "heartbeat_at"
+)
+
+# Columns added after the first release, with their types, for queue files created before them
+LATER_COLUMNS = {"sha256": "TEXT", "claimed_by": "TEXT", "heartbeat_at": "REAL"}
+
+
+class JobStore:
+    """SQLite-backed job table; calls are blocking and run in a worker thread"""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_jobs ("
+                "id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, doc_type TEXT NOT NULL, "
+                "filename TEXT, file_path TEXT NOT NULL, content_type TEXT, size INTEGER, sha256 TEXT, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "available_at REAL NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, claimed_by TEXT, heartbeat_at REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_document_jobs_status_available "
+                "ON document_jobs (status, available_at)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(document_jobs)")}
+            for column, column_type in LATER_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE document_jobs ADD COLUMN {column} {column_type}")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    @staticmethod
+    def _row_to_job(row) -> Dict[str, Any]:
+        job = dict(zip(JOB_COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def add(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a job, or record it as already done when its `result` is known"""
+        now = self.clock()
+        job = {
+            **job,
+            "status": QUEUED if result is None else DONE, "attempts": 0, "available_at": now,
+            "result": result, "error": None, "created_at": now, "updated_at": now,
+            "claimed_by": None, "heartbeat_at": None
+        }
+        row = {**job, "result": None if result is None else json.dumps(result, default=str)}
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO document_jobs ({', '.join(JOB_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in JOB_COLUMNS)})",
+                tuple(row[column] for column in JOB_COLUMNS)
+            )
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM document_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest due job to `running` under `owner` and return it"""
+        now = self.clock()
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so two workers (or processes) never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM document_jobs "
+                "WHERE status = ? AND available_at <= ? ORDER BY available_at, created_at LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job = self._row_to_job(row)
+            job.update(status=RUNNING, attempts=job["attempts"] + 1, updated_at=now, claimed_by=owner, heartbeat_at=now)
+            conn.execute(
+                "UPDATE document_jobs SET status = ?, attempts = ?, updated_at = ?, claimed_by = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (RUNNING, job["attempts"], now, owner, now, job["id"])
+            )
+            conn.execute("COMMIT")
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE document_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (DONE, json.dumps(result, default=str), self.clock(), job_id)
+            )
+
+    def fail(self, job: Dict[str, Any], error: str, retry_in: Optional[float]):
+        """Re-queue after `retry_in` seconds, or dead-letter the job when it is None"""
+        now = self.clock()
+        status = DEAD if retry_in is None else QUEUED
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE document_jobs SET status = ?, error = ?, available_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, now + (retry_in or 0), now, job["id"])
+            )
+
+    def defer(self, job: Dict[str, Any], delay: float):
+        """Put a job back without using up an attempt (the failure was not the job's fault)"""
+        now = self.clock()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE document_jobs SET status = ?, attempts = attempts - 1, available_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (QUEUED, now + delay, now, job["id"])
+            )
+
+    def requeue(self, job_id: str) -> bool:
+        """Give a dead-lettered job a fresh set of attempts"""
+        now = self.clock()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE document_jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (QUEUED, now, now, job_id, DEAD)
+            )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, owner: str) -> int:
+        """Renew the lease on every job `owner` is running"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE document_jobs SET heartbeat_at = ? WHERE status = ? AND claimed_by = ?",
+                (self.clock(), RUNNING, owner)
+            )
+        return cursor.rowcount
+
+    def release(self, owner: str) -> int:
+        """Hand the jobs `owner` is running back to the queue (it is shutting down)"""
+        now = self.clock()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE document_jobs SET status = ?, available_at = ?, updated_at = ?, claimed_by = NULL "
+                "WHERE status = ? AND claimed_by = ?",
+                (QUEUED, now, now, RUNNING, owner)
+            )
+        return cursor.rowcount
+
+    def recover_stale(self, lease_seconds: float) -> int:
+        """Re-queue running jobs whose owner stopped renewing the lease (it crashed or was killed)"""
+        now = self.clock()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE document_jobs SET status = ?, available_at = ?, updated_at = ?, claimed_by = NULL "
+                "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (QUEUED, now, now, RUNNING, now - lease_seconds)
+            )
+        return cursor.rowcount
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM document_jobs "
+                "WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+                (DEAD, limit)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM document_jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, DONE: 0, DEAD: 0, **dict(rows)}
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class DocumentJobQueue:
+    """Worker pool over a JobStore"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: JobHandler,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 60.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # Claims are made under this name; unique per process and per queue
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+        self.stats = {"processed": 0, "cached": 0, "retried": 0, "deferred": 0, "dead_lettered": 0}
+
+    async def start(self):
+        await self._recover_stale()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs cancelled mid-run go straight back to the queue for this or another process
+        released = await asyncio.to_thread(self.store.release, self.owner)
+        if released:
+            logger.info(f"Handed {released} running document jobs back to the queue")
+
+    async def _recover_stale(self):
+        recovered = await asyncio.to_thread(self.store.recover_stale, self.lease_seconds)
+        if recovered:
+            logger.warning(f"Re-queued {recovered} document jobs whose worker stopped renewing its lease")
+
+    async def _keep_leases(self):
+        """Renew this process's leases, and pick up jobs of processes that died, a few times per lease"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.owner)
+                await self._recover_stale()
+            except Exception as e:
+                logger.error(f"Document job lease renewal failed: {e}")
+
+    async def enqueue(
+        self,
+        conversation_id: str,
+        doc_type: str,
+        filename: Optional[str],
+        file_path: str,
+        content_type: Optional[str],
+        size: int,
+        sha256: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Queue a document for processing; with `result` (e.g. cached for identical content) it is done at once"""
+        job = await asyncio.to_thread(self.store.add, {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "doc_type": doc_type,
+            "filename": filename,
+            "file_path": file_path,
+            "content_type": content_type,
+            "size": size,
+            "sha256": sha256,
+            "max_attempts": self.max_attempts,
+        }, result)
+        if result is not None:
+            self.stats["cached"] += 1
+        elif self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Current job state; with `wait`, long-poll up to that many seconds for it to finish"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] in FINISHED or wait <= 0:
+            return job
+        finished = self._finished.setdefault(job_id, asyncio.Event())
+        # Re-read after registering, in case the job finished in between
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job["status"] not in FINISHED:
+            try:
+                await asyncio.wait_for(finished.wait(), wait)
+            except asyncio.TimeoutError:
+                return await asyncio.to_thread(self.store.get, job_id)
+            job = await asyncio.to_thread(self.store.get, job_id)
+        self._finished.pop(job_id, None)
+        return job
+
+    async def requeue(self, job_id: str) -> bool:
+        requeued = await asyncio.to_thread(self.store.requeue, job_id)
+        if requeued and self._wakeup is not None:
+            self._wakeup.set()
+        return requeued
+
+    async def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.dead_letters, limit)
+
+    async def _worker(self, number: int):
+        while True:
+            # Cleared before claiming so an enqueue that races with an empty claim still wakes us
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.owner)
+            except Exception as e:
+                logger.error(f"Document job worker {number} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                # Idle: wait for an enqueue, or poll for retries that have come due
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            result = await self.handler(job)
+        except asyncio.CancelledError:
+            raise
+        except PoolBusyError:
+            # OCR is saturated: back off and try again later without counting an attempt
+            self.stats["deferred"] += 1
+            await asyncio.to_thread(self.store.defer, job, self.retry_base_delay)
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] < job["max_attempts"]:
+                retry_in = backoff_delay(job["attempts"] - 1, self.retry_base_delay, self.retry_max_delay)
+                self.stats["retried"] += 1
+                logger.warning(
+                    f"Document job {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}), "
+                    f"retrying in {retry_in:.1f}s: {error}"
+                )
+                await asyncio.to_thread(self.store.fail, job, error, retry_in)
+                return
+            self.stats["dead_lettered"] += 1
+            logger.error(f"Document job {job['id']} dead-lettered after {job['attempts']} attempts: {error}")
+            await asyncio.to_thread(self.store.fail, job, error, None)
+        else:
+            await asyncio.to_thread(self.store.complete, job["id"], result)
+            self.stats["processed"] += 1
+            logger.info(f"Document job {job['id']} processed in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        finished = self._finished.pop(job["id"], None)
+        if finished is not None:
+            finished.set()
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Queue depth by status plus worker counters"""
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "jobs": await asyncio.to_thread(self.store.counts),
+            **self.stats
+        }
@@ -0,0 +1,165 @@
+"""Image clean-up before OCR.
+
+Phone photos of salary slips and PAN cards are often 12 MP, rotated by EXIF
+only, unevenly lit and slightly skewed. Tesseract is slower and noisier on
+those, so images go through:
+
+1. EXIF orientation fix
+2. Downscale to `target_dpi` for the document's physical size (JPEGs are
+   reduced while decoding, which is much cheaper than decoding at full size)
+3. Grayscale, with uneven lighting divided out and auto-contrast
+4. Deskew by projection profile (up to +/- DESKEW_MAX_ANGLE degrees)
+5. Optional region-of-interest crop for fixed-layout cards (PAN)
+6. Otsu binarisation
+
+Run `python -m app.services.ocr_benchmark` to compare OCR time and field
+accuracy with and without these steps.
+"""
+import math
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest physical edge (inches) per document type, to turn a DPI into pixels
+DOCUMENT_LONG_EDGE_INCHES = {
+    "pan_card": 3.37,  # ID-1 card
+    "aadhaar": 3.37,
+}
+DEFAULT_LONG_EDGE_INCHES = 11.69  # A4: salary slips, bank statements
+
+# Region of interest as (left, top, right, bottom) fractions of an upright, tightly cropped card.
+# PAN card: name, father's name, date of birth and the PAN sit below the header band, left of the photo.
+DOCUMENT_ROI = {
+    "pan_card": (0.0, 0.18, 0.78, 1.0),
+}
+
+DESKEW_MAX_ANGLE = 5.0  # degrees
+DESKEW_STEP = 0.5
+DESKEW_SAMPLE_SIZE = 800  # skew is estimated on a copy no larger than this
+
+# Background (paper brightness) is estimated at 1/BACKGROUND_SCALE size with a max filter wider than a glyph
+BACKGROUND_SCALE = 16
+BACKGROUND_FILTER_SIZE = 5
+
+
+def target_size(size: Tuple[int, int], doc_type: Optional[str], target_dpi: int) -> Tuple[int, int]:
+    """Pixel size for `target_dpi`; never larger than `size`"""
+    long_edge = round(DOCUMENT_LONG_EDGE_INCHES.get(doc_type, DEFAULT_LONG_EDGE_INCHES) * target_dpi)
+    scale = min(1.0, long_edge / max(size))
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def otsu_threshold(gray: Image.Image) -> int:
+    """Grey level that best separates ink from paper (Otsu's method)"""
+    hist = np.asarray(gray.histogram()[:256], dtype=np.float64)
+    levels = np.arange(256)
+    total = hist.sum()
+    weight_background = np.cumsum(hist)
+    weight_foreground = total - weight_background
+    cumulative_mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between_class = (cumulative_mean[-1] * weight_background - total * cumulative_mean) ** 2 / (
+            weight_background * weight_foreground
+        )
+    if not np.isfinite(between_class).any():
+        return 127  # flat image
+    return int(np.nanargmax(np.where(np.isfinite(between_class), between_class, np.nan)))
+
+
+def binarise(gray: Image.Image) -> Image.Image:
+    threshold = otsu_threshold(gray)
+    return gray.point([0 if level <= threshold else 255 for level in range(256)])
+
+
+def flatten_illumination(gray: Image.Image) -> Image.Image:
+    """
+    Divide out uneven lighting (shadows, vignetting) so one global threshold works
+
+    The paper's brightness is estimated on a small copy with a max filter that
+    wipes out the text, then scaled back up and divided into the image.
+    """
+    small = gray.resize(
+        (max(1, gray.width // BACKGROUND_SCALE), max(1, gray.height // BACKGROUND_SCALE)),
+        Image.BILINEAR
+    )
+    background = small.filter(ImageFilter.MaxFilter(BACKGROUND_FILTER_SIZE)).resize(gray.size, Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float32)
+    paper = np.maximum(np.asarray(background, dtype=np.float32), 1.0)
+    return Image.fromarray(np.clip(pixels * 255.0 / paper, 0, 255).astype(np.uint8), mode="L")
+
+
+def estimate_skew(gray: Image.Image) -> float:
+    """
+    Rotation (degrees, counter-clockwise) that makes text lines horizontal
+
+    Text lines give sharp peaks in the row sums of ink pixels when they are
+    level, so the angle with the largest squared row-to-row differences wins.
+    """
+    sample = gray.copy()
+    sample.thumbnail((DESKEW_SAMPLE_SIZE, DESKEW_SAMPLE_SIZE))
+    threshold = otsu_threshold(sample)
+    ink = sample.point([255 if level <= threshold else 0 for level in range(256)])
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        rotated = ink.rotate(angle, resample=Image.NEAREST, expand=False, fillcolor=0)
+        rows = np.asarray(rotated, dtype=np.float64).sum(axis=1)
+        score = float(np.square(np.diff(rows)).sum())
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess_image(
+    img: Image.Image,
+    doc_type: Optional[str] = None,
+    target_dpi: int = 300,
+    deskew: bool = True,
+    crop_roi: bool = False
+) -> Image.Image:
+    """
+    Clean up a freshly opened image for Tesseract
+
+    Args:
+        img: Image as returned by Image.open (not yet loaded, so JPEG draft mode can apply)
+        doc_type: salary_slip, pan_card, ... - selects physical size and ROI
+        target_dpi: Resolution to downscale to
+        deskew: Straighten text lines
+        crop_roi: Crop to the document type's region of interest, if it has one
+
+    Returns:
+        Binarised grayscale ("L") image
+    """
+    if img.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale - no larger than needed for the target size
+        img.draft("L", target_size(img.size, doc_type, target_dpi))
+
+    gray = ImageOps.exif_transpose(img).convert("L")
+    size = target_size(gray.size, doc_type, target_dpi)
+    if size != gray.size:
+        # reducing_gap shrinks by an integer factor first, then resamples the rest with Lanczos
+        gray = gray.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+    gray = ImageOps.autocontrast(flatten_illumination(gray))
+
+    if deskew:
+        angle = estimate_skew(gray)
+        if angle:
+            gray = gray.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+    roi = DOCUMENT_ROI.get(doc_type) if crop_roi else None
+    if roi:
+        width, height = gray.size
+        left, top, right, bottom = roi
+        gray = gray.crop((
+            math.floor(left * width), math.floor(top * height),
+            math.ceil(right * width), math.ceil(bottom * height)
+        ))
+
+    return binarise(gray)
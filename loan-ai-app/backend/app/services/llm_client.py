@@ -0,0 +1,72 @@
+"""Process-wide Anthropic client shared by every agent.
+
+One AsyncAnthropic instance means one httpx connection pool: TLS sessions are
+reused across agents and `llm_max_connections` bounds total outbound
+concurrency to the API in one place.
+"""
+import os
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+
+try:
+    from anthropic import AsyncAnthropic
+except Exception:
+    AsyncAnthropic = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """Build the pooled httpx client used for all Anthropic calls"""
+    http2 = settings.llm_http2
+    if http2 and not _http2_available():
+        logger.warning("llm_http2 enabled but the 'h2' package is not installed — falling back to HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.llm_request_deadline, connect=10.0)
+    )
+
+
+@lru_cache()
+def get_anthropic_client() -> Optional["AsyncAnthropic"]:
+    """Return the shared AsyncAnthropic client, or None if unavailable (mock mode)"""
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if not api_key or AsyncAnthropic is None:
+        logger.warning("Anthropic client unavailable or ANTHROPIC_API_KEY not set — using mock LLM.")
+        return None
+
+    try:
+        return AsyncAnthropic(api_key=api_key, http_client=build_http_client())
+    except Exception as e:
+        logger.error(f"Failed to initialize Anthropic client: {e}")
+        return None
+
+
+async def close_anthropic_client():
+    """Close the shared client's connection pool (application shutdown)"""
+    if get_anthropic_client.cache_info().currsize == 0:
+        return
+    client = get_anthropic_client()
+    if client is not None:
+        await client.close()
+    get_anthropic_client.cache_clear()
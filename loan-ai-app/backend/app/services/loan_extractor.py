@@ -0,0 +1,277 @@
+"""Deterministic, rule-based extraction of loan application fields from chat messages.
+
+Covers the common form-filling answers (amounts in Indian formats, PAN numbers,
+employment type, loan purpose, names) so most INFO_GATHERING turns don't need an
+LLM call. Every extracted field carries a confidence; callers fall back to
+`ClaudeService.extract_structured_data` when it is low.
+"""
+import re
+import logging
+from typing import Dict, Any, List, Optional
+
+from app.services.ocr_service import PAN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Minimum confidence for a rule-based value to be used without asking the LLM
+CONFIDENCE_THRESHOLD = 0.75
+
+FIELDS = ["name", "loan_amount", "loan_purpose", "monthly_salary", "employment_type", "pan_number"]
+
+_UNIT_MULTIPLIERS = {
+    "k": 1_000, "thousand": 1_000,
+    "l": 100_000, "lac": 100_000, "lacs": 100_000, "lakh": 100_000, "lakhs": 100_000,
+    "cr": 10_000_000, "crore": 10_000_000, "crores": 10_000_000,
+    "lpa": 100_000,  # lakhs per annum
+}
+
+_AMOUNT_RE = re.compile(
+    r"(?:₹|\brs\.?|\binr)?\s*"
+    r"(\d+(?:,\d+)*(?:\.\d+)?)"
+    r"\s*(k|thousand|lpa|lakhs?|lacs?|l|crores?|cr)?\b",
+    re.I
+)
+_DURATION_AFTER_RE = re.compile(r"^\s*(?:months?|mos?|years?|yrs?|days?|%)", re.I)
+
+_SALARY_CONTEXT = re.compile(r"salary|income|earn|take[- ]home|per month|monthly|a month|/month|pm\b|ctc|lpa|per annum|annual", re.I)
+_ANNUAL_CONTEXT = re.compile(r"per annum|annual|yearly|a year|per year|lpa|ctc|p\.a\.", re.I)
+_LOAN_CONTEXT = re.compile(r"loan|need|borrow|require|want|looking for|amount|apply", re.I)
+
+_EMPLOYMENT_RULES = [
+    (re.compile(r"business owner|own (?:a |my )?business|run (?:a |my )?business|proprietor|entrepreneur", re.I), "Business Owner", 0.9),
+    (re.compile(r"self[- ]?employed|freelanc|consultant|own practice", re.I), "Self-Employed", 0.9),
+    (re.compile(r"\bsalaried\b", re.I), "Salaried", 0.95),
+    (re.compile(r"\b(?:employee|employed (?:at|with|by)|work(?:ing)? (?:at|for|in)|full[- ]time job|permanent job)\b", re.I), "Salaried", 0.75),
+]
+
+_PURPOSE_RULES = [
+    (re.compile(r"renovat|remodel|home repair|house repair|interior", re.I), "Home Renovation"),
+    (re.compile(r"medical|hospital|surgery|treatment|health", re.I), "Medical Expenses"),
+    (re.compile(r"education|college|tuition|studies|study|course|university|degree", re.I), "Education"),
+    (re.compile(r"wedding|marriage", re.I), "Wedding"),
+    (re.compile(r"travel|vacation|holiday|trip", re.I), "Travel"),
+    (re.compile(r"debt consolidation|consolidat|pay off|credit card (?:bill|debt)", re.I), "Debt Consolidation"),
+    (re.compile(r"business expansion|expand (?:my )?business|working capital|inventory|business", re.I), "Business Expansion"),
+    (re.compile(r"\bcar\b|vehicle|bike|scooter", re.I), "Vehicle Purchase"),
+]
+_PURPOSE_CUE = re.compile(r"\bfor\b|purpose|reason|to pay|to fund|to buy", re.I)
+
+# One name word: "Priya", "D'Souza", "A.K." - a full stop only ends an initial, never a sentence
+_NAME_WORD = r"[A-Za-z]+(?:['.][A-Za-z]+)*(?:(?<=\b[A-Za-z])\.)?"
+_NAME_RE = re.compile(
+    rf"(?:my name is|my name's|name\s*(?:is|:|-)|this is|call me|i am|i'm)\s+"
+    rf"({_NAME_WORD}(?:\s+{_NAME_WORD}){{0,3}})",
+    re.I
+)
+_NAME_STOPWORDS = {
+    "a", "an", "the", "and", "i", "my", "looking", "working", "interested", "planning",
+    "from", "in", "not", "here", "fine", "good", "ok", "okay", "salaried", "self",
+    "employed", "employee", "business", "owner", "applying", "trying", "currently",
+    "very", "also", "at", "with", "for", "to", "of", "need", "want", "earning",
+    "student", "married", "single", "sure", "yes", "no", "thanks", "thank", "hi", "hello",
+}
+
+
+def _name_case(words: List[str]) -> str:
+    """ "a.k. d'souza" -> "A.K. D'Souza": capitalise after the start, an apostrophe or a full stop"""
+    return " ".join(re.sub(r"(^|['.])([a-z])", lambda m: m.group(1) + m.group(2).upper(), word.lower()) for word in words)
+
+
+def parse_amount(value: str, unit: Optional[str] = None) -> Optional[float]:
+    """Parse an Indian-format amount ("1,00,000", "5.5", "50" + "k") into rupees"""
+    try:
+        amount = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    if unit:
+        amount *= _UNIT_MULTIPLIERS.get(unit.lower(), 1)
+    return amount
+
+
+def _find_amounts(text: str) -> List[Dict[str, Any]]:
+    """All money amounts in `text` with their position and whether a currency/unit marked them"""
+    amounts = []
+    for match in _AMOUNT_RE.finditer(text):
+        if _DURATION_AFTER_RE.match(text[match.end():]):
+            continue  # "36 months", "12.5%"
+        unit = match.group(2)
+        value = parse_amount(match.group(1), unit)
+        if value is None:
+            continue
+        marked = bool(unit) or bool(re.match(r"\s*(?:₹|rs|inr)", match.group(0), re.I))
+        if value < 1000 and not marked:
+            continue  # ages, counts, tenures
+        amounts.append({"value": value, "start": match.start(), "end": match.end(), "marked": marked})
+    return amounts
+
+
+class LoanInfoExtractor:
+    """Rule-based extractor with per-field hit/fallback counters."""
+
+    def __init__(self, confidence_threshold: float = CONFIDENCE_THRESHOLD):
+        self.confidence_threshold = confidence_threshold
+        self.stats = {
+            "turns": 0,
+            "rule_only_turns": 0,
+            "llm_fallback_turns": 0,
+            "fields": {field: {"rule_hits": 0, "llm_hits": 0} for field in FIELDS}
+        }
+
+    def extract(self, text: str, expected_field: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Extract fields from one user message
+
+        Args:
+            text: The user's message
+            expected_field: Field the assistant just asked for, used to interpret
+                bare answers such as "50000" or "John Doe"
+
+        Returns:
+            {field: {"value": ..., "confidence": float}}
+        """
+        fields: Dict[str, Dict[str, Any]] = {}
+        if not text or not text.strip():
+            return fields
+
+        pan_match = PAN_PATTERN.search(text.upper())
+        if pan_match:
+            fields["pan_number"] = {"value": pan_match.group(0), "confidence": 0.99}
+            # Keep the PAN's digits out of amount parsing
+            text = text[:pan_match.start()] + " " + text[pan_match.end():]
+
+        fields.update(self._extract_amounts(text, expected_field))
+
+        for pattern, label, confidence in _EMPLOYMENT_RULES:
+            if pattern.search(text):
+                fields["employment_type"] = {"value": label, "confidence": confidence}
+                break
+
+        purpose = self._extract_purpose(text, expected_field, fields)
+        if purpose:
+            fields["loan_purpose"] = purpose
+
+        name = self._extract_name(text, expected_field, fields)
+        if name:
+            fields["name"] = name
+
+        return fields
+
+    def _extract_amounts(self, text: str, expected_field: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        fields: Dict[str, Dict[str, Any]] = {}
+        amounts = _find_amounts(text)
+        unassigned = []
+
+        for amount in amounts:
+            # Context is the clause the amount sits in
+            before = re.split(r"[.;!?]|\band\b|\bbut\b", text[:amount["start"]])[-1]
+            after = re.split(r"[.;!?,]|\band\b|\bbut\b", text[amount["end"]:])[0]
+            context = f"{before} {text[amount['start']:amount['end']]} {after}"
+
+            if _SALARY_CONTEXT.search(context):
+                value = amount["value"]
+                confidence = 0.9
+                if _ANNUAL_CONTEXT.search(context):
+                    value = round(value / 12, 2)
+                    confidence = 0.8
+                fields.setdefault("monthly_salary", {"value": value, "confidence": confidence})
+            elif _LOAN_CONTEXT.search(context):
+                fields.setdefault("loan_amount", {"value": amount["value"], "confidence": 0.9})
+            else:
+                unassigned.append(amount)
+
+        # A bare number answers whatever was just asked
+        if len(unassigned) == 1 and expected_field in ("loan_amount", "monthly_salary") and expected_field not in fields:
+            fields[expected_field] = {"value": unassigned[0]["value"], "confidence": 0.85}
+        elif unassigned:
+            # Can't tell which field these belong to
+            for field in ("loan_amount", "monthly_salary"):
+                if field not in fields:
+                    fields[field] = {"value": unassigned[0]["value"], "confidence": 0.3}
+                    break
+        return fields
+
+    def _extract_purpose(self, text: str, expected_field: Optional[str], fields: Dict) -> Optional[Dict[str, Any]]:
+        for pattern, label in _PURPOSE_RULES:
+            match = pattern.search(text)
+            if not match:
+                continue
+            if label == "Business Expansion" and fields.get("employment_type", {}).get("value") == "Business Owner" \
+                    and not _PURPOSE_CUE.search(text[:match.start()]):
+                continue  # "I own a business" is employment, not purpose
+            cued = expected_field == "loan_purpose" or _PURPOSE_CUE.search(text[:match.start()])
+            return {"value": label, "confidence": 0.85 if cued else 0.6}
+
+        if expected_field == "loan_purpose":
+            # Free-text answer we have no label for
+            return {"value": text.strip()[:100], "confidence": 0.4}
+        return None
+
+    def _extract_name(self, text: str, expected_field: Optional[str], fields: Dict) -> Optional[Dict[str, Any]]:
+        for match in _NAME_RE.finditer(text):
+            words = []
+            for word in match.group(1).split():
+                if word.lower() in _NAME_STOPWORDS:
+                    break
+                words.append(word)
+            if not words:
+                continue
+            explicit = re.match(r"my name|name", match.group(0), re.I)
+            capitalised = all(word[0].isupper() for word in words)
+            if explicit:
+                confidence = 0.95
+            elif capitalised:
+                confidence = 0.8
+            else:
+                confidence = 0.5
+            return {"value": _name_case(words), "confidence": confidence}
+
+        # Bare answer to "what is your full name?"
+        words = text.strip().rstrip(".!").split()
+        if expected_field == "name" and not fields and 1 <= len(words) <= 4 \
+                and all(re.fullmatch(_NAME_WORD, word) for word in words) \
+                and not any(word.lower() in _NAME_STOPWORDS for word in words):
+            return {"value": _name_case(words), "confidence": 0.85}
+        return None
+
+    def is_confident(self, fields: Dict[str, Dict[str, Any]]) -> bool:
+        """True if the message yielded at least one field and none of them is uncertain"""
+        return bool(fields) and all(
+            field["confidence"] >= self.confidence_threshold for field in fields.values()
+        )
+
+    def confident_values(self, fields: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Plain {field: value} for fields above the confidence threshold"""
+        return {
+            name: field["value"]
+            for name, field in fields.items()
+            if field["confidence"] >= self.confidence_threshold
+        }
+
+    def record_turn(self, rule_fields: List[str], llm_fields: List[str], llm_called: bool = False):
+        """Count which fields each source supplied this turn"""
+        self.stats["turns"] += 1
+        if llm_called or llm_fields:
+            self.stats["llm_fallback_turns"] += 1
+        else:
+            self.stats["rule_only_turns"] += 1
+        for field in rule_fields:
+            if field in self.stats["fields"]:
+                self.stats["fields"][field]["rule_hits"] += 1
+        for field in llm_fields:
+            if field in self.stats["fields"]:
+                self.stats["fields"][field]["llm_hits"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Rule hit rates, overall and per field"""
+        turns = self.stats["turns"]
+        fields = {}
+        for name, counts in self.stats["fields"].items():
+            total = counts["rule_hits"] + counts["llm_hits"]
+            fields[name] = {**counts, "rule_hit_rate": round(counts["rule_hits"] / total, 3) if total else None}
+        return {
+            "turns": turns,
+            "rule_only_turns": self.stats["rule_only_turns"],
+            "llm_fallback_turns": self.stats["llm_fallback_turns"],
+            "rule_hit_rate": round(self.stats["rule_only_turns"] / turns, 3) if turns else None,
+            "fields": fields
+        }
@@ -13,7 +13,8 @@ def get_loan_products():
             "rate": 10.5,
             "max_amount": 500000,
             "min_amount": 10000,
-            "tenure": "12-60 months"
+            "tenure": "12-60 months",
+            "default_tenure": 36
         },
         {
             "id": "2",
@@ -22,7 +23,8 @@ def get_loan_products():
             "rate": 8.5,
             "max_amount": 10000000,
             "min_amount": 500000,
-            "tenure": "5-30 years"
+            "tenure": "5-30 years",
+            "default_tenure": 240
         },
         {
             "id": "3",
@@ -31,7 +33,8 @@ def get_loan_products():
             "rate": 12.0,
             "max_amount": 5000000,
             "min_amount": 100000,
-            "tenure": "12-84 months"
+            "tenure": "12-84 months",
+            "default_tenure": 36
         },
         {
             "id": "4",
@@ -40,7 +43,8 @@ def get_loan_products():
             "rate": 9.0,
             "max_amount": 2000000,
             "min_amount": 50000,
-            "tenure": "12-84 months"
+            "tenure": "12-84 months",
+            "default_tenure": 60
         }
     ]
 
@@ -84,13 +88,18 @@ class MockDataService:
     @staticmethod
     async def get_offer_eligibility(loan_amount: float, monthly_salary: float) -> Dict[str, Any]:
         """Simulate Offer Mart API for eligibility check"""
+        # Imported here: the policy engine reads the product catalogue from this module
+        from app.services.policy_engine import get_policy
+        
         await asyncio.sleep(0.4)
-        max_eligible = monthly_salary * 10
+        policy = get_policy()
+        terms = policy.terms_for(None)
+        max_eligible = policy.derive({**terms, "loan_amount": loan_amount, "monthly_salary": monthly_salary}).get("max_eligible", float("inf"))
         eligible = loan_amount <= max_eligible
         
         return {
             "eligible": eligible,
             "max_eligible_amount": max_eligible,
-            "recommended_tenure": 36 if eligible else 0,
-            "interest_rate": 12.5 if eligible else None
+            "recommended_tenure": terms["tenure_months"] if eligible else 0,
+            "interest_rate": terms["interest_rate"] if eligible else None
         }
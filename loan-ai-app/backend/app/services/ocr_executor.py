@@ -0,0 +1,89 @@
+"""OCR off the event loop.
+
+Tesseract takes hundreds of milliseconds to seconds per image, so images are
+OCR'd in a bounded process pool. When every worker is busy and the wait queue
+is full, `extract_text` raises `PoolBusyError`: `/api/ocr` answers 429 and
+document jobs are retried later. Per-image latency histograms are exposed in
+/health for capacity planning.
+"""
+import asyncio
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+from app.config import settings
+from app.services.process_pool import BoundedProcessPool
+from app.services.ocr_service import OCRTimeoutError, extract_text_from_file
+
+logger = logging.getLogger(__name__)
+
+# Extra seconds the pool waits beyond the tesseract timeout, so the worker normally kills tesseract itself
+TIMEOUT_GRACE = 5.0
+
+
+class OCRExecutor:
+    """Bounded process pool running Tesseract"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue: int = 16,
+        timeout: float = 30.0,
+        preprocess: bool = True,
+        target_dpi: int = 300,
+        crop_roi: bool = False
+    ):
+        self.timeout = timeout
+        self.preprocess = preprocess
+        self.target_dpi = target_dpi
+        self.crop_roi = crop_roi
+        self.pool = BoundedProcessPool(
+            "ocr",
+            workers=workers,
+            max_queue=max_queue,
+            timeout=timeout + TIMEOUT_GRACE
+        )
+
+    @property
+    def saturated(self) -> bool:
+        return self.pool.saturated
+
+    async def extract_text(self, path: Union[str, Path], doc_type: Optional[str] = None) -> str:
+        """
+        OCR the image stored at `path`; `doc_type` tunes preprocessing (size, ROI)
+
+        Raises:
+            PoolBusyError: the OCR queue is full
+            OCRTimeoutError: the image took longer than `timeout`
+        """
+        preprocess = None
+        if self.preprocess:
+            preprocess = {"doc_type": doc_type, "target_dpi": self.target_dpi, "crop_roi": self.crop_roi}
+        try:
+            return await self.pool.run(extract_text_from_file, str(path), self.timeout, preprocess)
+        except asyncio.TimeoutError:
+            raise OCRTimeoutError(f"OCR timed out after {self.timeout}s")
+
+    async def start(self):
+        await self.pool.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth and per-image latency histograms for monitoring"""
+        return self.pool.snapshot()
+
+    def close(self):
+        self.pool.close()
+
+
+@lru_cache()
+def get_ocr_executor() -> OCRExecutor:
+    """Process-wide OCR pool shared by /api/ocr and the document job workers"""
+    return OCRExecutor(
+        workers=settings.ocr_workers,
+        max_queue=settings.ocr_max_queue,
+        timeout=settings.ocr_timeout,
+        preprocess=settings.ocr_preprocess,
+        target_dpi=settings.ocr_target_dpi,
+        crop_roi=settings.ocr_roi_crop
+    )
@@ -1,7 +1,8 @@
 import io
 import re
 import logging
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Any, Optional, Union, BinaryIO
 
 try:
     from PIL import Image
@@ -10,24 +11,61 @@ try:
 except Exception:
     OCR_AVAILABLE = False
 
+try:
+    from app.services.image_preprocessing import preprocess_image
+    PREPROCESSING_AVAILABLE = True
+except Exception:
+    PREPROCESSING_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# PAN pattern (India): 5 letters, 4 digits, 1 letter
+PAN_PATTERN = re.compile(r"[A-Z]{5}[0-9]{4}[A-Z]")
 
-def extract_text_from_bytes(file_bytes: bytes) -> str:
-    """Extract raw text from image bytes using pytesseract. Returns empty string if not available."""
+
+class OCRTimeoutError(Exception):
+    """Tesseract ran longer than the allowed time and was killed"""
+
+
+def extract_text_from_file(
+    source: Union[str, Path, BinaryIO],
+    timeout: float = 0,
+    preprocess: Optional[Dict[str, Any]] = None
+) -> str:
+    """Extract raw text from an image file (path or open binary file). Returns empty string if not available.
+
+    With a `timeout` (seconds) the tesseract process is killed when it runs over
+    and OCRTimeoutError is raised. `preprocess` holds keyword arguments for
+    `preprocess_image` (doc_type, target_dpi, deskew, crop_roi); None sends the
+    image to Tesseract as decoded.
+    """
     if not OCR_AVAILABLE:
         logger.warning("Tesseract OCR or Pillow not installed; OCR not available")
         return ""
 
     try:
-        img = Image.open(io.BytesIO(file_bytes))
-        text = pytesseract.image_to_string(img)
+        # Pillow reads from the file itself, so the image is never copied into a bytes object first
+        with Image.open(source) as img:
+            if preprocess is not None and PREPROCESSING_AVAILABLE:
+                img = preprocess_image(img, **preprocess)
+            text = pytesseract.image_to_string(img, timeout=timeout)
         return text
+    except RuntimeError as e:
+        # pytesseract signals a killed process with a bare RuntimeError
+        if "timeout" in str(e).lower():
+            raise OCRTimeoutError(f"OCR timed out after {timeout}s") from e
+        logger.error("OCR extraction failed: %s", e, exc_info=True)
+        return ""
     except Exception as e:
         logger.error("OCR extraction failed: %s", e, exc_info=True)
         return ""
 
 
+def extract_text_from_bytes(file_bytes: bytes) -> str:
+    """Extract raw text from image bytes using pytesseract. Returns empty string if not available."""
+    return extract_text_from_file(io.BytesIO(file_bytes))
+
+
 def parse_key_fields(text: str) -> Dict[str, str]:
     """Attempt to parse a few common fields (name, PAN, amount, salary) from OCR text."""
     if not text:
@@ -35,8 +73,7 @@ def parse_key_fields(text: str) -> Dict[str, str]:
 
     fields: Dict[str, str] = {}
 
-    # PAN pattern (India): 5 letters, 4 digits, 1 letter
-    pan_match = re.search(r"[A-Z]{5}[0-9]{4}[A-Z]", text)
+    pan_match = PAN_PATTERN.search(text)
     if pan_match:
         fields["pan_number"] = pan_match.group(0)
 
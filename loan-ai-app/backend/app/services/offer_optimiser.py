@@ -0,0 +1,138 @@
+"""Best approvable counter-offer for an application rejected on affordability.
+
+Instead of only suggesting "reduce the amount" or "increase the tenure", the
+optimiser returns the largest amount the customer qualifies for and the
+shortest tenure that makes it affordable. The offer is for the product mapped
+to the loan purpose, searched over that product's whole tenure range, or on
+the policy's default rate over `optimiser.min_tenure`..`max_tenure` when no
+product is mapped. Accepting it sets the application's amount and accepted
+rate/tenure, and re-scoring approves it.
+
+For a product with monthly rate r and tenure n the EMI on principal P is
+    EMI = P * r * g / (g - 1),  g = (1 + r) ** n
+so with an EMI ceiling E (from the policy's `optimiser.max_emi`) both unknowns
+have closed forms:
+    P_max(n) = E * (g - 1) / (r * g)
+    n_min(P) = ln(E / (E - P * r)) / ln(1 + r)     (needs E > P * r)
+so the search costs O(1) instead of a loop over amounts and tenures. The
+candidate is re-checked with the full policy before it is offered.
+"""
+import math
+import logging
+from typing import Dict, Any, Optional
+
+from app.services.policy_engine import Policy, calculate_emi
+
+logger = logging.getLogger(__name__)
+
+# Candidates stepped down by `round_to` before giving up on a product
+MAX_VERIFY_STEPS = 3
+
+
+def max_principal(max_emi: float, annual_rate: float, tenure_months: int) -> float:
+    """Largest principal whose EMI does not exceed `max_emi`"""
+    r = annual_rate / 12 / 100
+    if r == 0:
+        return max_emi * tenure_months
+    growth = (1 + r) ** tenure_months
+    return max_emi * (growth - 1) / (r * growth)
+
+
+def min_tenure(principal: float, max_emi: float, annual_rate: float) -> float:
+    """Shortest (fractional) tenure in months whose EMI fits `max_emi`; inf if none does"""
+    r = annual_rate / 12 / 100
+    if r == 0:
+        return principal / max_emi if max_emi > 0 else math.inf
+    if max_emi <= principal * r:
+        return math.inf  # interest alone exceeds the ceiling
+    return math.log(max_emi / (max_emi - principal * r)) / math.log(1 + r)
+
+
+def describe_offer(offer: Dict[str, Any]) -> str:
+    """Customer-facing summary of an offer: amount, tenure, rate, EMI and product (if any)"""
+    text = (
+        f"₹{offer['amount']:,.0f} over {offer['tenure_months']} months at {offer['interest_rate']}% "
+        f"(EMI ₹{offer['monthly_emi']:,.0f})"
+    )
+    return f"{text} with our {offer['product']}" if offer.get("product") else text
+
+
+def optimise_offer(policy: Policy, values: Dict[str, Any], loan_purpose: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Find the best approvable offer for an application
+
+    Args:
+        policy: Active underwriting policy (must define `optimiser`)
+        values: Application inputs as passed to `Policy.evaluate`
+        loan_purpose: Selects the mapped product; without one the policy defaults are used
+
+    Returns:
+        {"product" (None for the default terms), "amount", "tenure_months",
+         "interest_rate", "monthly_emi", "requested_amount_fits"} or None if
+        nothing is approvable
+    """
+    search = policy.optimiser
+    if not search:
+        return None
+
+    namespace = policy.derive(values)
+    max_emi = policy.evaluate_expression(search["max_emi"], namespace)
+    amount_cap = policy.evaluate_expression(search["max_amount"], namespace)
+    requested = values.get("loan_amount") or 0
+    round_to = search["round_to"]
+    if max_emi <= 0 or amount_cap <= 0:
+        return None
+
+    terms = policy.terms_for(loan_purpose)
+    name = terms["product"]
+    if name:
+        product = policy.products[name]
+        low = product.get("min_tenure", search["min_tenure"])
+        high = product.get("max_tenure", search["max_tenure"])
+    else:
+        product = {"interest_rate": terms["interest_rate"]}
+        low, high = search["min_tenure"], search["max_tenure"]
+    rate = product["interest_rate"]
+
+    ceiling = min(amount_cap, product.get("max_amount", math.inf), requested or math.inf)
+    amount = min(ceiling, max_principal(max_emi, rate, high))
+    if amount < requested:
+        # Requested amount isn't affordable - round the best one down to a clean figure
+        amount = math.floor(amount / round_to) * round_to
+
+    candidate = _verify(policy, values, product, name, amount, max_emi, low, high, round_to)
+    if candidate is not None:
+        candidate["requested_amount_fits"] = candidate["amount"] >= requested
+    return candidate
+
+
+def _verify(
+    policy: Policy,
+    values: Dict[str, Any],
+    product: Dict[str, Any],
+    name: Optional[str],
+    amount: float,
+    max_emi: float,
+    low: int,
+    high: int,
+    round_to: float
+) -> Optional[Dict[str, Any]]:
+    """Shortest tenure for `amount`, confirmed against the full policy"""
+    rate = product["interest_rate"]
+    for _ in range(MAX_VERIFY_STEPS):
+        if amount <= 0 or amount < product.get("min_amount", 0):
+            return None
+        needed = min_tenure(amount, max_emi, rate)
+        tenure = high if math.isinf(needed) else min(high, max(low, math.ceil(needed - 1e-9)))
+        decision = policy.evaluate({**values, "loan_amount": amount, "interest_rate": rate, "tenure_months": tenure})
+        if decision["status"] == "APPROVED":
+            return {
+                "product": name,
+                "amount": amount,
+                "tenure_months": tenure,
+                "interest_rate": rate,
+                "monthly_emi": calculate_emi(amount, rate, tenure),
+            }
+        # Floating-point edge or another rule - try a slightly smaller amount
+        amount = (math.ceil(amount / round_to) - 1) * round_to
+    return None
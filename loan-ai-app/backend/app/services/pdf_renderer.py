@@ -0,0 +1,64 @@
+"""Sanction-letter rendering off the event loop.
+
+ReportLab canvas work is CPU-bound, so letters are rendered and written to disk
+in a small process pool instead of inside the async handler. Each worker lays
+out the static parts of the letter once when it starts (see
+`prepare_letter_layout`), so a render only draws the customer's fields.
+
+At most `workers` letters render at a time and at most `max_queue` wait for a
+worker; beyond that callers get `PoolBusyError` rather than piling up.
+"""
+import logging
+from functools import lru_cache
+from typing import Dict, Any
+
+from app.config import settings
+from app.services.process_pool import BoundedProcessPool
+from app.utils.helpers import prepare_letter_layout, write_sanction_letter
+
+logger = logging.getLogger(__name__)
+
+
+class SanctionLetterRenderer:
+    """Bounded process pool for sanction-letter PDFs"""
+
+    def __init__(self, workers: int = 2, max_queue: int = 32, timeout: float = 30.0):
+        self.pool = BoundedProcessPool(
+            "sanction letters",
+            workers=workers,
+            max_queue=max_queue,
+            timeout=timeout,
+            initializer=prepare_letter_layout
+        )
+
+    async def render(self, loan_details: Dict[str, Any], filepath: str) -> str:
+        """
+        Render a sanction letter to `filepath`
+
+        Raises:
+            PoolBusyError: `max_queue` letters are already waiting
+            asyncio.TimeoutError: the render took longer than `timeout`
+        """
+        size = await self.pool.run(write_sanction_letter, loan_details, filepath)
+        logger.info(f"Rendered {filepath} ({size} bytes)")
+        return filepath
+
+    async def start(self):
+        await self.pool.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth and render latency for monitoring"""
+        return self.pool.snapshot()
+
+    def close(self):
+        self.pool.close()
+
+
+@lru_cache()
+def get_pdf_renderer() -> SanctionLetterRenderer:
+    """Process-wide renderer shared by every SanctionAgent"""
+    return SanctionLetterRenderer(
+        workers=settings.pdf_render_workers,
+        max_queue=settings.pdf_render_max_queue,
+        timeout=settings.pdf_render_timeout
+    )
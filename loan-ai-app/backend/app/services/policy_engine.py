@@ -0,0 +1,429 @@
+"""Declarative underwriting policy, compiled once and hot-reloaded from disk.
+
+A policy file (JSON, or YAML if PyYAML is installed) holds:
+    defaults         interest_rate / tenure_months when no product applies
+    parameters       named thresholds
+    derived          named expressions, evaluated in order (must define monthly_emi)
+    rules            ordered reject rules: id, reject_when expression, reason and
+                     suggestion templates (str.format over all names)
+    products         rate / amount / tenure grid per product; defaults to the
+                     catalogue in get_loan_products(), so leave it out unless
+                     the policy prices differently from what sales quotes
+    purpose_products loan purpose -> product name (case-insensitive)
+    optimiser        optional counter-offer search: the rules it can fix, the
+                     max_emi / max_amount expressions and the tenure range
+
+Expressions are a small arithmetic/comparison language checked at load time and
+compiled to code objects twice: a scalar form for single applications
+(short-circuits on the first rule that fires) and a NumPy form that evaluates
+the same policy over whole columns for batch underwriting. Missing numeric
+inputs are treated as 0 in both, so the two forms always agree.
+"""
+import ast
+import json
+import time
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Mapping
+
+import numpy as np
+
+from app.config import settings
+from app.services.mock_data import get_loan_products
+
+logger = logging.getLogger(__name__)
+
+# Application values available to expressions
+INPUT_FIELDS = ("loan_amount", "monthly_salary", "existing_loans", "credit_score", "interest_rate", "tenure_months")
+
+# Inputs read from a stored application; pricing (interest_rate, tenure_months) comes from the policy,
+# or from an accepted counter-offer
+APPLICATION_FIELDS = ("loan_amount", "monthly_salary", "existing_loans", "credit_score")
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd, ast.Not,
+    ast.And, ast.Or, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+
+class PolicyError(ValueError):
+    """The policy file is malformed or uses an unsupported expression."""
+
+
+def calculate_emi(principal, annual_rate, tenure_months):
+    """Annuity EMI. Works element-wise on NumPy arrays, with the same arithmetic as on floats."""
+    monthly_interest = annual_rate / 12 / 100
+    growth = (1 + monthly_interest) ** tenure_months
+    return (principal * monthly_interest * growth) / (growth - 1)
+
+
+def _truthy(value):
+    """Vector form of Python truthiness for numbers"""
+    value = np.asarray(value)
+    return value if value.dtype == bool else value != 0
+
+
+_SCALAR_FUNCTIONS = {"emi": calculate_emi, "min": min, "max": max}
+_VECTOR_FUNCTIONS = {"emi": calculate_emi, "min": np.minimum, "max": np.maximum, "_truthy": _truthy}
+
+
+class _Vectorise(ast.NodeTransformer):
+    """Rewrite and/or/not into element-wise &, |, ~"""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [ast.Call(func=ast.Name(id="_truthy", ctx=ast.Load()), args=[v], keywords=[]) for v in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(
+                op=ast.Invert(),
+                operand=ast.Call(func=ast.Name(id="_truthy", ctx=ast.Load()), args=[node.operand], keywords=[])
+            )
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        # a < b < c  ->  (a < b) & (b < c)
+        operands = [node.left] + node.comparators
+        parts = [
+            ast.Compare(left=operands[i], ops=[op], comparators=[operands[i + 1]])
+            for i, op in enumerate(node.ops)
+        ]
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return result
+
+
+def _compile_expression(expression: str, known_names: set, label: str):
+    """Validate an expression and compile its scalar and vector forms"""
+    try:
+        tree = ast.parse(str(expression), mode="eval")
+    except SyntaxError as e:
+        raise PolicyError(f"{label}: invalid expression {expression!r}: {e.msg}") from e
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise PolicyError(f"{label}: '{type(node).__name__}' is not allowed in {expression!r}")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in _SCALAR_FUNCTIONS):
+            raise PolicyError(f"{label}: only {sorted(_SCALAR_FUNCTIONS)} may be called in {expression!r}")
+        if isinstance(node, ast.Name) and node.id not in known_names and node.id not in _SCALAR_FUNCTIONS:
+            raise PolicyError(f"{label}: unknown name '{node.id}' in {expression!r}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise PolicyError(f"{label}: only numeric constants are allowed in {expression!r}")
+
+    scalar = compile(tree, f"<policy {label}>", "eval")
+    vector_tree = ast.fix_missing_locations(_Vectorise().visit(ast.parse(str(expression), mode="eval")))
+    vector = compile(vector_tree, f"<policy {label} (vector)>", "eval")
+    return scalar, vector
+
+
+def _products_from_catalogue() -> Dict[str, Dict[str, Any]]:
+    """Product grid from get_loan_products() for policies that don't define one"""
+    products = {}
+    for product in get_loan_products():
+        low, high = product["tenure"].split()[0].split("-")
+        months = 12 if "year" in product["tenure"] else 1
+        products[product["name"]] = {
+            "interest_rate": product["rate"],
+            "min_amount": product["min_amount"],
+            "max_amount": product["max_amount"],
+            "min_tenure": int(low) * months,
+            "max_tenure": int(high) * months,
+            "default_tenure": product["default_tenure"],
+        }
+    return products
+
+
+def _purpose_key(loan_purpose: Optional[str]) -> str:
+    """Purposes match case- and whitespace-insensitively ("Vehicle Purchase" == "vehicle  purchase")"""
+    return " ".join((loan_purpose or "").lower().split())
+
+
+class CompiledRule:
+    """One reject rule with its compiled condition"""
+
+    def __init__(self, spec: Dict[str, Any], known_names: set, index: int):
+        self.id = spec.get("id") or f"rule_{index + 1}"
+        self.description = spec.get("description", "")
+        if "reject_when" not in spec:
+            raise PolicyError(f"rule '{self.id}': missing 'reject_when'")
+        self.expression = spec["reject_when"]
+        self.reason = spec.get("reason", f"Rule '{self.id}' not met")
+        self.suggestions = list(spec.get("suggestions", []))
+        self.status = spec.get("status", "REJECTED")
+        self.scalar, self.vector = _compile_expression(self.expression, known_names, f"rule '{self.id}'")
+
+
+class Policy:
+    """A compiled underwriting policy"""
+
+    def __init__(self, spec: Dict[str, Any], source: str = "<dict>"):
+        self.source = source
+        self.version = str(spec.get("version", "unversioned"))
+        self.defaults = {"interest_rate": 12.5, "tenure_months": 36, **spec.get("defaults", {})}
+        self.parameters: Dict[str, Any] = dict(spec.get("parameters", {}))
+        self.products: Dict[str, Dict[str, Any]] = spec.get("products") or _products_from_catalogue()
+        self.purpose_products: Dict[str, str] = {
+            _purpose_key(purpose): product for purpose, product in spec.get("purpose_products", {}).items()
+        }
+
+        for purpose, product in self.purpose_products.items():
+            if product not in self.products:
+                raise PolicyError(f"purpose '{purpose}' maps to unknown product '{product}'")
+
+        known = set(INPUT_FIELDS) | set(self.parameters)
+        self.derived: List[Tuple[str, Any, Any]] = []
+        for name, expression in spec.get("derived", {}).items():
+            scalar, vector = _compile_expression(expression, known, f"derived '{name}'")
+            self.derived.append((name, scalar, vector))
+            known.add(name)
+        if "monthly_emi" not in known:
+            raise PolicyError("policy must derive 'monthly_emi'")
+
+        self.rules = [CompiledRule(rule, known, i) for i, rule in enumerate(spec.get("rules", []))]
+        ids = [rule.id for rule in self.rules]
+        if len(ids) != len(set(ids)):
+            raise PolicyError("rule ids must be unique")
+
+        self.optimiser = self._compile_optimiser(spec.get("optimiser"), known, set(ids))
+
+    @staticmethod
+    def _compile_optimiser(spec: Optional[Dict[str, Any]], known: set, rule_ids: set) -> Optional[Dict[str, Any]]:
+        """Counter-offer search settings (see offer_optimiser); None disables it"""
+        if not spec:
+            return None
+        for key in ("max_emi", "max_amount"):
+            if key not in spec:
+                raise PolicyError(f"optimiser: missing '{key}'")
+        unknown = set(spec.get("rules", [])) - rule_ids
+        if unknown:
+            raise PolicyError(f"optimiser: unknown rules {sorted(unknown)}")
+        return {
+            "rules": set(spec.get("rules", [])),
+            "max_emi": _compile_expression(spec["max_emi"], known, "optimiser max_emi")[0],
+            "max_amount": _compile_expression(spec["max_amount"], known, "optimiser max_amount")[0],
+            "min_tenure": int(spec.get("min_tenure", 12)),
+            "max_tenure": int(spec.get("max_tenure", 84)),
+            "round_to": float(spec.get("round_to", 1000)),
+        }
+
+    def terms_for(self, loan_purpose: Optional[str] = None) -> Dict[str, Any]:
+        """Product, interest rate and tenure that apply to a loan purpose"""
+        product_name = self.purpose_products.get(_purpose_key(loan_purpose))
+        if product_name:
+            product = self.products[product_name]
+            return {
+                "product": product_name,
+                "interest_rate": product["interest_rate"],
+                "tenure_months": product.get("default_tenure", self.defaults["tenure_months"]),
+            }
+        return {"product": None, **self.defaults}
+
+    def values_for(self, application: Mapping[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Policy inputs for one application, and the product terms that price it
+
+        Both the live and the batch underwriting paths build their inputs here,
+        so they decide the same stored application the same way. A counter-offer
+        the customer accepted (`accepted_interest_rate`, `accepted_tenure_months`)
+        overrides the product's rate and tenure.
+
+        Args:
+            application: LoanApplication fields (a dict or a row mapping)
+        """
+        terms = self.terms_for(application.get("loan_purpose"))
+        values = {field: application.get(field) for field in APPLICATION_FIELDS}
+        values["interest_rate"] = application.get("accepted_interest_rate") or terms["interest_rate"]
+        values["tenure_months"] = application.get("accepted_tenure_months") or terms["tenure_months"]
+        return values, terms
+
+    @staticmethod
+    def inputs(values: Dict[str, Any]) -> Dict[str, Any]:
+        """Expression inputs; missing numbers count as 0"""
+        return {field: values.get(field) or 0 for field in INPUT_FIELDS}
+
+    def derive(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Inputs, parameters and derived values for one application"""
+        namespace = {**_SCALAR_FUNCTIONS, **self.parameters, **self.inputs(values)}
+        for name, scalar, _ in self.derived:
+            namespace[name] = eval(scalar, {"__builtins__": {}}, namespace)
+        for function in _SCALAR_FUNCTIONS:
+            namespace.pop(function)
+        return namespace
+
+    def evaluate_expression(self, code, namespace: Dict[str, Any]) -> Any:
+        """Evaluate a compiled scalar expression against a `derive` namespace"""
+        return eval(code, {"__builtins__": {}}, {**_SCALAR_FUNCTIONS, **namespace})
+
+    def evaluate(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide one application, stopping at the first rule that fires
+
+        Args:
+            values: Application inputs (see INPUT_FIELDS)
+
+        Returns:
+            Decision payload; `rules_fired` lists the rule that rejected, if any
+        """
+        namespace = self.derive(values)
+        scope = {**_SCALAR_FUNCTIONS, **namespace}
+        fired = None
+        for index, rule in enumerate(self.rules):
+            if eval(rule.scalar, {"__builtins__": {}}, scope):
+                fired = index
+                break
+        evaluated = len(self.rules) if fired is None else fired + 1
+        return self.decision_for(fired, values, namespace, evaluated)
+
+    def evaluate_vectorised(self, columns: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Evaluate the policy over whole columns
+
+        Args:
+            columns: INPUT_FIELDS -> float arrays (0 where missing); scalars broadcast
+
+        Returns:
+            (index of the first rule fired per row, -1 if none; derived value arrays)
+        """
+        namespace = {**_VECTOR_FUNCTIONS, **self.parameters}
+        namespace.update({field: np.asarray(columns.get(field, 0), dtype=np.float64) for field in INPUT_FIELDS})
+        for name, _, vector in self.derived:
+            namespace[name] = eval(vector, {"__builtins__": {}}, namespace)
+
+        size = max(np.size(namespace[field]) for field in INPUT_FIELDS)
+        masks = [np.broadcast_to(_truthy(eval(rule.vector, {"__builtins__": {}}, namespace)), (size,)) for rule in self.rules]
+        # np.select takes the first matching condition, same as the scalar short-circuit
+        fired = np.select(masks, list(range(len(self.rules))), default=-1) if masks else np.full(size, -1)
+        derived = {name: np.broadcast_to(namespace[name], (size,)) for name, _, _ in self.derived}
+        return fired, derived
+
+    def decision_for(
+        self,
+        fired: Optional[int],
+        values: Dict[str, Any],
+        namespace: Dict[str, Any],
+        evaluated: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Decision payload for the rule that fired (None or -1 = approved)"""
+        if fired is not None and fired >= 0:
+            rule = self.rules[fired]
+            return {
+                "status": rule.status,
+                "reason": rule.reason.format_map(namespace),
+                "suggestions": [suggestion.format_map(namespace) for suggestion in rule.suggestions],
+                "rules_fired": [rule.id],
+                "rules_evaluated": evaluated if evaluated is not None else fired + 1,
+                "policy_version": self.version
+            }
+
+        return {
+            "status": "APPROVED",
+            "reason": "All eligibility criteria met",
+            "approved_amount": values.get("loan_amount"),
+            "interest_rate": namespace["interest_rate"],
+            "tenure": namespace["tenure_months"],
+            "monthly_emi": namespace["monthly_emi"],
+            "credit_score": values.get("credit_score"),
+            "suggestions": [],
+            "rules_fired": [],
+            "rules_evaluated": len(self.rules),
+            "policy_version": self.version
+        }
+
+
+def load_policy(path: str) -> Policy:
+    """Read and compile a policy file"""
+    text = Path(path).read_text(encoding="utf-8")
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as e:
+            raise PolicyError("YAML policies need the 'PyYAML' package") from e
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+    if not isinstance(spec, dict):
+        raise PolicyError(f"{path}: policy must be a mapping")
+    return Policy(spec, source=path)
+
+
+class PolicyStore:
+    """Holds the active policy and recompiles it when the file changes.
+
+    The file's mtime is checked at most every `reload_interval` seconds. A
+    policy that fails to compile is logged and the previous one stays active.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._mtime = Path(path).stat().st_mtime
+        self._policy = load_policy(path)
+        self._checked = time.monotonic()
+        self.loaded_at = time.time()
+
+    def get(self) -> Policy:
+        now = time.monotonic()
+        if now - self._checked >= self.reload_interval:
+            self._checked = now
+            self._reload_if_changed()
+        return self._policy
+
+    def _reload_if_changed(self):
+        try:
+            mtime = Path(self.path).stat().st_mtime
+        except OSError as e:
+            logger.error(f"Underwriting policy {self.path} is unreadable, keeping version {self._policy.version}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            policy = load_policy(self.path)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            logger.error(f"Underwriting policy reload failed, keeping version {self._policy.version}: {e}")
+            return
+        self._policy = policy
+        self.reloads += 1
+        self.loaded_at = time.time()
+        logger.info(f"Underwriting policy reloaded: version {policy.version}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Active version and reload counters for monitoring"""
+        return {
+            "version": self._policy.version,
+            "source": self.path,
+            "rules": [rule.id for rule in self._policy.rules],
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error
+        }
+
+
+@lru_cache()
+def get_policy_store() -> PolicyStore:
+    """Process-wide policy store"""
+    return PolicyStore(settings.underwriting_policy_path, settings.underwriting_policy_reload_interval)
+
+
+def get_policy() -> Policy:
+    """The active underwriting policy"""
+    return get_policy_store().get()
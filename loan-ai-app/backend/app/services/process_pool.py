@@ -0,0 +1,211 @@
+"""Bounded process pool for CPU-bound work called from async handlers.
+
+Used for sanction-letter rendering and OCR. At most `workers` jobs run at once
+and at most `max_queue` wait for a worker; beyond that `run` raises
+`PoolBusyError` so callers can push back (HTTP 429, retry later) instead of
+piling up work. Every job has a timeout, and latencies are kept as a
+histogram plus recent percentiles for capacity planning.
+
+A worker cannot be interrupted, so a job that times out keeps its slot until
+the worker actually finishes it; the pool never runs more than `workers` jobs.
+"""
+import time
+import bisect
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Recent jobs kept for percentiles
+LATENCY_SAMPLES = 500
+
+
+class PoolBusyError(Exception):
+    """All workers are busy and the wait queue is full"""
+
+
+def _noop():
+    return None
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts (Prometheus style) plus percentiles over recent samples"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=LATENCY_SAMPLES)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self._recent.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Milliseconds, over the most recent samples"""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": buckets
+        }
+
+
+class BoundedProcessPool:
+    """Process pool with a bounded wait queue, per-job timeouts and latency metrics"""
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = 2,
+        max_queue: int = 32,
+        timeout: float = 30.0,
+        initializer: Optional[Callable[[], Any]] = None
+    ):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.initializer = initializer
+        # workers=0 runs jobs in a thread instead (no child processes, e.g. in tests)
+        self._slots = asyncio.Semaphore(max(workers, 1))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_queue_seen = 0
+        self.stats = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+        self.run_latency = LatencyHistogram()
+        self.total_latency = LatencyHistogram()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the parent runs an event loop and HTTP client threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+        return self._pool
+
+    async def start(self):
+        """Spawn the worker processes now, so start-up time never counts against a job's timeout"""
+        if not self.workers:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(self.workers)))
+        except BrokenProcessPool as e:
+            # Not fatal for the app: jobs will try a fresh pool
+            logger.error(f"{self.name} workers failed to start: {e}")
+            self._pool = None
+
+    @property
+    def saturated(self) -> bool:
+        """No free worker and no room left in the wait queue"""
+        return self._slots.locked() and self.waiting >= self.max_queue
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run `fn(*args)` in a worker; `fn` and its arguments must be picklable
+
+        Raises:
+            PoolBusyError: `max_queue` jobs are already waiting
+            asyncio.TimeoutError: the job ran longer than `timeout`
+        """
+        if self.saturated:
+            self.stats["rejected"] += 1
+            raise PoolBusyError(f"{self.name}: {self.waiting} jobs already queued")
+
+        started = time.perf_counter()
+        self.waiting += 1
+        self.max_queue_seen = max(self.max_queue_seen, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        running = time.perf_counter()
+        work = None
+        try:
+            if self.workers:
+                work = asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+            else:
+                work = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            # Shielded: a timeout (or a cancelled caller) stops the wait, not the worker
+            result = await asyncio.wait_for(asyncio.shield(work), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            logger.warning(f"{self.name} job timed out after {self.timeout}s; its worker slot stays busy until it ends")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed) - start a fresh pool on the next job
+            logger.error(f"{self.name} process pool broke; recreating it")
+            self._pool = None
+            self.stats["failed"] += 1
+            raise
+        except BaseException:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            if work is None or work.done():
+                self._release()
+            else:
+                work.add_done_callback(self._release)
+
+        finished = time.perf_counter()
+        self.stats["completed"] += 1
+        self.run_latency.observe(finished - running)
+        self.total_latency.observe(finished - started)
+        return result
+
+    def _release(self, work: Optional[asyncio.Future] = None):
+        """Free a job's worker slot; as a done callback, once an abandoned job has really finished"""
+        if work is not None and not work.cancelled():
+            work.exception()  # retrieve it, so nobody logs it as never retrieved
+        self.in_flight -= 1
+        self._slots.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth, counters and latency histograms for monitoring"""
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_queue_seen,
+            **self.stats,
+            "run_latency": self.run_latency.snapshot(),
+            "total_latency": self.total_latency.snapshot()
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,167 @@
+"""Admission control for outbound LLM calls: in-flight cap plus request/token rate limits"""
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower value is scheduled first
+PRIORITY_CHAT = 0  # customer-facing replies
+PRIORITY_EXTRACTION = 1  # structured data extraction, background work
+
+
+class AdmissionTimeoutError(Exception):
+    """No in-flight slot or rate budget became free within the caller's timeout"""
+
+
+class TokenBucket:
+    """Continuously refilling token bucket, `rate_per_minute` tokens per minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available and take them."""
+        amount = min(amount, self.capacity)
+        # The lock keeps waiters FIFO so large requests are not starved
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class PrioritySemaphore:
+    """Semaphore that wakes waiters by priority, then FIFO within a priority."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int):
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed to us just as we were cancelled - pass it on
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class AdmissionController:
+    """Caps concurrent LLM calls and enforces requests/tokens per minute.
+
+    Callers wait in priority order for an in-flight slot, then for request and
+    token budget, for at most their own timeout. Queue depth, wait times and
+    refusals are kept for monitoring.
+    """
+
+    def __init__(self, max_in_flight: int, requests_per_minute: int, tokens_per_minute: int):
+        self.max_in_flight = max_in_flight
+        self._slots = PrioritySemaphore(max_in_flight)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.admitted = 0
+        self.refused = 0
+        self._wait_totals: Dict[int, float] = {}
+        self._wait_counts: Dict[int, int] = {}
+        self.max_wait = 0.0
+
+    async def _acquire(self, priority: int, estimated_tokens: int):
+        await self._slots.acquire(priority)
+        try:
+            await self._requests.acquire(1)
+            if estimated_tokens:
+                await self._tokens.acquire(estimated_tokens)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_CHAT, estimated_tokens: int = 0, timeout: Optional[float] = None):
+        """Hold an admission slot for the duration of one upstream call
+
+        Raises:
+            AdmissionTimeoutError: not admitted within `timeout` seconds
+        """
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._acquire(priority, estimated_tokens), timeout)
+        except asyncio.TimeoutError:
+            self.refused += 1
+            raise AdmissionTimeoutError(f"Not admitted within {timeout:.1f}s") from None
+
+        waited = time.monotonic() - started
+        self._record_wait(priority, waited)
+        if waited > 1.0:
+            logger.info(f"LLM call (priority {priority}) waited {waited:.2f}s for admission")
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def _record_wait(self, priority: int, waited: float):
+        self.admitted += 1
+        self._wait_totals[priority] = self._wait_totals.get(priority, 0.0) + waited
+        self._wait_counts[priority] = self._wait_counts.get(priority, 0) + 1
+        self.max_wait = max(self.max_wait, waited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth and wait-time metrics for monitoring"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self._slots.waiting,
+            "admitted": self.admitted,
+            "refused": self.refused,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "avg_wait_seconds": {
+                priority: round(self._wait_totals[priority] / count, 3)
+                for priority, count in self._wait_counts.items()
+            },
+            "request_budget_available": int(self._requests.available),
+            "token_budget_available": int(self._tokens.available)
+        }
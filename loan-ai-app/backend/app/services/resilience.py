@@ -0,0 +1,104 @@
+"""Retry backoff and circuit breaker used in front of upstream APIs"""
+import time
+import random
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Classic three-state circuit breaker.
+
+    CLOSED lets every call through and counts consecutive failures. After
+    `failure_threshold` failures it trips to OPEN and rejects calls until
+    `recovery_timeout` seconds have passed, then goes HALF_OPEN and lets up to
+    `half_open_max_calls` probe calls through. A successful probe closes the
+    circuit again; a failed one re-opens it.
+
+    Every call let through must be settled with `record_success`,
+    `record_failure` or, if it ended without telling us anything about the
+    upstream (cancelled, deadline spent before sending), `release`.
+    Otherwise a half-open probe slot is never given back.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"Circuit '{self.name}' half-open, probing upstream")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go through now."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit '{self.name}' closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def release(self):
+        """Settle a call that never reached the upstream, freeing its probe slot"""
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self):
+        if self._state != self.OPEN:
+            self.times_opened += 1
+            logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for monitoring"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected_calls
+        }
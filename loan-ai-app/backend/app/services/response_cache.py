@@ -0,0 +1,149 @@
+"""Content-addressed cache for Claude responses.
+
+Keys are a sha256 over everything that determines the response (model, system
+prompt, messages, max_tokens). Entries live in an in-process LRU with a TTL and,
+optionally, in a SQLite file shared across restarts and workers on one host.
+"""
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, system_prompt: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Stable hash of a Claude request"""
+    payload = json.dumps(
+        {"model": model, "system": system_prompt, "messages": messages, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """LRU of (expires_at, value) bounded by entry count"""
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """On-disk tier; calls are blocking and run in a worker thread"""
+
+    def __init__(self, path: str, table: str = "llm_cache", clock: Callable[[], float] = time.time):
+        self.path = path
+        self.table = table
+        self.clock = clock
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT expires_at, value FROM {self.table} WHERE key = ? AND expires_at >= ?",
+                (key, self.clock())
+            ).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            # Opportunistic cleanup keeps the file from growing forever
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (self.clock(),))
+
+
+class ResponseCache:
+    """Two-tier (memory, optional SQLite) TTL cache with hit/miss counters"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, sqlite_path: str = ""):
+        self.ttl_seconds = ttl_seconds
+        self.memory = MemoryTier(max_entries)
+        self.disk: Optional[SQLiteTier] = None
+        if sqlite_path:
+            try:
+                self.disk = SQLiteTier(sqlite_path)
+            except Exception as e:
+                logger.error(f"Could not open LLM cache at {sqlite_path}, using memory only: {e}")
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                row = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                row = None
+            if row is not None:
+                expires_at, value = row
+                self.memory.set(key, value, expires_at)
+                self.stats["disk_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, value, expires_at)
+        self.stats["writes"] += 1
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, expires_at)
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+            "hit_rate": round(hits / lookups, 3) if lookups else None
+        }
@@ -0,0 +1,261 @@
+"""Conversation state shared between uvicorn workers (in-memory mode, USE_DATABASE=false).
+
+`MemoryConversationStore` is private to one process, so a second worker (or a
+second replica behind a load balancer) cannot continue a conversation the first
+one started. With `conversation_store_url` set, conversations are instead kept
+in a Redis-compatible server (Redis, Valkey, KeyDB, ...) as one hash per
+conversation:
+
+    loan-ai:conversation:{id} -> {"v": version, "d": encoded state}
+
+- Encoding is compact: pydantic-core JSON with unset optional fields left out,
+  or MessagePack when `codec="msgpack"`. A one-byte tag in front of each value
+  names the codec, so the setting can change without orphaning sessions.
+- Every save resets the key's TTL, so abandoned conversations expire on their own.
+- Concurrent turns are caught by optimistic locking. `get` remembers the
+  version it read, and `save` writes only if the stored version is unchanged
+  (a server-side compare-and-set). Otherwise it raises
+  `ConversationConflictError` and the API answers 409, so the client retries
+  on top of the other turn instead of silently overwriting it.
+
+`LocalSessionBackend` implements the same backend protocol in-process, for
+tests and single-worker development without a server.
+"""
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, Tuple, Callable, AsyncIterator
+
+from app.models import ConversationState
+from app.services.conversation_store import ConversationStore, ConversationConflictError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY_PREFIX = "loan-ai:conversation:"
+
+# Keys fetched per SCAN round trip
+SCAN_BATCH_SIZE = 500
+
+JSON_TAG = b"j"
+MSGPACK_TAG = b"m"
+
+# KEYS[1] = conversation key; ARGV = expected version, encoded state, ttl seconds.
+# Returns the new version, or -1 if the stored version is not the expected one (0 = must not exist).
+COMPARE_AND_SET = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if current ~= tonumber(ARGV[1]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'v', current + 1, 'd', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return current + 1
+"""
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("The msgpack session codec needs the 'msgpack' package")
+    return msgpack
+
+
+def encode_state(state: ConversationState, codec: str = "json") -> bytes:
+    if codec == "msgpack":
+        return MSGPACK_TAG + _msgpack().packb(state.model_dump(mode="json", exclude_none=True))
+    if codec == "json":
+        return JSON_TAG + state.model_dump_json(exclude_none=True).encode()
+    raise ValueError(f"Unknown session codec: {codec}")
+
+
+def decode_state(data: bytes) -> ConversationState:
+    tag, body = data[:1], data[1:]
+    if tag == MSGPACK_TAG:
+        return ConversationState.model_validate(_msgpack().unpackb(body))
+    if tag == JSON_TAG:
+        return ConversationState.model_validate_json(body)
+    raise ValueError(f"Unknown session encoding tag: {tag!r}")
+
+
+class SessionBackend(ABC):
+    """Versioned key-value operations `SharedConversationStore` needs from a server"""
+
+    name = "unknown"
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        """(version, value), or None if the key does not exist or has expired"""
+
+    @abstractmethod
+    async def put(self, key: str, value: bytes, ttl_seconds: int, expected_version: int) -> Optional[int]:
+        """Write if the stored version is `expected_version` (0 = absent) and return the new version; None on conflict"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def keys(self, prefix: str) -> AsyncIterator[str]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class LocalSessionBackend(SessionBackend):
+    """In-process stand-in for a Redis server, with the same versioning and expiry semantics
+
+    Operations never await, so each one is atomic on the event loop just as a
+    Lua script is atomic on the server.
+    """
+
+    name = "local"
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._data: Dict[str, Tuple[int, bytes, float]] = {}
+
+    def _live(self, key: str) -> Optional[Tuple[int, bytes, float]]:
+        item = self._data.get(key)
+        if item is not None and item[2] <= self.clock():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        item = self._live(key)
+        return (item[0], item[1]) if item is not None else None
+
+    async def put(self, key: str, value: bytes, ttl_seconds: int, expected_version: int) -> Optional[int]:
+        item = self._live(key)
+        current = item[0] if item is not None else 0
+        if current != expected_version:
+            return None
+        self._data[key] = (current + 1, value, self.clock() + ttl_seconds)
+        return current + 1
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def keys(self, prefix: str) -> AsyncIterator[str]:
+        for key in list(self._data):
+            if key.startswith(prefix) and self._live(key) is not None:
+                yield key
+
+
+class RedisSessionBackend(SessionBackend):
+    """Sessions in a Redis-compatible server through `redis.asyncio`"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+        self._compare_and_set = client.register_script(COMPARE_AND_SET)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisSessionBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("A shared conversation store needs the 'redis' package")
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        version, value = await self.client.hmget(key, "v", "d")
+        return (int(version), value) if value is not None else None
+
+    async def put(self, key: str, value: bytes, ttl_seconds: int, expected_version: int) -> Optional[int]:
+        version = await self._compare_and_set(keys=[key], args=[expected_version, value, ttl_seconds])
+        return int(version) if version != -1 else None
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def keys(self, prefix: str) -> AsyncIterator[str]:
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=SCAN_BATCH_SIZE):
+            yield key.decode() if isinstance(key, bytes) else key
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class SharedConversationStore(ConversationStore):
+    """Conversations in a `SessionBackend`, with a TTL and optimistic locking
+
+    `get` returns a fresh copy that remembers the version it was read at, and
+    `save` raises `ConversationConflictError` if another worker saved the
+    conversation in between. `scan` and `count` walk the key space, so keep
+    them to dashboards and health checks.
+    """
+
+    def __init__(
+        self,
+        backend: SessionBackend,
+        ttl_seconds: float = 86400.0,
+        codec: str = "json",
+        key_prefix: str = DEFAULT_KEY_PREFIX
+    ):
+        if codec == "msgpack":
+            _msgpack()  # fail at startup rather than on the first save
+        elif codec != "json":
+            raise ValueError(f"Unknown session codec: {codec}")
+        self.backend = backend
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.codec = codec
+        self.key_prefix = key_prefix
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "conflicts": 0, "bytes_written": 0}
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.key_prefix}{conversation_id}"
+
+    async def get(self, conversation_id: str) -> Optional[ConversationState]:
+        item = await self.backend.get(self._key(conversation_id))
+        if item is None:
+            self.stats["misses"] += 1
+            return None
+        version, data = item
+        state = decode_state(data)
+        state._store_version = version
+        self.stats["hits"] += 1
+        return state
+
+    async def save(self, state: ConversationState):
+        """
+        Write `state` if nobody else saved it since it was read
+
+        Raises:
+            ConversationConflictError: another turn saved the conversation first
+        """
+        data = encode_state(state, self.codec)
+        version = await self.backend.put(
+            self._key(state.conversation_id), data, self.ttl_seconds, state._store_version or 0
+        )
+        if version is None:
+            self.stats["conflicts"] += 1
+            raise ConversationConflictError(state.conversation_id)
+        state._store_version = version
+        self.stats["writes"] += 1
+        self.stats["bytes_written"] += len(data)
+
+    async def delete(self, conversation_id: str):
+        await self.backend.delete(self._key(conversation_id))
+
+    async def scan(self) -> AsyncIterator[ConversationState]:
+        async for key in self.backend.keys(self.key_prefix):
+            item = await self.backend.get(key)
+            # Keys can expire between the scan and the read
+            if item is None:
+                continue
+            try:
+                yield decode_state(item[1])
+            except Exception as e:
+                logger.error(f"Could not decode shared conversation {key}: {e}")
+
+    async def count(self) -> int:
+        return sum([1 async for _ in self.backend.keys(self.key_prefix)])
+
+    async def close(self):
+        await self.backend.close()
+
+    async def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name, "ttl_seconds": self.ttl_seconds, "codec": self.codec, **self.stats}
@@ -0,0 +1,158 @@
+"""Incremental slot filling for the loan application.
+
+Each turn only the newest user message is parsed, and the result is merged into
+the existing LoanApplication. Every slot keeps its provenance (source,
+confidence, the message it came from) in `ConversationState.user_data["slots"]`,
+so nothing collected earlier is lost when it falls out of the message window.
+Claude is asked only about slots that are still missing or uncertain, with just
+the last question and answer as context - prompt size stays constant no matter
+how long the conversation is.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from app.models import ConversationState, LoanApplication
+from app.services.claude_service import ClaudeService
+from app.services.loan_extractor import LoanInfoExtractor
+
+logger = logging.getLogger(__name__)
+
+SLOT_SCHEMA = {
+    "name": "Full name of the applicant",
+    "loan_amount": "Loan amount requested (number only)",
+    "loan_purpose": "Purpose of the loan",
+    "monthly_salary": "Monthly salary/income (number only)",
+    "employment_type": "Type of employment (salaried, self-employed, etc.)",
+    "pan_number": "PAN card number if mentioned"
+}
+
+NUMERIC_SLOTS = ("loan_amount", "monthly_salary")
+
+# Characters of the previous assistant question sent to Claude for context
+QUESTION_CONTEXT_CHARS = 500
+
+
+def _coerce_number(value: Any) -> Optional[float]:
+    """Convert an LLM-extracted number ("1,00,000", 50000) to float"""
+    try:
+        return float(str(value).replace(',', '').replace('_', '').strip())
+    except (ValueError, TypeError):
+        return None
+
+
+class SlotFiller:
+    """Merges per-turn extractions into the conversation's LoanApplication"""
+
+    def __init__(self, claude_service: ClaudeService, extractor: LoanInfoExtractor):
+        self.claude_service = claude_service
+        self.extractor = extractor
+
+    @staticmethod
+    def provenance(conversation_state: ConversationState) -> Dict[str, Dict[str, Any]]:
+        """Per-slot provenance stored on the conversation"""
+        return conversation_state.user_data.setdefault("slots", {})
+
+    async def fill(
+        self,
+        conversation_state: ConversationState,
+        user_message: str,
+        expected_slot: Optional[str] = None,
+        use_llm: bool = True
+    ) -> LoanApplication:
+        """
+        Extract slots from the newest user message and merge them into the application
+
+        Args:
+            conversation_state: Conversation whose loan_application is updated in place
+            user_message: The newest user message (the delta since the last turn)
+            expected_slot: Slot the assistant asked for last, to interpret bare answers
+            use_llm: Whether Claude may be asked about slots the rules could not fill
+
+        Returns:
+            The updated LoanApplication
+        """
+        application = conversation_state.loan_application or LoanApplication()
+        current = {k: v for k, v in application.dict().items() if v is not None}
+        message_index = conversation_state.message_offset + len(conversation_state.messages) - 1
+
+        fields = self.extractor.extract(user_message, expected_slot)
+        rule_values = self.extractor.confident_values(fields)
+        rule_slots = self._merge(conversation_state, current, rule_values, fields, "rule", message_index)
+
+        llm_slots: List[str] = []
+        llm_called = False
+        if use_llm and not self.extractor.is_confident(fields):
+            uncertain = [slot for slot in fields if slot not in rule_values]
+            wanted = [slot for slot in SLOT_SCHEMA if slot not in current or slot in uncertain]
+            if wanted:
+                llm_called = True
+                llm_values = await self._ask_llm(conversation_state, user_message, wanted)
+                llm_slots = self._merge(
+                    conversation_state, current, llm_values,
+                    {slot: {"confidence": None} for slot in llm_values}, "llm", message_index
+                )
+
+        self.extractor.record_turn(rule_slots, llm_slots, llm_called)
+        conversation_state.loan_application = LoanApplication(**{**application.dict(), **current})
+        return conversation_state.loan_application
+
+    def _merge(
+        self,
+        conversation_state: ConversationState,
+        current: Dict[str, Any],
+        values: Dict[str, Any],
+        fields: Dict[str, Dict[str, Any]],
+        source: str,
+        message_index: int
+    ) -> List[str]:
+        """Write values into `current` and record provenance; returns the slots that changed"""
+        provenance = self.provenance(conversation_state)
+        changed = []
+        for slot, value in values.items():
+            if current.get(slot) == value:
+                continue
+            # The newest confident answer wins, so users can correct earlier ones
+            current[slot] = value
+            provenance[slot] = {
+                "source": source,
+                "confidence": fields.get(slot, {}).get("confidence"),
+                "message_index": message_index,
+                "updated_at": datetime.now().isoformat()
+            }
+            changed.append(slot)
+        return changed
+
+    async def _ask_llm(
+        self,
+        conversation_state: ConversationState,
+        user_message: str,
+        slots: List[str]
+    ) -> Dict[str, Any]:
+        """Ask Claude for just `slots`, given the last question and the user's answer"""
+        question = next(
+            (msg.content for msg in reversed(conversation_state.messages[:-1]) if msg.role == "assistant"),
+            ""
+        )
+        text = f"assistant: {question[-QUESTION_CONTEXT_CHARS:]}\nuser: {user_message}" if question else f"user: {user_message}"
+
+        try:
+            extracted = await self.claude_service.extract_structured_data(
+                text,
+                {slot: SLOT_SCHEMA[slot] for slot in slots}
+            )
+        except ValueError as e:
+            logger.error(f"Could not extract loan info from message: {e}")
+            return {}
+
+        values = {}
+        for slot in slots:
+            value = extracted.get(slot)
+            if not value:
+                continue
+            if slot in NUMERIC_SLOTS:
+                value = _coerce_number(value)
+                if not value:
+                    continue
+            values[slot] = value
+        return values
@@ -0,0 +1,92 @@
+"""Streaming storage for uploaded files.
+
+Uploads are copied to disk in fixed-size chunks instead of being read into
+memory whole. Size and SHA-256 are computed as the chunks go by, and the copy
+stops as soon as the size limit is crossed. Later stages get the stored path
+(or the upload's own file handle) rather than a bytes copy.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class UploadTooLargeError(Exception):
+    """The upload is larger than the configured limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum upload size of {max_size:,} bytes")
+        self.max_size = max_size
+
+
+class StoredUpload:
+    """An upload written to disk: where it is, how big it is and its content hash"""
+
+    def __init__(self, path: Path, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+def check_declared_size(file: UploadFile, max_size: int):
+    """Reject early when the multipart parser already knows the upload is too big"""
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+
+async def save_upload(
+    file: UploadFile,
+    destination: Path,
+    max_size: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> StoredUpload:
+    """
+    Stream an upload to `destination` chunk by chunk
+
+    The file is written under a temporary name and renamed into place only
+    once it is complete and within `max_size`, so readers never see a partial
+    upload.
+
+    Raises:
+        UploadTooLargeError: more than `max_size` bytes were sent
+    """
+    check_declared_size(file, max_size)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(destination.name + ".part")
+
+    digest = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, partial, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.replace, partial, destination)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(_remove, partial)
+        raise
+
+    return StoredUpload(destination, size, digest.hexdigest())
+
+
+def _remove(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
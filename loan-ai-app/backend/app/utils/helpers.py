@@ -3,104 +3,197 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from datetime import datetime
+from functools import lru_cache
 from io import BytesIO
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+
+# Colors
+PRIMARY_COLOR = colors.HexColor('#2563eb')
+DARK_GRAY = colors.HexColor('#1e293b')
+
+# Registered in this order on every canvas so the internal font names (/F1, /F2)
+# in the pre-rendered text match the document they are replayed into
+LETTER_FONTS = ("Helvetica", "Helvetica-Bold")
+
+# Lines containing "{field}" are filled per customer; everything else is static
+CONTENT_LINES = [
+    "",
+    "We are pleased to inform you that your loan application has been APPROVED.",
+    "",
+    "LOAN DETAILS:",
+    "",
+    "Loan Amount: ₹{loan_amount:,.2f}",
+    "Interest Rate: {interest_rate}% per annum",
+    "Tenure: {tenure} months",
+    "Monthly EMI: ₹{monthly_emi:,.2f}",
+    "",
+    "TERMS AND CONDITIONS:",
+    "",
+    "1. This sanction is valid for 30 days from the date of this letter.",
+    "2. Final disbursement is subject to verification of all documents.",
+    "3. Interest rates are subject to change as per market conditions.",
+    "4. Please ensure timely EMI payments to maintain your credit score.",
+    "",
+    "NEXT STEPS:",
+    "",
+    "Our team will contact you within 2-3 business days to complete the",
+    "disbursement process. Please keep the following documents ready:",
+    "",
+    "- Original identity proof",
+    "- Address proof",
+    "- Bank account details",
+    "",
+    "Thank you for choosing our services. We look forward to serving you.",
+    "",
+    "",
+    "Sincerely,",
+    "",
+    "Loan Department",
+    "AI Loan Sales Platform"
+]
+
+
+class PrerenderedText:
+    """Text object code captured once and replayed with `Canvas.drawText`"""
+
+    def __init__(self, code: str):
+        self.code = code
+
+    def getCode(self) -> str:
+        return self.code
+
+
+class LetterPage:
+    """Static text of one page plus the positions of its per-customer fields"""
+
+    def __init__(self, static: PrerenderedText, fields: List[Tuple[float, float, str]], fill_color):
+        self.static = static
+        self.fields = fields  # (x, y, template)
+        self.fill_color = fill_color
+
+
+def _register_fonts(c: canvas.Canvas):
+    for font in LETTER_FONTS:
+        c.setFont(font, 12)
+
+
+@lru_cache(maxsize=1)
+def prepare_letter_layout() -> Tuple[LetterPage, ...]:
+    """
+    Lay out the sanction letter once per process
+
+    The layout never changes between customers, so pagination and all static
+    text (title, terms, next steps, footer) are drawn a single time on a
+    scratch canvas. Rendering a letter then only draws the header band and
+    the customer's fields.
+    """
+    width, height = A4
+    scratch = canvas.Canvas(BytesIO(), pagesize=A4)
+    _register_fonts(scratch)
+
+    def new_page(fill_color):
+        text = scratch.beginText()
+        text.setFont("Helvetica", 12)
+        text.setFillColor(fill_color)
+        return {"text": text, "fields": [], "fill_color": fill_color}
+
+    page = new_page(DARK_GRAY)
+    pages = [page]
+
+    title = page["text"]
+    title.setFillColor(colors.white)
+    title.setFont("Helvetica-Bold", 24)
+    title.setTextOrigin(1*inch, height - 50)
+    title.textOut("LOAN SANCTION LETTER")
+    title.setFont("Helvetica", 12)
+    title.setFillColor(DARK_GRAY)
+
+    page["fields"].append((1*inch, height - 1.3*inch, "Date: {date}"))
+    page["fields"].append((1*inch, height - 1.5*inch, "Reference: {reference}"))
+
+    y_position = height - 2.5*inch
+    page["fields"].append((1*inch, y_position, "Dear {name},"))
+    y_position -= 0.4*inch
+
+    for line in CONTENT_LINES:
+        if y_position < 1*inch:  # Start new page if needed
+            # A new page starts with the canvas defaults (black text)
+            page = new_page(colors.black)
+            pages.append(page)
+            y_position = height - 1*inch
+
+        if "{" in line:
+            page["fields"].append((1*inch, y_position, line))
+        elif line:
+            page["text"].setTextOrigin(1*inch, y_position)
+            page["text"].textOut(line)
+        y_position -= 0.3*inch
+
+    # Footer
+    footer = page["text"]
+    footer.setFont("Helvetica", 8)
+    footer.setFillColor(colors.grey)
+    footer.setTextOrigin(1*inch, 0.5*inch)
+    footer.textOut("This is a system-generated document. For queries, contact support.")
+
+    return tuple(
+        LetterPage(PrerenderedText(page["text"].getCode()), page["fields"], page["fill_color"])
+        for page in pages
+    )
+
 
 def generate_sanction_letter(loan_details: Dict[str, Any]) -> bytes:
     """
     Generate a professional PDF sanction letter
-    
+
     Args:
         loan_details: Dictionary containing loan information
-    
+
     Returns:
         PDF file as bytes
     """
+    layout = prepare_letter_layout()
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
+    _register_fonts(c)
     width, height = A4
-    
-    # Colors
-    primary_color = colors.HexColor('#2563eb')
-    dark_gray = colors.HexColor('#1e293b')
-    
-    # Header Section
-    c.setFillColor(primary_color)
+
+    now = datetime.now()
+    values = {
+        "date": now.strftime('%B %d, %Y'),
+        "reference": f"REF/{now.strftime('%Y%m%d')}/{(loan_details.get('name') or 'CUSTOMER')[:5].upper()}",
+        "name": loan_details.get('name', 'Valued Customer'),
+        "loan_amount": loan_details.get('loan_amount', 0),
+        "interest_rate": loan_details.get('interest_rate', 12.5),
+        "tenure": loan_details.get('tenure', 36),
+        "monthly_emi": loan_details.get('monthly_emi', 0),
+    }
+
+    # Header band
+    c.setFillColor(PRIMARY_COLOR)
     c.rect(0, height - 100, width, 100, fill=1)
-    
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 24)
-    c.drawString(1*inch, height - 50, "LOAN SANCTION LETTER")
-    
-    # Date
-    c.setFont("Helvetica", 12)
-    c.setFillColor(dark_gray)
-    c.drawString(1*inch, height - 1.3*inch, f"Date: {datetime.now().strftime('%B %d, %Y')}")
-    
-    # Reference Number
-    ref_number = f"REF/{datetime.now().strftime('%Y%m%d')}/{(loan_details.get('name') or 'CUSTOMER')[:5].upper()}"
-    c.drawString(1*inch, height - 1.5*inch, f"Reference: {ref_number}")
-    
-    # Content Section
-    y_position = height - 2.5*inch
-    c.setFont("Helvetica", 12)
-    c.setFillColor(dark_gray)
-    
-    # Greeting
-    name = loan_details.get('name', 'Valued Customer')
-    c.drawString(1*inch, y_position, f"Dear {name},")
-    y_position -= 0.4*inch
-    
-    # Main content
-    content_lines = [
-        "",
-        "We are pleased to inform you that your loan application has been APPROVED.",
-        "",
-        "LOAN DETAILS:",
-        "",
-        f"Loan Amount: ₹{loan_details.get('loan_amount', 0):,.2f}",
-        f"Interest Rate: {loan_details.get('interest_rate', 12.5)}% per annum",
-        f"Tenure: {loan_details.get('tenure', 36)} months",
-        f"Monthly EMI: ₹{loan_details.get('monthly_emi', 0):,.2f}",
-        "",
-        "TERMS AND CONDITIONS:",
-        "",
-        "1. This sanction is valid for 30 days from the date of this letter.",
-        "2. Final disbursement is subject to verification of all documents.",
-        "3. Interest rates are subject to change as per market conditions.",
-        "4. Please ensure timely EMI payments to maintain your credit score.",
-        "",
-        "NEXT STEPS:",
-        "",
-        "Our team will contact you within 2-3 business days to complete the",
-        "disbursement process. Please keep the following documents ready:",
-        "",
-        "- Original identity proof",
-        "- Address proof",
-        "- Bank account details",
-        "",
-        "Thank you for choosing our services. We look forward to serving you.",
-        "",
-        "",
-        "Sincerely,",
-        "",
-        "Loan Department",
-        "AI Loan Sales Platform"
-    ]
-    
-    for line in content_lines:
-        if y_position < 1*inch:  # Start new page if needed
+
+    for number, page in enumerate(layout):
+        if number:
             c.showPage()
-            y_position = height - 1*inch
-        
-        c.drawString(1*inch, y_position, line)
-        y_position -= 0.3*inch
-    
-    # Footer
-    c.setFont("Helvetica", 8)
-    c.setFillColor(colors.grey)
-    c.drawString(1*inch, 0.5*inch, "This is a system-generated document. For queries, contact support.")
-    
+        c.drawText(page.static)
+
+        text = c.beginText()
+        text.setFont("Helvetica", 12)
+        text.setFillColor(page.fill_color)
+        for x, y, template in page.fields:
+            text.setTextOrigin(x, y)
+            text.textOut(template.format(**values))
+        c.drawText(text)
+
     c.save()
     buffer.seek(0)
     return buffer.getvalue()
+
+
+def write_sanction_letter(loan_details: Dict[str, Any], filepath: str) -> int:
+    """Render a sanction letter straight to `filepath`; returns the file size in bytes"""
+    pdf_bytes = generate_sanction_letter(loan_details)
+    with open(filepath, "wb") as f:
+        f.write(pdf_bytes)
+    return len(pdf_bytes)
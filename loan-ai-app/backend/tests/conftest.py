@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Keep the queue, blob index and uploads of anything the tests construct out of the source tree.
+# Settings are read when app.config is first imported, so this has to run before any app import.
+_scratch = tempfile.mkdtemp(prefix="loan-ai-tests-")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_scratch, "uploads"))
+os.environ.setdefault("GENERATED_DOCS_DIR", os.path.join(_scratch, "generated_docs"))
+os.environ.setdefault("DOCUMENT_JOBS_PATH", os.path.join(_scratch, "document_jobs.sqlite3"))
+os.environ.setdefault("BLOB_INDEX_PATH", os.path.join(_scratch, "blobs.sqlite3"))
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import app.main as main
+from app.database.models import Base, Conversation, LoanApplication as DBLoanApplication
+from app.database.repository import IN_PROGRESS, decode_cursor, encode_cursor
+from app.models import ConversationState, LoanApplication
+from app.services.conversation_store import MemoryConversationStore
+
+START = datetime(2024, 1, 1, 9, 0)
+# id: (minutes after START, loan amount, decision); c3 and c4 were created at the same instant
+CONVERSATIONS = {
+    "c0": (0, None, None),
+    "c1": (1, 300000, None),
+    "c2": (2, 100000, "APPROVED"),
+    "c3": (3, 500000, None),
+    "c4": (3, 100000, None),
+    "c5": (4, 250000, "REJECTED"),
+    "c6": (5, 700000, None),
+}
+
+
+def test_cursor_round_trips_and_is_tied_to_its_sort():
+    created_at = START + timedelta(minutes=3)
+
+    assert decode_cursor(encode_cursor("created_at", (created_at, "c4")), "created_at") == (created_at, "c4")
+    assert decode_cursor(encode_cursor("amount", (100000, "c4")), "amount") == (100000.0, "c4")
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("amount", (100000, "c4")), "created_at")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", "created_at")
+
+
+async def seed_database(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'loans.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with sessions() as db:
+        for conversation_id, (minutes, amount, decision) in CONVERSATIONS.items():
+            db.add(Conversation(
+                id=conversation_id, stage="SALES", decision=decision, created_at=START + timedelta(minutes=minutes)
+            ))
+            if amount is not None:
+                db.add(DBLoanApplication(conversation_id=conversation_id, name="Applicant", loan_amount=amount))
+        await db.commit()
+    return engine, sessions
+
+
+async def seed_memory():
+    store = MemoryConversationStore()
+    for conversation_id, (minutes, amount, decision) in CONVERSATIONS.items():
+        await store.save(ConversationState(
+            conversation_id=conversation_id, stage="SALES", decision=decision,
+            created_at=START + timedelta(minutes=minutes), loan_application=LoanApplication(loan_amount=amount)
+        ))
+    return store
+
+
+async def walk(db, limit: int = 2, **query) -> list:
+    """Every page of the admin list, following X-Next-Cursor"""
+    query = {"status": None, "stage": None, "min_amount": None, "max_amount": None,
+             "sort": "created_at", "order": "desc", **query}
+    ids, cursor = [], None
+    while True:
+        response = Response()
+        page = await main.get_applications(response, db=db, limit=limit, cursor=cursor, **query)
+        assert len(page) <= limit
+        ids += [item["id"] for item in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+
+
+QUERIES = [
+    ({}, ["c6", "c5", "c4", "c3", "c2", "c1", "c0"]),
+    ({"order": "asc"}, ["c0", "c1", "c2", "c3", "c4", "c5", "c6"]),
+    ({"sort": "amount", "order": "asc"}, ["c2", "c4", "c5", "c1", "c3", "c6"]),
+    ({"sort": "amount", "min_amount": 200000}, ["c6", "c3", "c1", "c5"]),
+    ({"status": IN_PROGRESS}, ["c6", "c4", "c3", "c1", "c0"]),
+    ({"status": "APPROVED"}, ["c2"]),
+]
+
+
+@pytest.mark.parametrize("query, expected", QUERIES)
+def test_database_pages_cover_every_row_once_in_order(monkeypatch, tmp_path, query, expected):
+    async def run():
+        engine, sessions = await seed_database(tmp_path)
+        try:
+            async with sessions() as db:
+                return await walk(db, **query)
+        finally:
+            await engine.dispose()
+
+    monkeypatch.setattr(main, "USE_DATABASE", True)
+    assert asyncio.run(run()) == expected
+
+
+@pytest.mark.parametrize("query, expected", QUERIES)
+def test_in_memory_pages_match_the_database(monkeypatch, query, expected):
+    async def run():
+        monkeypatch.setattr(main.master_agent, "conversations", await seed_memory())
+        return await walk(None, **query)
+
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    assert asyncio.run(run()) == expected
+
+
+def test_cursor_from_another_sort_is_a_bad_request(monkeypatch):
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    monkeypatch.setattr(main.master_agent, "conversations", MemoryConversationStore())
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.get_applications(
+            Response(), db=None, limit=2, cursor=encode_cursor("amount", (100000, "c4")),
+            status=None, stage=None, min_amount=None, max_amount=None, sort="created_at", order="desc"
+        ))
+    assert e.value.status_code == 400
@@ -0,0 +1,147 @@
+import json
+import random
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import app.agents.underwriting_agent as underwriting_agent
+import app.services.batch_underwriting as batch_underwriting
+from app.agents.underwriting_agent import UnderwritingAgent
+from app.config import settings
+from app.database.models import Base, Conversation, LoanApplication
+from app.services.batch_underwriting import score_rows, rescore_applications
+from app.services.policy_engine import Policy, get_policy
+
+# Fields both paths must agree on
+COMPARED_FIELDS = ("status", "reason", "rules_fired", "approved_amount", "interest_rate", "tenure", "monthly_emi", "product")
+
+PURPOSES = [None, "business expansion", "medical", "wedding", "education", "car"]
+
+
+def random_applications(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    applications = []
+    for _ in range(count):
+        salary = rng.choice([8000, 15000, 25000, 40000, 60000, 90000, 150000]) * rng.uniform(0.8, 1.2)
+        applications.append({
+            "loan_amount": rng.choice([50000, 100000, 250000, 500000, 1000000, 2500000]) * rng.uniform(0.5, 1.5),
+            "monthly_salary": salary,
+            "existing_loans": rng.choice([None, 0, 5000, 20000, 50000, 200000]),
+            "credit_score": rng.choice([None, 580, 640, 650, 700, 780]),
+            "loan_purpose": rng.choice(PURPOSES),
+        })
+    return applications
+
+
+def purpose_mapped_policy() -> Policy:
+    """The shipped policy with purposes mapped to products, so pricing differs from the defaults"""
+    with open(settings.underwriting_policy_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["purpose_products"] = {"business expansion": "Business Loan", "medical": "Personal Loan", "car": "Auto Loan"}
+    return Policy(spec)
+
+
+def live_decision(agent: UnderwritingAgent, application):
+    # All lookups answered (or stored) - the batch path has no notion of unavailable sources
+    return agent._decide(dict(application), [])
+
+
+@pytest.mark.parametrize("policy_factory", [get_policy, purpose_mapped_policy], ids=["shipped", "purpose-mapped"])
+def test_batch_matches_live_decisions_on_10k_rows(monkeypatch, policy_factory):
+    policy = policy_factory()
+    monkeypatch.setattr(underwriting_agent, "get_policy", lambda: policy)
+    agent = UnderwritingAgent(claude_service=object(), bureau_service=object())
+    applications = random_applications(10000)
+
+    batch = score_rows(applications, policy)
+    mismatches = []
+    for application, batch_decision in zip(applications, batch):
+        live = live_decision(agent, application)
+        for field in COMPARED_FIELDS:
+            if live.get(field) != batch_decision.get(field):
+                mismatches.append((application, field, live.get(field), batch_decision.get(field)))
+
+    assert {decision["status"] for decision in batch} == {"APPROVED", "REJECTED"}
+    assert mismatches == []
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rescore.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def test_rescore_only_touches_decided_conversations(session_factory):
+    # Affordable in every respect, so a re-score approves whatever it touches
+    affordable = {"loan_amount": 100000, "monthly_salary": 80000, "existing_loans": 0, "credit_score": 760}
+    # (conversation decision, stage, application status); the live path leaves the status PENDING
+    cases = {
+        "in-progress": (None, "INFO_GATHERING", "PENDING"),
+        "manual-review": ("MANUAL_REVIEW", "COMPLETED", "MANUAL_REVIEW"),
+        "rejected": ("REJECTED", "COMPLETED", "REJECTED"),
+        "approved": ("APPROVED", "SANCTION", "PENDING"),
+    }
+
+    async def scenario():
+        async with session_factory() as db:
+            for conversation_id, (decision, stage, status) in cases.items():
+                db.add(Conversation(
+                    id=conversation_id, stage=stage, decision=decision,
+                    loan_application=LoanApplication(status=status, **affordable)
+                ))
+            await db.commit()
+
+        async with session_factory() as db:
+            summary = await rescore_applications(db, chunk_size=2)
+
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(Conversation.id, Conversation.decision, LoanApplication.status, LoanApplication.approved_amount)
+                .join(LoanApplication)
+            )).all()
+        return summary, {row.id: (row.decision, row.status, row.approved_amount) for row in rows}
+
+    summary, rows = asyncio.run(scenario())
+    assert summary["processed"] == 2
+    assert summary["decisions"] == {"APPROVED": 2}
+    # Only the rejected conversation's decision changed, whatever the stale application status said
+    assert summary["changed"] == 1
+    assert rows["rejected"] == ("APPROVED", "APPROVED", 100000)
+    assert rows["approved"] == ("APPROVED", "APPROVED", 100000)
+    assert rows["in-progress"] == (None, "PENDING", None)
+    assert rows["manual-review"] == ("MANUAL_REVIEW", "MANUAL_REVIEW", None)
+
+
+def test_rescore_counts_decisions_by_status(session_factory, monkeypatch):
+    with open(settings.underwriting_policy_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    # Large loans go to a person instead of being rejected
+    spec["rules"].insert(0, {
+        "id": "large_loan", "reject_when": "loan_amount > 1000000", "status": "MANUAL_REVIEW", "reason": "Large loan"
+    })
+    monkeypatch.setattr(batch_underwriting, "get_policy", lambda: Policy(spec))
+    affordable = {"monthly_salary": 500000, "existing_loans": 0, "credit_score": 760}
+
+    async def scenario():
+        async with session_factory() as db:
+            for conversation_id, loan_amount in [("small", 100000), ("large", 2000000)]:
+                db.add(Conversation(
+                    id=conversation_id, stage="COMPLETED", decision="REJECTED",
+                    loan_application=LoanApplication(loan_amount=loan_amount, **affordable)
+                ))
+            await db.commit()
+        async with session_factory() as db:
+            return await rescore_applications(db)
+
+    summary = asyncio.run(scenario())
+    assert summary["decisions"] == {"APPROVED": 1, "MANUAL_REVIEW": 1}
+    assert summary["changed"] == 2
@@ -0,0 +1,99 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+
+from fastapi import UploadFile
+
+from app.services.blob_store import INCOMING_DIR, BlobStore
+
+MB = 1024 * 1024
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_store(tmp_path) -> tuple:
+    clock = Clock()
+    return BlobStore(tmp_path / "blobs", str(tmp_path / "blobs.sqlite3"), clock=clock), clock
+
+
+def put(store: BlobStore, owner: str, data: bytes):
+    return asyncio.run(store.put(UploadFile(io.BytesIO(data), filename="slip.pdf"), owner, MB))
+
+
+def refcount(store: BlobStore, data: bytes) -> int:
+    with store._connect() as conn:
+        row = conn.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (hashlib.sha256(data).hexdigest(),)).fetchone()
+    return row[0] if row else None
+
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    store, _ = make_store(tmp_path)
+
+    first = put(store, "c1:salary_slip", b"slip")
+    second = put(store, "c2:salary_slip", b"slip")
+    again = put(store, "c2:salary_slip", b"slip")  # same slot, same content: no new reference
+
+    assert (first.duplicate, second.duplicate, again.duplicate) == (False, True, True)
+    assert first.path == second.path and first.path.read_bytes() == b"slip"
+    assert refcount(store, b"slip") == 2
+    assert store.counts() == {"blobs": 1, "bytes": 4, "unreferenced": 0, "references": 2}
+    assert not any((tmp_path / "blobs" / INCOMING_DIR).iterdir())
+
+
+def test_replaced_blob_is_collected_only_after_the_grace_period(tmp_path):
+    store, clock = make_store(tmp_path)
+    old = put(store, "c1:salary_slip", b"old slip")
+    asyncio.run(store.store_result(old.sha256, "salary_slip", {"fields": {"salary": 50000}}))
+    new = put(store, "c1:salary_slip", b"new slip")
+
+    assert (refcount(store, b"old slip"), refcount(store, b"new slip")) == (0, 1)
+
+    # A queued job may still read the old blob
+    report = asyncio.run(store.collect_garbage(grace=60))
+    assert report["blobs"] == 0 and old.path.is_file()
+
+    clock.now += 61
+    dry_run = asyncio.run(store.collect_garbage(grace=60, dry_run=True))
+    assert dry_run["blobs"] == 1 and old.path.is_file()
+
+    report = asyncio.run(store.collect_garbage(grace=60))
+    assert (report["blobs"], report["bytes"]) == (1, len(b"old slip"))
+    assert not old.path.exists() and new.path.is_file()
+    assert refcount(store, b"old slip") is None
+    assert asyncio.run(store.cached_result(old.sha256, "salary_slip")) is None
+
+
+def test_results_are_cached_per_blob_and_document_type(tmp_path):
+    store, _ = make_store(tmp_path)
+    blob = put(store, "c1:pan_card", b"pan")
+
+    asyncio.run(store.store_result(blob.sha256, "pan_card", {"fields": {"pan": "ABCDE1234F"}}))
+    asyncio.run(store.store_result("0" * 64, "pan_card", {"fields": {}}))  # no such blob: not cached
+
+    assert asyncio.run(store.cached_result(blob.sha256, "pan_card")) == {"fields": {"pan": "ABCDE1234F"}}
+    assert asyncio.run(store.cached_result(blob.sha256, "salary_slip")) is None
+    assert asyncio.run(store.cached_result("0" * 64, "pan_card")) is None
+
+
+def test_stray_files_older_than_the_grace_period_are_removed(tmp_path):
+    store, _ = make_store(tmp_path)
+    put(store, "c1:pan_card", b"pan")
+    incoming = tmp_path / "blobs" / INCOMING_DIR
+    crashed, uploading = incoming / "crashed.part", incoming / "uploading.part"
+    crashed.write_bytes(b"half")
+    uploading.write_bytes(b"half")
+    os.utime(crashed, (time.time() - 3600, time.time() - 3600))
+
+    report = asyncio.run(store.collect_garbage(grace=60))
+
+    assert report["stray_files"] == 1
+    assert not crashed.exists() and uploading.exists()
+    assert store.counts()["blobs"] == 1
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.services.bureau_cache import CachedBureauService, _pan_key
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingSource:
+    """Bureau/CRM stand-in that counts upstream pulls; `gate` holds lookups until released"""
+
+    def __init__(self):
+        self.pulls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def get_credit_score(self, pan_number: str) -> int:
+        self.pulls += 1
+        await self.gate.wait()
+        return 700 + self.pulls
+
+    async def check_existing_loans(self, pan_number: str):
+        self.pulls += 1
+        return {"has_existing_loans": False, "total_emi": 0}
+
+    async def get_offer_eligibility(self, loan_amount: float, monthly_salary: float):
+        return {"eligible": True}
+
+
+def test_concurrent_lookups_for_one_pan_share_a_single_pull():
+    source = CountingSource()
+    service = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path="", clock=FakeClock())
+
+    async def scenario():
+        source.gate.clear()
+        lookups = [asyncio.create_task(service.get_credit_score("ABCDE1234F")) for _ in range(5)]
+        await asyncio.sleep(0)
+        source.gate.set()
+        return await asyncio.gather(*lookups)
+
+    assert asyncio.run(scenario()) == [701] * 5
+    assert source.pulls == 1
+    assert service.stats["misses"] == 1
+    assert service.stats["coalesced"] == 4
+
+
+def test_pan_is_normalised_and_kinds_are_cached_separately():
+    source = CountingSource()
+    service = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path="", clock=FakeClock())
+
+    async def scenario():
+        await service.get_credit_score("abcde1234f")
+        await service.get_credit_score(" ABCDE1234F ")
+        await service.check_existing_loans("ABCDE1234F")
+
+    asyncio.run(scenario())
+    assert source.pulls == 2
+    assert service.stats["memory_hits"] == 1
+
+
+def test_failed_pull_is_shared_and_not_cached():
+    class FailingSource(CountingSource):
+        async def get_credit_score(self, pan_number: str) -> int:
+            self.pulls += 1
+            await self.gate.wait()
+            raise ConnectionError("bureau down")
+
+    source = FailingSource()
+    service = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path="", clock=FakeClock())
+
+    async def scenario():
+        source.gate.clear()
+        lookups = [asyncio.create_task(service.get_credit_score("ABCDE1234F")) for _ in range(3)]
+        await asyncio.sleep(0)
+        source.gate.set()
+        return await asyncio.gather(*lookups, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert source.pulls == 1
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.get_credit_score("ABCDE1234F"))
+    assert source.pulls == 2
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    source = CountingSource()
+    service = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path="", clock=clock)
+
+    assert asyncio.run(service.get_credit_score("ABCDE1234F")) == 701
+    clock.now += 59
+    assert asyncio.run(service.get_credit_score("ABCDE1234F")) == 701
+    assert source.pulls == 1
+
+    clock.now += 2
+    assert asyncio.run(service.get_credit_score("ABCDE1234F")) == 702
+    assert source.pulls == 2
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "bureau.sqlite3")
+    first = CachedBureauService(CountingSource(), ttl_seconds=60, max_entries=10, shared_path=path, clock=clock)
+    assert asyncio.run(first.get_credit_score("ABCDE1234F")) == 701
+
+    # A new process: empty memory tier, same file
+    source = CountingSource()
+    restarted = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path=path, clock=clock)
+    assert asyncio.run(restarted.get_credit_score("ABCDE1234F")) == 701
+    assert source.pulls == 0
+    assert restarted.stats["shared_hits"] == 1
+
+    # Shared entries keep their original expiry
+    clock.now += 61
+    again = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path=path, clock=clock)
+    assert asyncio.run(again.get_credit_score("ABCDE1234F")) == 701
+    assert source.pulls == 1
+
+
+def test_timed_out_leader_does_not_cancel_coalesced_lookups():
+    source = CountingSource()
+    service = CachedBureauService(source, ttl_seconds=60, max_entries=10, shared_path="", clock=FakeClock())
+
+    async def scenario():
+        source.gate.clear()
+        leader = asyncio.create_task(asyncio.wait_for(service.get_credit_score("ABCDE1234F"), 0.01))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service.get_credit_score("ABCDE1234F"))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        source.gate.set()
+        return await follower
+
+    assert asyncio.run(scenario()) == 701
+    assert source.pulls == 1
+    # The abandoned pull still filled the cache
+    assert asyncio.run(service.get_credit_score("ABCDE1234F")) == 701
+    assert source.pulls == 1
+
+
+def test_cache_keys_are_keyed_by_the_secret():
+    key = _pan_key("credit_score", "ABCDE1234F", b"secret")
+    assert key.startswith("credit_score:")
+    assert key != f"credit_score:{hashlib.sha256(b'ABCDE1234F').hexdigest()}"
+    assert key != _pan_key("credit_score", "ABCDE1234F", b"other-secret")
@@ -0,0 +1,114 @@
+import json
+import asyncio
+
+import app.main as main
+from app.agents.master_agent import UNAVAILABLE_RESPONSE
+from app.models import ConversationState, MessageRequest
+from app.services.claude_service import LLMUnavailableError
+from app.services.conversation_store import MemoryConversationStore
+
+
+def parse_frames(body: str) -> list:
+    """(event, data) for each Server-Sent Events frame; every frame ends with a blank line"""
+    assert body.endswith("\n\n")
+    frames = []
+    for frame in body[:-2].split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        frames.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return frames
+
+
+def stream(monkeypatch, process_message_stream, message: str = "Hi") -> list:
+    async def run():
+        response = await main.chat_stream(MessageRequest(message=message), db=None, current_user=None)
+        assert response.media_type == "text/event-stream"
+        body = "".join([chunk async for chunk in response.body_iterator])
+        return parse_frames(body)
+
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    monkeypatch.setattr(main.master_agent, "conversations", MemoryConversationStore())
+    monkeypatch.setattr(main.master_agent, "process_message_stream", process_message_stream)
+    return asyncio.run(run())
+
+
+def test_tokens_are_followed_by_one_done_event_after_the_turn_is_saved(monkeypatch):
+    saved = []
+
+    async def process_message_stream(state, user_message):
+        # Newlines in a token must not break the frame
+        for text in ["Hello", " there.\n\nHow much", " do you need?"]:
+            yield {"type": "token", "text": text}
+        state.stage = "SALES"
+        yield {"type": "done", "response": "Hello there.\n\nHow much do you need?", "next_stage": "SALES"}
+
+    original_save = main.master_agent.save_conversation_state
+
+    async def save_conversation_state(state):
+        saved.append(state.conversation_id)
+        await original_save(state)
+
+    monkeypatch.setattr(main.master_agent, "save_conversation_state", save_conversation_state)
+    frames = stream(monkeypatch, process_message_stream)
+
+    events = [event for event, _ in frames]
+    assert events == ["token", "token", "token", "done"]
+    assert "".join(data["text"] for _, data in frames[:-1]) == "Hello there.\n\nHow much do you need?"
+
+    done = frames[-1][1]
+    assert done["message"] == "Hello there.\n\nHow much do you need?"
+    assert done["stage"] == "SALES"
+    assert done["metadata"]["stage"] == "SALES"
+    assert saved == [done["conversation_id"]]
+
+
+def test_failure_mid_stream_ends_with_an_error_event_and_no_done(monkeypatch):
+    async def process_message_stream(state, user_message):
+        yield {"type": "token", "text": "Hello"}
+        raise RuntimeError("connection dropped")
+
+    frames = stream(monkeypatch, process_message_stream)
+
+    assert [event for event, _ in frames] == ["token", "error"]
+    assert frames[-1][1]["success"] is False
+    assert frames[-1][1]["error"] == "connection dropped"
+
+
+def agent_stream(monkeypatch, run_stage) -> tuple:
+    async def run():
+        state = ConversationState(conversation_id="c1", stage="SALES", messages=[])
+        events = [event async for event in main.master_agent.process_message_stream(state, "I need a loan")]
+        return state, events
+
+    monkeypatch.setattr(main.master_agent, "_run_stage", run_stage)
+    return asyncio.run(run())
+
+
+def test_agent_stream_ends_with_the_whole_reply(monkeypatch):
+    async def chunks():
+        for text in ["Sure,", " how much?"]:
+            yield text
+
+    async def run_stage(state, user_message, stream=False):
+        assert stream
+        return chunks(), "SALES", None
+
+    state, events = agent_stream(monkeypatch, run_stage)
+
+    assert events[:-1] == [{"type": "token", "text": "Sure,"}, {"type": "token", "text": " how much?"}]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"] == "Sure, how much?"
+    assert events[-1]["unavailable"] is False
+    assert [message.content for message in state.messages] == ["I need a loan", "Sure, how much?"]
+
+
+def test_agent_stream_says_so_when_claude_is_unavailable(monkeypatch):
+    async def run_stage(state, user_message, stream=False):
+        raise LLMUnavailableError("circuit open")
+
+    state, events = agent_stream(monkeypatch, run_stage)
+
+    assert events[0] == {"type": "token", "text": UNAVAILABLE_RESPONSE}
+    assert events[-1]["type"] == "done"
+    assert events[-1]["unavailable"] is True
+    assert events[-1]["next_stage"] == "SALES"
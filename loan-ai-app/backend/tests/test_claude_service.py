@@ -0,0 +1,175 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.master_agent import MasterAgent, UNAVAILABLE_RESPONSE
+from app.config import settings
+from app.services.claude_service import ClaudeService, LLMRequestError, LLMUnavailableError
+from app.services.response_cache import ResponseCache
+from app.services.conversation_store import MemoryConversationStore
+
+
+class UpstreamError(Exception):
+    status_code = 503
+
+
+class FailingMessages:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        raise UpstreamError("overloaded")
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        raise UpstreamError("overloaded")
+
+
+class FailingClient:
+    def __init__(self):
+        self.messages = FailingMessages()
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+class ScriptedMessages:
+    """Answers each call with the next outcome: reply text, an exception to raise, or an Event to block on"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, asyncio.Event):
+            await outcome.wait()
+        return SimpleNamespace(content=[SimpleNamespace(text=outcome)], usage=None)
+
+
+def scripted_service(*outcomes) -> ClaudeService:
+    service = ClaudeService(
+        client=SimpleNamespace(messages=ScriptedMessages(*outcomes)),
+        max_attempts=1, base_delay=0, max_delay=0, deadline=5
+    )
+    service.cache = None
+    return service
+
+
+def half_open(service: ClaudeService):
+    breaker = service.breaker
+    breaker._state = breaker.OPEN
+    breaker._opened_at = time.monotonic() - breaker.recovery_timeout
+    assert breaker.state == breaker.HALF_OPEN
+
+
+def failing_service(max_attempts: int = 2) -> ClaudeService:
+    service = ClaudeService(client=FailingClient(), max_attempts=max_attempts, base_delay=0, max_delay=0, deadline=5)
+    service.cache = None
+    return service
+
+
+def test_exhausted_retries_raise_instead_of_mock_reply():
+    service = failing_service()
+    with pytest.raises(LLMUnavailableError, match="retries exhausted"):
+        asyncio.run(service.chat("system", [{"role": "user", "content": "hello"}]))
+    assert service.client.messages.calls == 2
+    assert service.get_stats()["unavailable"] == 1
+
+
+def test_open_breaker_raises_without_calling_api():
+    service = failing_service(max_attempts=1)
+    for _ in range(service.breaker.failure_threshold):
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(service.chat("system", [{"role": "user", "content": "hello"}]))
+    calls = service.client.messages.calls
+
+    with pytest.raises(LLMUnavailableError, match="circuit breaker open"):
+        asyncio.run(service.chat("system", [{"role": "user", "content": "hello"}]))
+
+    async def drain():
+        return [chunk async for chunk in service.stream_chat("system", [{"role": "user", "content": "hello"}])]
+
+    with pytest.raises(LLMUnavailableError, match="circuit breaker open"):
+        asyncio.run(drain())
+    assert service.client.messages.calls == calls
+    assert service.get_stats()["unavailable"] == service.breaker.failure_threshold + 2
+
+
+def test_master_agent_flags_unavailable_turn_and_keeps_stage():
+    agent = MasterAgent(claude_service=failing_service(), conversation_store=MemoryConversationStore())
+
+    async def turn():
+        state = await agent.get_conversation_state(await agent.create_conversation())
+        return await agent.process_message(state, "Hello, I need a loan")
+
+    result = asyncio.run(turn())
+    assert result["unavailable"] is True
+    assert result["response"] == UNAVAILABLE_RESPONSE
+    assert result["next_stage"] == "GREETING"
+
+
+def test_short_system_prompt_is_not_marked_for_caching():
+    # Below the API's minimum cacheable prefix cache_control is ignored, so don't send it
+    assert ClaudeService._system_blocks("Be helpful.", "Collected: {}") == "Be helpful.\n\nCollected: {}"
+
+
+def test_long_system_prompt_is_marked_for_caching(monkeypatch):
+    monkeypatch.setattr(settings, "llm_prompt_cache_min_tokens", 10)
+    prompt = "You are a loan assistant. " * 4
+    blocks = ClaudeService._system_blocks(prompt, "Collected: {}")
+    assert blocks == [
+        {"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "Collected: {}"},
+    ]
+
+
+def test_client_error_raises_and_settles_the_half_open_probe():
+    service = scripted_service(BadRequestError("bad request"), "hello")
+    half_open(service)
+
+    with pytest.raises(LLMRequestError, match="400"):
+        asyncio.run(service.chat("system", [{"role": "user", "content": "hi"}]))
+
+    # The upstream answered, so the circuit closes and later calls go through
+    assert service.breaker.state == service.breaker.CLOSED
+    assert asyncio.run(service.chat("system", [{"role": "user", "content": "hi"}])) == "hello"
+    assert service.get_stats()["client_errors"] == 1
+
+
+def test_cancelled_probe_frees_the_probe_slot():
+    service = scripted_service(asyncio.Event(), "hello")
+    half_open(service)
+
+    async def cancelled_then_retried():
+        probe = asyncio.create_task(service.chat("system", [{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await service.chat("system", [{"role": "user", "content": "hi"}])
+
+    assert asyncio.run(cancelled_then_retried()) == "hello"
+    assert service.breaker.state == service.breaker.CLOSED
+
+
+def test_streamed_cache_hit_takes_no_probe():
+    service = scripted_service("hello")
+    service.cache = ResponseCache(ttl_seconds=60, max_entries=10)
+    messages = [{"role": "user", "content": "hi"}]
+    asyncio.run(service.chat("system", messages))
+    half_open(service)
+
+    async def drain():
+        return [chunk async for chunk in service.stream_chat("system", messages)]
+
+    assert asyncio.run(drain()) == ["hello"]
+    assert service.breaker._half_open_calls == 0
+    assert service.client.messages.calls == 1
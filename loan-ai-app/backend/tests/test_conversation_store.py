@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.conversation_store import ConversationStore, MemoryConversationStore
+from app.services.session_store import SessionBackend, LocalSessionBackend
+
+
+def test_store_must_implement_the_whole_interface():
+    class GetOnlyStore(ConversationStore):
+        async def get(self, conversation_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
+    assert isinstance(MemoryConversationStore(), ConversationStore)
+
+
+def test_session_backend_must_implement_the_whole_interface():
+    class ReadOnlyBackend(SessionBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
+    assert isinstance(LocalSessionBackend(), SessionBackend)
@@ -0,0 +1,108 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import app.main as main
+from app.database.models import Base
+from app.database.repository import ConversationRepository
+from app.services.decision_stats import DecisionCounters, summarise
+
+
+class Loader:
+    """Stands in for the GROUP BY decision query"""
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return dict(self.counts)
+
+
+def test_transitions_move_one_conversation_between_buckets():
+    counters = DecisionCounters(resync_interval=3600)
+    load = Loader({None: 2, "APPROVED": 1})
+
+    async def run():
+        assert await counters.get(load) == summarise({None: 2, "APPROVED": 1})
+        counters.created(2)
+        counters.changed(None, "APPROVED")
+        counters.changed("APPROVED", "REJECTED")
+        counters.changed("REJECTED", "REJECTED")  # a turn that kept its decision
+        return await counters.get(load)
+
+    assert asyncio.run(run()) == {"total_conversations": 5, "approved_loans": 1, "rejected_loans": 1, "pending": 3}
+    assert load.calls == 1
+
+
+def test_counts_are_reloaded_after_the_resync_interval_or_invalidation():
+    now = [0.0]
+    counters = DecisionCounters(resync_interval=60, clock=lambda: now[0])
+    load = Loader({None: 1})
+
+    async def run():
+        await counters.get(load)
+        counters.changed(None, "APPROVED")  # say another worker's write is also in the database
+        load.counts = {"APPROVED": 1, "REJECTED": 1}
+        now[0] = 30
+        cached = await counters.get(load)
+        now[0] = 60
+        resynced = await counters.get(load)
+        counters.invalidate()
+        counters.created()  # not counted on top of the reload that follows
+        invalidated = await counters.get(load)
+        return cached, resynced, invalidated
+
+    cached, resynced, invalidated = asyncio.run(run())
+    assert (cached["approved_loans"], cached["rejected_loans"]) == (1, 0)
+    assert (resynced["approved_loans"], resynced["rejected_loans"]) == (1, 1)
+    assert invalidated["total_conversations"] == 2
+    assert load.calls == 3
+
+
+def test_disabled_counters_query_every_time():
+    counters = DecisionCounters(enabled=False)
+    load = Loader({"APPROVED": 1})
+
+    async def run():
+        await counters.get(load)
+        return await counters.get(load)
+
+    assert asyncio.run(run())["approved_loans"] == 1
+    assert load.calls == 2
+
+
+def test_chat_turns_keep_counters_equal_to_a_recount(monkeypatch, tmp_path):
+    counters = DecisionCounters(resync_interval=3600)
+    monkeypatch.setattr(main, "USE_DATABASE", True)
+    monkeypatch.setattr(main, "get_decision_counters", lambda: counters)
+
+    async def turn(sessions, conversation_id, decision):
+        async with sessions() as db:
+            repo = ConversationRepository(db)
+            db_conv, state = await repo.load_state(conversation_id, message_window=10, create=True)
+            state.decision = decision
+            await main._save_chat_turn(repo, db_conv, state, "hi", {"response": "hello", "next_stage": state.stage})
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'loans.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as db:
+                await counters.get(ConversationRepository(db).count_by_decision)
+            await turn(sessions, "c1", None)
+            await turn(sessions, "c1", "APPROVED")
+            await turn(sessions, "c1", "APPROVED")
+            await turn(sessions, "c2", "REJECTED")  # created and decided in one turn
+            await turn(sessions, "c3", None)
+            async with sessions() as db:
+                recount = summarise(await ConversationRepository(db).count_by_decision())
+            return await counters.get(Loader({})), recount
+        finally:
+            await engine.dispose()
+
+    maintained, recount = asyncio.run(run())
+    assert maintained == recount == {"total_conversations": 3, "approved_loans": 1, "rejected_loans": 1, "pending": 1}
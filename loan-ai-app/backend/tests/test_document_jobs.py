@@ -0,0 +1,74 @@
+import asyncio
+import sqlite3
+
+from app.services.document_jobs import DocumentJobQueue, JobStore, QUEUED, RUNNING
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def add_job(store: JobStore, job_id: str = "j1"):
+    store.add({
+        "id": job_id, "conversation_id": "c1", "doc_type": "pan_card", "filename": "pan.jpg",
+        "file_path": "/tmp/pan.jpg", "content_type": "image/jpeg", "size": 10, "sha256": None, "max_attempts": 3
+    })
+
+
+def test_restart_leaves_jobs_of_live_peers_alone(tmp_path):
+    clock = FakeClock()
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), clock=clock)
+    add_job(store)
+    assert store.claim("peer")["claimed_by"] == "peer"
+
+    # Another process starting up while the peer is still heartbeating
+    clock.now += 50
+    store.heartbeat("peer")
+    clock.now += 50
+    assert store.recover_stale(lease_seconds=60) == 0
+    assert store.get("j1")["status"] == RUNNING
+
+    # The peer dies and its lease runs out
+    clock.now += 61
+    assert store.recover_stale(lease_seconds=60) == 1
+    job = store.get("j1")
+    assert (job["status"], job["claimed_by"]) == (QUEUED, None)
+
+
+def test_stopping_queue_hands_its_running_jobs_back(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    add_job(store)
+    started = asyncio.Event()
+
+    async def handler(job):
+        started.set()
+        await asyncio.Event().wait()
+
+    async def run():
+        queue = DocumentJobQueue(store, handler, workers=1, poll_interval=0.01)
+        await queue.start()
+        await asyncio.wait_for(started.wait(), 5)
+        assert store.get("j1")["claimed_by"] == queue.owner
+        await queue.stop()
+
+    asyncio.run(run())
+    job = store.get("j1")
+    assert (job["status"], job["claimed_by"], job["attempts"]) == (QUEUED, None, 1)
+
+
+def test_old_queue_files_gain_the_lease_columns(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE document_jobs (id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, doc_type TEXT NOT NULL, "
+            "filename TEXT, file_path TEXT NOT NULL, content_type TEXT, size INTEGER, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "available_at REAL NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+    store = JobStore(path)
+    add_job(store)
+    assert store.claim("me")["heartbeat_at"] is not None
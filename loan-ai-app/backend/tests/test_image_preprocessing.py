@@ -0,0 +1,71 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.image_preprocessing import estimate_skew, preprocess_image, target_size
+
+
+def text_page(size=(1200, 800), lines=12) -> Image.Image:
+    """White page with dark bars standing in for lines of text"""
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    for row in range(lines):
+        top = 60 + row * (size[1] - 120) // lines
+        draw.rectangle((80, top, size[0] - 80, top + 18), fill=60)
+    return page
+
+
+def reopen(img: Image.Image, fmt: str = "PNG", **save_args) -> Image.Image:
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **save_args)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def test_target_size_follows_the_document_and_never_upscales():
+    assert target_size((4000, 3000), None, 300) == (3507, 2630)  # A4 long edge at 300 dpi
+    assert target_size((4000, 3000), "pan_card", 300) == (1011, 758)
+    assert target_size((800, 600), "pan_card", 300) == (800, 600)
+
+
+@pytest.mark.parametrize("tilt", [3.0, -2.0])
+def test_skew_estimate_levels_tilted_lines(tilt):
+    tilted = text_page().rotate(tilt, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+    assert estimate_skew(tilted) == pytest.approx(-tilt, abs=0.5)
+
+
+def test_output_is_binarised_despite_uneven_lighting():
+    page = np.asarray(text_page(), dtype=np.float32)
+    # Light falls off to a fifth across the page: the dark side's paper is darker than the bright side's ink
+    lighting = np.linspace(1.0, 0.2, page.shape[1])[None, :]
+    shaded = Image.fromarray((page * lighting).astype(np.uint8), mode="L")
+
+    result = np.asarray(preprocess_image(reopen(shaded), deskew=False))
+
+    assert set(np.unique(result)) <= {0, 255}
+    # Paper between the lines is white and the bars are black at both ends of the page
+    for column in (120, result.shape[1] - 120):
+        assert result[40, column] == 255
+        assert result[70, column] == 0
+
+
+def test_exif_orientation_is_applied_before_everything_else():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways, display rotated 90 degrees clockwise
+    photo = reopen(text_page(size=(1200, 800)).convert("RGB"), "JPEG", exif=exif)
+
+    assert preprocess_image(photo, deskew=False).size == (800, 1200)
+
+
+def test_large_jpeg_is_reduced_to_the_card_size_and_cropped_to_its_fields():
+    photo = reopen(text_page(size=(4000, 2520)).convert("RGB"), "JPEG")
+
+    full = preprocess_image(photo, doc_type="pan_card", deskew=False)
+    cropped = preprocess_image(reopen(text_page(size=(4000, 2520)).convert("RGB"), "JPEG"),
+                               doc_type="pan_card", deskew=False, crop_roi=True)
+
+    assert full.size == (1011, 637)
+    assert cropped.size == (789, 523)  # the PAN card's region left of the photo, below the header
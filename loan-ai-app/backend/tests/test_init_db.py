@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.database.init_db import init_database
+
+# Columns and indexes the models gained after the first release
+LATER_COLUMNS = {
+    "loan_applications": ["pan_number", "accepted_interest_rate", "accepted_tenure_months"],
+    "documents": ["sha256", "parsed_fields"],
+}
+LATER_INDEXES = [
+    "ix_conversations_created_at_id", "ix_conversations_decision_created_at_id",
+    "ix_conversations_stage_created_at_id", "ix_messages_conversation_timestamp",
+    "ix_loan_applications_amount_conversation", "ix_documents_sha256",
+]
+
+
+def test_existing_database_is_upgraded_to_the_current_models(tmp_path):
+    url = f"sqlite:///{tmp_path / 'loans.db'}"
+    init_database(url)
+
+    # Turn it back into a database created before those columns and indexes existed
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for index in LATER_INDEXES:
+            conn.execute(text(f"DROP INDEX {index}"))
+        for table, columns in LATER_COLUMNS.items():
+            for column in columns:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text("INSERT INTO conversations (id, stage) VALUES ('c1', 'GREETING')"))
+        conn.execute(text("INSERT INTO documents (id, conversation_id, doc_type, filename) VALUES ('d1', 'c1', 'pan_card', 'pan.jpg')"))
+
+    init_database(url)
+    init_database(url)  # and running it again is a no-op
+
+    inspector = inspect(engine)
+    for table, columns in LATER_COLUMNS.items():
+        assert set(columns) <= {column["name"] for column in inspector.get_columns(table)}
+    indexes = {index["name"] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+    assert set(LATER_INDEXES) <= indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT doc_type, sha256, parsed_fields FROM documents")).all() == [
+            ("pan_card", None, None)
+        ]
+    engine.dispose()
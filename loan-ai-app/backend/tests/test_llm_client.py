@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+import app.services.llm_client as llm_client
+from app.agents.master_agent import MasterAgent
+from app.config import settings
+from app.services.claude_service import ClaudeService, get_claude_service
+from app.services.conversation_store import MemoryConversationStore
+
+
+@pytest.fixture
+def fresh_client():
+    llm_client.get_anthropic_client.cache_clear()
+    yield llm_client.get_anthropic_client
+    asyncio.run(llm_client.close_anthropic_client())
+
+
+def test_http_client_pool_comes_from_settings_and_falls_back_to_http1(monkeypatch):
+    built = {}
+
+    class RecordingClient:
+        def __init__(self, **kwargs):
+            built.update(kwargs)
+
+    monkeypatch.setattr(llm_client.httpx, "AsyncClient", RecordingClient)
+    monkeypatch.setattr(llm_client, "_http2_available", lambda: False)
+    monkeypatch.setattr(settings, "llm_http2", True)
+    llm_client.build_http_client()
+
+    assert built["http2"] is False
+    assert built["limits"].max_connections == settings.llm_max_connections
+    assert built["limits"].max_keepalive_connections == settings.llm_max_keepalive_connections
+    assert built["timeout"].read == settings.llm_request_deadline
+
+
+def test_without_an_api_key_there_is_no_client_and_services_use_the_mock(monkeypatch, fresh_client):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    assert fresh_client() is None
+    assert ClaudeService().use_mock
+
+
+@pytest.mark.skipif(llm_client.AsyncAnthropic is None, reason="anthropic is not installed")
+def test_every_service_shares_one_client_until_shutdown(monkeypatch, fresh_client):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-test")
+
+    first, second = ClaudeService(), ClaudeService()
+    assert first.client is second.client is fresh_client()
+    assert not first.use_mock
+
+    asyncio.run(llm_client.close_anthropic_client())
+    assert first.client.is_closed()
+    assert fresh_client() is not first.client
+
+
+def test_master_agent_hands_its_service_to_every_agent():
+    agent = MasterAgent(conversation_store=MemoryConversationStore())
+    service = agent.claude_service
+    assert service is get_claude_service()
+
+    for sub_agent in [agent.sales_agent, agent.verification_agent, agent.underwriting_agent,
+                      agent.sanction_agent, agent.slot_filler]:
+        assert sub_agent.claude_service is service
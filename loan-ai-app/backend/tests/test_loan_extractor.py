@@ -0,0 +1,68 @@
+import pytest
+
+from app.services.loan_extractor import LoanInfoExtractor, parse_amount
+
+
+def values(text: str, expected_field: str = None) -> dict:
+    return {field: found["value"] for field, found in LoanInfoExtractor().extract(text, expected_field).items()}
+
+
+@pytest.mark.parametrize("text, name", [
+    ("Hi, I am Priya. I want a loan of 3 lakh", "Priya"),
+    ("My name is A.K. Sharma", "A.K. Sharma"),
+    ("I am Rahul D'Souza, salaried", "Rahul D'Souza"),
+    ("call me priya!", "Priya"),
+    ("I'm looking for a loan", None),
+])
+def test_name_stops_at_sentence_punctuation(text, name):
+    assert values(text).get("name") == name
+
+
+def test_bare_name_answers_the_name_question():
+    assert values("a.k. sharma.", expected_field="name") == {"name": "A.K. Sharma"}
+
+
+@pytest.mark.parametrize("value, unit, rupees", [
+    ("1,00,000", None, 100000), ("5.5", "lakh", 550000), ("50", "k", 50000), ("2", "cr", 20000000), ("abc", None, None),
+])
+def test_parse_amount(value, unit, rupees):
+    assert parse_amount(value, unit) == rupees
+
+
+def test_amounts_are_assigned_by_context():
+    found = values("I need a loan of 5 lakh and my salary is 60,000 per month")
+    assert found["loan_amount"] == 500000
+    assert found["monthly_salary"] == 60000
+
+
+def test_annual_income_is_converted_to_monthly():
+    assert values("My income is 12 lpa")["monthly_salary"] == 100000
+
+
+def test_tenures_and_rates_are_not_amounts():
+    assert values("for 36 months at 12.5%") == {}
+
+
+def test_bare_number_answers_the_expected_field():
+    assert values("75000", expected_field="monthly_salary") == {"monthly_salary": 75000}
+
+
+def test_pan_digits_are_not_read_as_an_amount():
+    assert values("My PAN is ABCDE1234F") == {"pan_number": "ABCDE1234F"}
+
+
+def test_employment_and_purpose():
+    found = values("I am self-employed and need the loan for my wedding")
+    assert found["employment_type"] == "Self-Employed"
+    assert found["loan_purpose"] == "Wedding"
+
+
+def test_owning_a_business_is_employment_not_purpose():
+    assert "loan_purpose" not in values("I own a business")
+
+
+def test_low_confidence_fields_are_not_used():
+    extractor = LoanInfoExtractor()
+    fields = extractor.extract("50000")
+    assert not extractor.is_confident(fields)
+    assert extractor.confident_values(fields) == {}
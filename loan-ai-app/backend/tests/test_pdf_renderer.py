@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+import app.services.pdf_renderer as pdf_renderer
+from app.services.pdf_renderer import SanctionLetterRenderer
+from app.services.process_pool import PoolBusyError
+
+LOAN = {"name": "Asha Rao", "loan_amount": 500000, "interest_rate": 11.5, "tenure": 36, "monthly_emi": 16488}
+
+
+def test_letter_is_rendered_in_a_worker_process(tmp_path):
+    path = str(tmp_path / "letter.pdf")
+
+    async def run():
+        renderer = SanctionLetterRenderer(workers=1, max_queue=4, timeout=60)
+        try:
+            await renderer.start()
+            return await renderer.render(LOAN, path), renderer.snapshot()
+        finally:
+            renderer.close()
+
+    returned, snapshot = asyncio.run(run())
+
+    assert returned == path
+    with open(path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+    assert snapshot["completed"] == 1
+
+
+def test_renders_beyond_the_queue_are_refused(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def blocking_write(loan_details, filepath):
+        release.wait(5)
+        return 0
+
+    monkeypatch.setattr(pdf_renderer, "write_sanction_letter", blocking_write)
+
+    async def run():
+        renderer = SanctionLetterRenderer(workers=0, max_queue=1, timeout=10)
+        running = asyncio.create_task(renderer.render(LOAN, str(tmp_path / "a.pdf")))
+        queued = asyncio.create_task(renderer.render(LOAN, str(tmp_path / "b.pdf")))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(PoolBusyError):
+            await renderer.render(LOAN, str(tmp_path / "c.pdf"))
+
+        release.set()
+        await asyncio.gather(running, queued)
+        return renderer.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["rejected"] == 1
+    assert snapshot["completed"] == 2
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.process_pool import BoundedProcessPool
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    finish = threading.Event()
+
+    async def scenario():
+        pool = BoundedProcessPool("test", workers=0, timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(finish.wait)
+
+        # The worker is still busy with the timed-out job
+        assert pool.in_flight == 1
+        queued = asyncio.create_task(pool.run(lambda: "done"))
+        await asyncio.sleep(0.2)
+        assert not queued.done()
+        assert pool.snapshot()["queue_depth"] == 1
+
+        finish.set()
+        assert await queued == "done"
+        assert pool.in_flight == 0
+        assert pool.stats["timed_out"] == 1
+        assert pool.stats["completed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_frees_its_slot():
+    async def scenario():
+        pool = BoundedProcessPool("test", workers=0, timeout=1)
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(divmod, 1, 0)
+        assert await pool.run(divmod, 7, 2) == (3, 1)
+        assert pool.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,125 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.claude_service import ClaudeService, LLMUnavailableError
+from app.services.rate_limiter import (
+    AdmissionController, AdmissionTimeoutError, PrioritySemaphore, TokenBucket,
+    PRIORITY_CHAT, PRIORITY_EXTRACTION
+)
+
+
+class CountingMessages:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(content=[SimpleNamespace(text="ok")], usage=None)
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        raise AssertionError("a refused call must not reach the upstream")
+
+
+def test_in_flight_calls_are_capped():
+    admission = AdmissionController(max_in_flight=2, requests_per_minute=6000, tokens_per_minute=600000)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with admission.admit():
+            peak = max(peak, admission.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert admission.snapshot()["admitted"] == 6
+    assert admission.in_flight == 0
+
+
+def test_waiters_are_woken_by_priority_then_in_arrival_order():
+    order = []
+
+    async def run():
+        slots = PrioritySemaphore(1)
+        await slots.acquire(PRIORITY_CHAT)
+
+        async def waiter(name, priority):
+            await slots.acquire(priority)
+            order.append(name)
+            slots.release()
+
+        tasks = [
+            asyncio.create_task(waiter("extraction", PRIORITY_EXTRACTION)),
+            asyncio.create_task(waiter("chat 1", PRIORITY_CHAT)),
+            asyncio.create_task(waiter("chat 2", PRIORITY_CHAT)),
+        ]
+        await asyncio.sleep(0)
+        assert slots.waiting == 3
+        slots.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["chat 1", "chat 2", "extraction"]
+
+
+def test_token_bucket_makes_callers_wait_for_refill():
+    async def run():
+        bucket = TokenBucket(rate_per_minute=600, capacity=1)  # one token per 0.1s
+        await bucket.acquire()
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) == pytest.approx(0.1, abs=0.05)
+
+
+def test_admission_is_refused_once_the_timeout_passes():
+    admission = AdmissionController(max_in_flight=4, requests_per_minute=1, tokens_per_minute=600000)
+
+    async def run():
+        async with admission.admit():
+            pass
+        # The one request a minute is spent: waiting for the next would take a minute
+        started = time.monotonic()
+        with pytest.raises(AdmissionTimeoutError):
+            async with admission.admit(timeout=0.05):
+                pass
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 1
+    snapshot = admission.snapshot()
+    assert (snapshot["admitted"], snapshot["refused"], snapshot["in_flight"]) == (1, 1, 0)
+    # The refused caller gave its in-flight slot back
+    assert admission._slots._value == 4
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_claude_call_over_the_rate_limit_is_refused_without_reaching_claude(streaming):
+    messages = CountingMessages()
+    service = ClaudeService(client=SimpleNamespace(messages=messages), max_attempts=1, deadline=0.05)
+    service.cache = None
+    service.admission = AdmissionController(max_in_flight=4, requests_per_minute=1, tokens_per_minute=600000)
+
+    async def call():
+        if streaming:
+            return "".join([chunk async for chunk in service.stream_chat("system", [{"role": "user", "content": "hi"}])])
+        return await service.chat("system", [{"role": "user", "content": "hi"}])
+
+    async def run():
+        await service.admission._requests.acquire(1)  # spend the minute's only request
+        with pytest.raises(LLMUnavailableError, match="deadline exceeded"):
+            await call()
+
+    asyncio.run(run())
+    assert messages.calls == 0
+    assert service.stats["deadline_exceeded"] == 1
+    assert service.stats["failures"] == 0
+    # Our own limit is not an upstream failure: the breaker stays closed
+    assert service.breaker.snapshot()["state"] == "CLOSED"
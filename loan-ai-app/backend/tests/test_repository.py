@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import app.database.repository as repository
+from app.database.adapter import db_conversation_to_state
+from app.database.models import Base
+from app.database.repository import ConversationRepository
+
+
+class FrozenDatetime(datetime):
+    """A clock too coarse to tell a turn's question from its reply"""
+    now = datetime(2024, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'repo.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def test_recent_messages_keep_each_turn_in_order(session_factory, monkeypatch):
+    monkeypatch.setattr(repository, "datetime", FrozenDatetime)
+
+    async def scenario():
+        async with session_factory() as db:
+            repo = ConversationRepository(db)
+            db_conv, state = await repo.load_state("c1", message_window=0, create=True)
+            for turn in range(1, 4):
+                FrozenDatetime.now = datetime(2024, 1, 1, 12, 0, turn)
+                await repo.save_turn(db_conv, state, f"question {turn}", f"answer {turn}")
+            await db.commit()
+
+        async with session_factory() as db:
+            messages, total = await ConversationRepository(db).get_recent_messages("c1", window=4)
+        return [message.content for message in messages], total
+
+    contents, total = asyncio.run(scenario())
+    assert total == 6
+    assert contents == ["question 2", "answer 2", "question 3", "answer 3"]
+
+
+def test_saved_turn_loads_back_without_lazy_loads(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            repo = ConversationRepository(db)
+            db_conv, state = await repo.load_state("c1", message_window=10, create=True)
+            state.stage = "VERIFICATION"
+            state.loan_application.name = "Asha Rao"
+            state.loan_application.loan_amount = 500000
+            state.loan_application.pan_number = "ABCDE1234F"
+            state.user_data = {"slots": {"name": {"turn": 1}}}
+            await repo.save_turn(db_conv, state, "I am Asha Rao", "Thanks Asha", metadata={"agent": "sales"})
+            repo.set_document(db_conv, "pan_card", "pan.jpg", "/tmp/pan.jpg", 10, "image/jpeg")
+            await db.commit()
+
+        # Everything is read after the session has closed, where a lazy load would raise
+        async with session_factory() as db:
+            full = await ConversationRepository(db).get("c1")
+            _, windowed = await ConversationRepository(db).load_state("c1", message_window=1)
+        return db_conversation_to_state(full), windowed
+
+    state, windowed = asyncio.run(scenario())
+    assert state.stage == "VERIFICATION"
+    assert [message.content for message in state.messages] == ["I am Asha Rao", "Thanks Asha"]
+    assert (state.loan_application.name, state.loan_application.pan_number) == ("Asha Rao", "ABCDE1234F")
+    assert state.documents == {"pan_card": "pan.jpg"}
+    assert state.user_data == {"slots": {"name": {"turn": 1}}}
+
+    assert [message.content for message in windowed.messages] == ["Thanks Asha"]
+    assert windowed.message_offset == 1
+    assert windowed.loan_application.loan_amount == 500000
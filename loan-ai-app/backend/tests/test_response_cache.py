@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.claude_service import ClaudeService
+from app.services.response_cache import MemoryTier, ResponseCache, cache_key
+
+MESSAGES = [{"role": "user", "content": "What documents do I need?"}]
+
+
+class CountingMessages:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(content=[SimpleNamespace(text=f"reply {self.calls}")], usage=None)
+
+
+def test_key_is_stable_and_covers_everything_that_shapes_the_reply():
+    key = cache_key("model-a", "system", MESSAGES, 500)
+
+    assert key == cache_key("model-a", "system", [{"content": "What documents do I need?", "role": "user"}], 500)
+    assert len({
+        key,
+        cache_key("model-b", "system", MESSAGES, 500),
+        cache_key("model-a", "other system", MESSAGES, 500),
+        cache_key("model-a", "system", [{"role": "user", "content": "What documents do I need"}], 500),
+        cache_key("model-a", "system", MESSAGES, 501),
+    }) == 5
+
+
+def test_service_reuses_a_reply_only_for_the_same_request():
+    messages = CountingMessages()
+    service = ClaudeService(client=SimpleNamespace(messages=messages), max_attempts=1)
+    service.cache = ResponseCache(ttl_seconds=60, max_entries=10)
+
+    async def run():
+        return [
+            await service.chat("system", MESSAGES),
+            await service.chat("system", MESSAGES),
+            # Per-call context is part of the system prompt, so part of the key
+            await service.chat("system", MESSAGES, context="Applicant: Asha"),
+            await service.chat("system", MESSAGES, context="Applicant: Ravi"),
+            await service.chat("system", MESSAGES, cache=False),
+        ]
+
+    assert asyncio.run(run()) == ["reply 1", "reply 1", "reply 2", "reply 3", "reply 4"]
+    assert messages.calls == 4
+    assert service.cache.snapshot()["memory_hits"] == 1
+
+
+def test_memory_tier_expires_and_evicts_least_recently_used():
+    now = [1000.0]
+    tier = MemoryTier(max_entries=2, clock=lambda: now[0])
+    tier.set("a", "A", expires_at=1010)
+    tier.set("b", "B", expires_at=1100)
+    assert tier.get("a") == "A"  # "b" is now the least recently used
+    tier.set("c", "C", expires_at=1100)
+
+    assert tier.get("b") is None
+    now[0] = 1050
+    assert tier.get("a") is None
+    assert tier.get("c") == "C"
+
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    key = cache_key("model-a", "system", MESSAGES, 500)
+
+    async def run():
+        await ResponseCache(ttl_seconds=60, max_entries=10, sqlite_path=path).set(key, "cached reply")
+        other = ResponseCache(ttl_seconds=60, max_entries=10, sqlite_path=path)
+        return await other.get(key), await other.get(key), other.snapshot()
+
+    first, second, snapshot = asyncio.run(run())
+    assert first == second == "cached reply"
+    assert (snapshot["disk_hits"], snapshot["memory_hits"]) == (1, 1)
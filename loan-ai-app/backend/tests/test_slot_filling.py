@@ -0,0 +1,83 @@
+import asyncio
+
+from app.models import ConversationState, LoanApplication, Message
+from app.services.loan_extractor import LoanInfoExtractor
+from app.services.slot_filling import SlotFiller
+
+
+class RecordingClaude:
+    """Answers extract_structured_data with a fixed reply (or raises it) and records what was asked"""
+
+    def __init__(self, reply=None):
+        self.reply = reply or {}
+        self.calls = []
+
+    async def extract_structured_data(self, text, schema):
+        self.calls.append((text, sorted(schema)))
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+def say(filler: SlotFiller, state: ConversationState, user_message: str, question: str = "How can I help?"):
+    state.messages += [
+        Message(role="assistant", content=question),
+        Message(role="user", content=user_message),
+    ]
+    return asyncio.run(filler.fill(state, user_message))
+
+
+def new_state(**application) -> ConversationState:
+    return ConversationState(
+        conversation_id="c1", stage="SALES", messages=[], loan_application=LoanApplication(**application)
+    )
+
+
+def test_confident_rule_extraction_does_not_ask_claude():
+    claude = RecordingClaude()
+    filler = SlotFiller(claude, LoanInfoExtractor())
+    state = new_state()
+
+    application = say(filler, state, "I need a loan of 5 lakh and my salary is 60,000 per month")
+
+    assert (application.loan_amount, application.monthly_salary) == (500000, 60000)
+    assert claude.calls == []
+    slots = state.user_data["slots"]
+    assert slots["loan_amount"]["source"] == "rule"
+    assert slots["loan_amount"]["message_index"] == 1
+
+
+def test_earlier_slots_survive_and_a_newer_answer_corrects_one():
+    filler = SlotFiller(RecordingClaude(), LoanInfoExtractor())
+    state = new_state(name="Asha Rao", loan_amount=500000)
+    state.message_offset = 40  # older messages are outside the loaded window
+
+    application = say(filler, state, "Sorry, I need a loan of 7 lakh")
+
+    assert (application.name, application.loan_amount) == ("Asha Rao", 700000)
+    assert state.user_data["slots"]["loan_amount"]["message_index"] == 41
+
+
+def test_claude_is_asked_only_for_missing_slots_with_the_last_question():
+    claude = RecordingClaude({"loan_purpose": "Education", "monthly_salary": "1,00,000", "employment_type": ""})
+    filler = SlotFiller(claude, LoanInfoExtractor())
+    state = new_state(name="Asha Rao", loan_amount=500000)
+
+    application = say(filler, state, "it's for my masters, I earn one lakh", question="What is the loan for?")
+
+    [(text, asked)] = claude.calls
+    assert text == "assistant: What is the loan for?\nuser: it's for my masters, I earn one lakh"
+    assert asked == ["employment_type", "loan_purpose", "monthly_salary", "pan_number"]
+    assert (application.loan_purpose, application.monthly_salary) == ("Education", 100000)
+    assert application.employment_type is None
+    assert state.user_data["slots"]["loan_purpose"]["source"] == "llm"
+
+
+def test_unparseable_claude_reply_leaves_the_application_unchanged():
+    filler = SlotFiller(RecordingClaude(ValueError("not JSON")), LoanInfoExtractor())
+    state = new_state(name="Asha Rao")
+
+    application = say(filler, state, "hmm let me think")
+
+    assert application == LoanApplication(name="Asha Rao")
+    assert state.user_data.get("slots", {}) == {}
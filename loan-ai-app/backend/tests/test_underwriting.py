@@ -0,0 +1,221 @@
+import json
+import time
+import asyncio
+
+import app.agents.underwriting_agent as underwriting_agent
+from app.agents.master_agent import MasterAgent
+from app.agents.underwriting_agent import UnderwritingAgent
+from app.config import settings
+from app.models import ConversationState, LoanApplication
+from app.services.conversation_store import MemoryConversationStore
+from app.services.mock_data import get_loan_products
+from app.services.policy_engine import Policy, get_policy
+
+
+class FakeBureau:
+    """Instant bureau/CRM/Offer Mart answers"""
+
+    def __init__(self, credit_score: int = 720, existing_loans: float = 5000):
+        self.credit_score = credit_score
+        self.existing_loans = existing_loans
+
+    async def get_credit_score(self, pan_number: str) -> int:
+        return self.credit_score
+
+    async def check_existing_loans(self, pan_number: str):
+        return {"existing_loans": self.existing_loans, "outstanding_emi": 0, "active_loans_count": 1}
+
+    async def get_offer_eligibility(self, loan_amount: float, monthly_salary: float):
+        return {"eligible": True, "interest_rate": 12.5}
+
+
+def make_agent(bureau: FakeBureau) -> MasterAgent:
+    agent = MasterAgent(claude_service=object(), conversation_store=MemoryConversationStore())
+    agent.underwriting_agent.bureau_service = bureau
+    return agent
+
+
+def underwriting_state(loan_amount: float, monthly_salary: float, **fields) -> ConversationState:
+    return ConversationState(
+        conversation_id="c1",
+        stage="UNDERWRITING",
+        loan_application=LoanApplication(
+            name="Asha Rao", loan_amount=loan_amount, monthly_salary=monthly_salary,
+            employment_type="Salaried", pan_number="ABCDE1234F", **fields
+        )
+    )
+
+
+def test_lookup_results_are_stored_on_the_application():
+    agent = make_agent(FakeBureau(credit_score=610, existing_loans=20000))
+    state = underwriting_state(100000, 60000)
+
+    result = asyncio.run(agent.process_message(state, "ok"))
+
+    assert state.loan_application.credit_score == 610
+    assert state.loan_application.existing_loans == 20000
+    assert state.decision == "REJECTED"
+    assert "Credit score (610)" in result["response"]
+
+
+def test_live_pricing_uses_policy_terms_not_offer_mart(monkeypatch):
+    with open(settings.underwriting_policy_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["purpose_products"] = {"car": "Auto Loan"}
+    monkeypatch.setattr(underwriting_agent, "get_policy", lambda: Policy(spec))
+    agent = UnderwritingAgent(claude_service=object(), bureau_service=FakeBureau())
+
+    decision = asyncio.run(agent.assess_risk({
+        "loan_amount": 300000, "monthly_salary": 50000, "loan_purpose": "car", "pan_number": "ABCDE1234F"
+    }))
+
+    # Offer Mart quoted 12.5%; the Auto Loan is 9% over its 60-month default tenure
+    assert decision["status"] == "APPROVED"
+    assert (decision["interest_rate"], decision["tenure"], decision["product"]) == (9.0, 60, "Auto Loan")
+    assert decision["offer_mart"]["interest_rate"] == 12.5
+
+
+def test_accepted_counter_offer_is_approved():
+    # (requested amount, monthly salary, offered amount)
+    for loan_amount, monthly_salary, offered in [(300000, 30000, None), (600000, 60000, None), (100000, 5000, 50000)]:
+        agent = make_agent(FakeBureau(credit_score=750, existing_loans=0))
+        state = underwriting_state(loan_amount, monthly_salary)
+
+        asyncio.run(agent.process_message(state, "ok"))
+
+        offer = state.user_data["counter_offer"]
+        assert state.decision == "REJECTED"
+        assert state.stage == "COUNTER_OFFER"
+        assert offered is None or offer["amount"] == offered
+
+        result = asyncio.run(agent.process_message(state, "Yes, go ahead"))
+
+        assert state.decision == "APPROVED", result["response"]
+        assert state.stage == "SANCTION"
+        assert state.loan_application.loan_amount == offer["amount"]
+        assert state.user_data["approved_terms"]["tenure"] == offer["tenure_months"]
+        assert state.user_data["approved_terms"]["interest_rate"] == offer["interest_rate"]
+        assert "counter_offer" not in state.user_data
+
+
+def test_declined_counter_offer_closes_the_conversation():
+    agent = make_agent(FakeBureau(credit_score=750, existing_loans=0))
+    state = underwriting_state(100000, 5000)
+    asyncio.run(agent.process_message(state, "ok"))
+
+    asyncio.run(agent.process_message(state, "hmm, let me think"))
+    assert state.stage == "COUNTER_OFFER"
+
+    asyncio.run(agent.process_message(state, "No thanks"))
+    assert state.stage == "COMPLETED"
+    assert state.decision == "REJECTED"
+    assert "counter_offer" not in state.user_data
+
+
+def test_counter_offer_stays_within_the_purpose_product(monkeypatch):
+    with open(settings.underwriting_policy_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["purpose_products"] = {"car": "Auto Loan"}
+    monkeypatch.setattr(underwriting_agent, "get_policy", lambda: Policy(spec))
+    agent = UnderwritingAgent(claude_service=object(), bureau_service=FakeBureau(credit_score=750, existing_loans=0))
+
+    mapped = asyncio.run(agent.assess_risk({
+        "loan_amount": 3000000, "monthly_salary": 50000, "loan_purpose": "car", "pan_number": "ABCDE1234F"
+    }))
+    unmapped = asyncio.run(agent.assess_risk({
+        "loan_amount": 3000000, "monthly_salary": 50000, "loan_purpose": "wedding", "pan_number": "ABCDE1234F"
+    }))
+
+    assert mapped["counter_offer"]["product"] == "Auto Loan"
+    assert mapped["counter_offer"]["interest_rate"] == 9.0
+    assert unmapped["counter_offer"]["product"] is None
+    assert unmapped["counter_offer"]["interest_rate"] == 12.5
+
+
+def test_shipped_policy_prices_extracted_purposes_from_the_catalogue():
+    policy = get_policy()
+
+    # The grid is the sales catalogue, not a copy of it
+    assert {name: product["interest_rate"] for name, product in policy.products.items()} == {
+        product["name"]: product["rate"] for product in get_loan_products()
+    }
+    assert policy.terms_for("Vehicle Purchase") == {"product": "Auto Loan", "interest_rate": 9.0, "tenure_months": 60}
+    assert policy.terms_for(" business  EXPANSION ")["product"] == "Business Loan"
+    assert policy.terms_for("something else")["product"] is None
+
+
+def test_counter_offer_on_the_purpose_product_is_approved_when_accepted():
+    agent = make_agent(FakeBureau(credit_score=750, existing_loans=0))
+    state = underwriting_state(1500000, 40000, loan_purpose="Vehicle Purchase")
+
+    asyncio.run(agent.process_message(state, "ok"))
+    offer = state.user_data["counter_offer"]
+    assert (offer["product"], offer["interest_rate"]) == ("Auto Loan", 9.0)
+    assert 12 <= offer["tenure_months"] <= 84
+
+    asyncio.run(agent.process_message(state, "yes"))
+    assert state.decision == "APPROVED"
+    assert state.user_data["approved_terms"]["tenure"] == offer["tenure_months"]
+
+
+class SlowBureau(FakeBureau):
+    """Each lookup takes `delay` seconds; `fail` names lookups that raise instead"""
+
+    def __init__(self, delay: float, slow: dict = None, fail: tuple = ()):
+        super().__init__()
+        self.delay = delay
+        self.slow = slow or {}
+        self.fail = fail
+
+    async def _wait(self, source: str):
+        await asyncio.sleep(self.slow.get(source, self.delay))
+        if source in self.fail:
+            raise ConnectionError(f"{source} unreachable")
+
+    async def get_credit_score(self, pan_number: str) -> int:
+        await self._wait("bureau")
+        return await super().get_credit_score(pan_number)
+
+    async def check_existing_loans(self, pan_number: str):
+        await self._wait("crm")
+        return await super().check_existing_loans(pan_number)
+
+    async def get_offer_eligibility(self, loan_amount: float, monthly_salary: float):
+        await self._wait("offer")
+        return await super().get_offer_eligibility(loan_amount, monthly_salary)
+
+
+def assess(bureau: FakeBureau, loan_amount: float = 300000, monthly_salary: float = 50000) -> tuple:
+    agent = UnderwritingAgent(claude_service=object(), bureau_service=bureau)
+    started = time.monotonic()
+    decision = asyncio.run(agent.assess_risk({
+        "loan_amount": loan_amount, "monthly_salary": monthly_salary, "pan_number": "ABCDE1234F"
+    }))
+    return decision, time.monotonic() - started, {entry["source"]: entry["status"] for entry in decision["timeline"]}
+
+
+def test_lookups_run_concurrently():
+    decision, elapsed, statuses = assess(SlowBureau(delay=0.2))
+
+    assert statuses == {"bureau": "ok", "crm": "ok", "offer": "ok"}
+    assert elapsed < 0.4  # the slowest lookup, not the sum of all three
+    assert decision["status"] == "APPROVED"
+
+
+def test_slow_bureau_times_out_into_manual_review(monkeypatch):
+    monkeypatch.setattr(settings, "underwriting_bureau_timeout", 0.05)
+
+    decision, elapsed, statuses = assess(SlowBureau(delay=0, slow={"bureau": 5}))
+
+    assert statuses == {"bureau": "timeout", "crm": "ok", "offer": "ok"}
+    assert elapsed < 1
+    assert decision["status"] == "MANUAL_REVIEW"
+    assert decision["unavailable_sources"] == ["bureau"]
+
+
+def test_unreachable_crm_does_not_hold_back_a_rejection_that_does_not_need_it():
+    # 20 lakh on a 50k salary breaks the 10x-salary rule whatever the CRM says
+    decision, _, statuses = assess(SlowBureau(delay=0, fail=("crm",)), loan_amount=2000000)
+
+    assert statuses["crm"] == "error"
+    assert decision["status"] == "REJECTED"
@@ -0,0 +1,136 @@
+import io
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import app.main as main
+from app.database.models import Base, Conversation, Document
+from app.services.conversation_store import MemoryConversationStore
+from app.models import ConversationState
+
+FIELDS = {"pan": "ABCDE1234F", "name": "ASHA RAO"}
+
+
+async def make_database(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'loans.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with sessions() as db:
+        db.add(Conversation(id="c1", user_id="owner"))
+        db.add(Document(conversation_id="c1", doc_type="pan_card", filename="pan.jpg", sha256="a" * 64))
+        await db.commit()
+    return engine, sessions
+
+
+def finished_job(conversation_id: str = "c1") -> dict:
+    return asyncio.run(main.document_jobs.enqueue(
+        conversation_id=conversation_id, doc_type="pan_card", filename="pan.jpg",
+        file_path="/tmp/pan.jpg", content_type="image/jpeg", size=10, result={"fields": FIELDS}
+    ))
+
+
+def test_job_is_only_shown_for_its_own_conversation(monkeypatch):
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    job = finished_job()
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.get_upload_job(job["id"], conversation_id="someone-else", wait=0, db=None, current_user=None))
+    assert e.value.status_code == 404
+
+    shown = asyncio.run(main.get_upload_job(job["id"], conversation_id="c1", wait=0, db=None, current_user=None))
+    assert shown["result"]["fields"] == FIELDS
+
+
+def test_job_of_an_owned_conversation_is_only_shown_to_its_owner(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "USE_DATABASE", True)
+    job = finished_job()
+
+    async def read(user):
+        engine, sessions = await make_database(tmp_path)
+        try:
+            async with sessions() as db:
+                return await main.get_upload_job(job["id"], conversation_id="c1", wait=0, db=db, current_user=user)
+        finally:
+            await engine.dispose()
+
+    for user in [None, SimpleNamespace(id="intruder", is_admin=False)]:
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(read(user))
+        assert e.value.status_code == 404
+        (tmp_path / "loans.db").unlink()
+
+    assert asyncio.run(read(SimpleNamespace(id="owner", is_admin=False)))["result"]["fields"] == FIELDS
+
+
+def test_parsed_fields_are_recorded_on_the_document(monkeypatch, tmp_path):
+    async def process(job):
+        return {"status": "processed", "filename": job["filename"], "fields": FIELDS, "text_length": 120}
+
+    async def run():
+        engine, sessions = await make_database(tmp_path)
+        monkeypatch.setattr(main, "AsyncSessionLocal", sessions)
+        try:
+            job = {"conversation_id": "c1", "doc_type": "pan_card", "filename": "pan.jpg"}
+            # A result for content that has since been replaced by another upload is dropped
+            await main.process_document_job({**job, "sha256": "b" * 64})
+            async with sessions() as db:
+                assert await db.scalar(select(Document.parsed_fields)) is None
+            await main.process_document_job({**job, "sha256": "a" * 64})
+            async with sessions() as db:
+                return await db.scalar(select(Document.parsed_fields))
+        finally:
+            await engine.dispose()
+
+    monkeypatch.setattr(main, "USE_DATABASE", True)
+    monkeypatch.setattr(main.master_agent, "process_document_job", process)
+    assert asyncio.run(run()) == FIELDS
+
+
+def test_parsed_fields_are_recorded_on_the_conversation_in_memory_mode(monkeypatch):
+    async def process(job):
+        return {"status": "processed", "filename": job["filename"], "fields": FIELDS, "text_length": 120}
+
+    async def run():
+        await main.master_agent.conversations.save(
+            ConversationState(conversation_id="c1", stage="VERIFICATION", documents={"pan_card": "pan.jpg"})
+        )
+        await main.process_document_job({"conversation_id": "c1", "doc_type": "pan_card", "filename": "pan.jpg"})
+        return await main.master_agent.get_conversation_state("c1")
+
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    monkeypatch.setattr(main.master_agent, "conversations", MemoryConversationStore())
+    monkeypatch.setattr(main.master_agent, "process_document_job", process)
+    state = asyncio.run(run())
+
+    assert state.documents["pan_card"] == "pan.jpg"
+    assert state.documents["pan.jpg"] == {"parsed": FIELDS, "text_length": 120}
+
+
+def test_legacy_endpoints_work_in_database_mode(monkeypatch, tmp_path):
+    async def run():
+        engine, sessions = await make_database(tmp_path)
+        try:
+            async with sessions() as db:
+                created = await main.create_conversation_legacy(db)
+                upload = UploadFile(io.BytesIO(b"%PDF-1.4 slip"), filename="slip.pdf")
+                uploaded = await main.upload_file_legacy(upload, created.conversation_id, db)
+            async with sessions() as db:
+                conversation = await db.get(Conversation, created.conversation_id)
+                documents = (await db.scalars(
+                    select(Document).where(Document.conversation_id == created.conversation_id)
+                )).all()
+            return conversation, documents, uploaded
+        finally:
+            await engine.dispose()
+
+    monkeypatch.setattr(main, "USE_DATABASE", True)
+    conversation, documents, uploaded = asyncio.run(run())
+
+    assert conversation.user_id is None
+    assert [doc.filename for doc in documents] == ["slip.pdf"]
+    assert uploaded.conversation_id == conversation.id
@@ -0,0 +1,73 @@
+import io
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import app.main as main
+from app.config import settings
+from app.services.conversation_store import MemoryConversationStore
+from app.services.upload_storage import UploadTooLargeError, save_upload
+
+
+class CountingFile(io.BytesIO):
+    """Upload body that counts how much of it was read"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def upload(data: bytes, size: int = None) -> UploadFile:
+    return UploadFile(CountingFile(data), filename="slip.pdf", size=size)
+
+
+def test_upload_is_written_in_chunks_with_its_size_and_hash(tmp_path):
+    data = b"%PDF-1.4 " + b"x" * 2500
+    file = upload(data)
+    destination = tmp_path / "uploads" / "slip.pdf"
+
+    stored = asyncio.run(save_upload(file, destination, max_size=10_000, chunk_size=1000))
+
+    assert destination.read_bytes() == data
+    assert (stored.path, stored.size, stored.sha256) == (destination, len(data), hashlib.sha256(data).hexdigest())
+    assert file.file.reads == 4  # three chunks and the empty read at the end
+    assert [path.name for path in destination.parent.iterdir()] == ["slip.pdf"]
+
+
+def test_copy_stops_at_the_first_chunk_over_the_limit(tmp_path):
+    file = upload(b"x" * 10_000)
+    destination = tmp_path / "slip.pdf"
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload(file, destination, max_size=2500, chunk_size=1000))
+
+    assert file.file.reads == 3
+    assert list(tmp_path.iterdir()) == []  # neither the file nor its .part
+
+
+def test_declared_size_is_refused_before_reading(tmp_path):
+    file = upload(b"x" * 10_000, size=10_000)
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload(file, tmp_path / "slip.pdf", max_size=2500))
+
+    assert file.file.reads == 0
+
+
+def test_oversized_upload_is_answered_with_413(monkeypatch):
+    monkeypatch.setattr(main, "USE_DATABASE", False)
+    monkeypatch.setattr(main.master_agent, "conversations", MemoryConversationStore())
+    monkeypatch.setattr(settings, "max_file_size", 2500)
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.upload_document(
+            upload(b"x" * 10_000), conversation_id=None, doc_type="salary_slip", db=None, current_user=None
+        ))
+
+    assert e.value.status_code == 413
@@ -9,9 +9,15 @@ const stages = [
   { key: 'COMPLETED', label: 'Complete', icon: '🎉' },
 ]
 
+// Backend stages shown as one of the steps above
+const stageAliases = {
+  COUNTER_OFFER: 'UNDERWRITING',
+}
+
 function StageProgress({ currentStage }) {
   const getStageIndex = (stage) => {
-    return stages.findIndex(s => s.key === stage)
+    const key = stageAliases[stage] || stage
+    return stages.findIndex(s => s.key === key)
   }
   
   const currentIndex = getStageIndex(currentStage)